@@ -0,0 +1,254 @@
+# Copyright (c) 2022  Floyd Terbo
+
+# Per-term inverted indexes over docket attributes that filters look up by value - conference
+# date, event date, lower court, docketed date, attorney name and email - so the engine can narrow
+# a DocketSource to the dockets that can possibly match before any of them are parsed.  One row
+# of values is stored per docket (validated against docket.json/patch.json like the docket cache)
+# and the inverted maps are rebuilt from the rows on load.  docketgrab updates rows as it writes
+# dockets, and anything it missed is caught up by refresh().
+
+from __future__ import absolute_import
+
+import atexit
+import cPickle as pickle
+import fcntl
+import logging
+import os
+import os.path
+
+from . import cache
+from . import util
+
+VERSION = 1
+FILENAME = ".docketattrs.pickle"
+
+# Attorney roles, combined as flags per (attorney, docket)
+PETITIONER = 1
+RESPONDENT = 2
+PETITIONER_COR = 4
+RESPONDENT_COR = 8
+
+ATTRS = ["conf_date", "event_date", "lowercourt", "docket_date", "attorney", "email"]
+
+
+def _buildRow (dpath):
+  """{attr : [(value, flag)]} for the docket in dpath, or None if it has no docket.json"""
+  try:
+    info = util.loadDocketPath(dpath, keep_raw = False)
+  except IOError:
+    return None
+
+  # The first distribution for a conference is the one filters look at
+  confs = {}
+  for (edate, cdate, resched) in info.distributed:
+    if cdate and cdate.toordinal() not in confs:
+      confs[cdate.toordinal()] = int(bool(resched))
+
+  attys = {}
+  for (names, flag) in [(info.attys_petitioner, PETITIONER), (info.attys_respondent, RESPONDENT),
+                        (info.attys_petitioner_cor, PETITIONER_COR),
+                        (info.attys_respondent_cor, RESPONDENT_COR)]:
+    for name in names:
+      attys[name] = attys.get(name, 0) | flag
+
+  row = {}
+  row["conf_date"] = confs.items()
+  row["event_date"] = [(x, 0) for x in set([evt.date.toordinal() for evt in info.events if evt.date])]
+  row["lowercourt"] = [(info.lowercourt, 0)] if info.lowercourt else []
+  row["docket_date"] = [(info.docket_date.toordinal(), 0)] if info.docket_date else []
+  row["attorney"] = attys.items()
+  row["email"] = [(x, 0) for x in set([x.lower() for x in info.atty_email if x])]
+  return row
+
+
+class TermIndex(object):
+  def __init__ (self, root, term):
+    self.root = root
+    self.term = term
+    self.path = "%s/OT-%d/%s" % (root, term, FILENAME)
+
+    self.rows = {}
+    self._dirty = {}
+    self._attrs = None
+    self.fresh = False
+    # Same rule as the docket cache - only the process that loaded the index writes it back
+    self._pid = os.getpid()
+
+    if not cache.REBUILD:
+      self.rows = self._read()
+
+  def _read (self):
+    try:
+      with open(self.path, "rb") as f:
+        (version, rows) = pickle.load(f)
+    except (IOError, EOFError, ValueError, pickle.UnpicklingError):
+      return {}
+    if version != VERSION:
+      return {}
+    return rows
+
+  def _listKeys (self):
+    droot = "%s/OT-%d/dockets" % (self.root, self.term)
+    keys = []
+    if os.path.exists(droot):
+      keys.extend(["dockets/%s" % (x) for x in os.listdir(droot) if not x.startswith(".") and x != "A"])
+    if os.path.exists("%s/A" % (droot)):
+      keys.extend(["dockets/A/%s" % (x) for x in os.listdir("%s/A" % (droot))
+                   if not x.startswith(".") and x != "indexes.json"])
+    return keys
+
+  def update (self, key):
+    """Rebuild the row for one docket (relative to the term)"""
+    dpath = "%s/OT-%d/%s" % (self.root, self.term, key)
+    try:
+      row = _buildRow(dpath)
+    except Exception:
+      # One docket that can't be parsed mustn't stop docketgrab or a search.  Without a row it
+      # can't be ruled out by narrow(), and the next refresh() tries it again.
+      logging.exception("Unable to index attributes of %s" % (dpath))
+      if key in self.rows:
+        del self.rows[key]
+        self._dirty[key] = None
+        self._attrs = None
+      return
+    val = (cache.docketStamp(dpath), row)
+    self.rows[key] = val
+    self._dirty[key] = val
+    self._attrs = None
+
+  def refresh (self):
+    """Rebuild the rows of any docket whose files changed, and drop dockets that went away"""
+    keys = self._listKeys()
+    changed = 0
+    for key in keys:
+      stamp = cache.docketStamp("%s/OT-%d/%s" % (self.root, self.term, key))
+      if key not in self.rows or self.rows[key][0] != stamp:
+        self.update(key)
+        changed += 1
+
+    gone = set(self.rows.keys()) - set(keys)
+    for key in gone:
+      del self.rows[key]
+      self._dirty[key] = None
+      self._attrs = None
+
+    if changed or gone:
+      logging.debug("Reindexed %d of %d dockets in %s" % (changed, len(keys), self.path))
+    self.fresh = True
+    return self
+
+  @property
+  def attrs (self):
+    """{attr : {value : {key : flag}}}, inverted from the rows"""
+    if self._attrs is None:
+      self._attrs = dict([(x, {}) for x in ATTRS])
+      for (key, (stamp, row)) in self.rows.items():
+        if not row:
+          continue
+        for (attr, vals) in row.items():
+          amap = self._attrs[attr]
+          for (value, flag) in vals:
+            amap.setdefault(value, {})[key] = flag
+    return self._attrs
+
+  def lookup (self, attr, value):
+    """{key : flag} for every docket where attr has value"""
+    return self.attrs[attr].get(value, {})
+
+  def save (self):
+    if not self._dirty or self._pid != os.getpid():
+      return
+
+    with open("%s.lock" % (self.path), "a+") as lockf:
+      fcntl.flock(lockf, fcntl.LOCK_EX)
+      if cache.REBUILD:
+        rows = dict(self.rows)
+      else:
+        rows = self._read()
+      for (key, val) in self._dirty.items():
+        if val is None:
+          rows.pop(key, None)
+        else:
+          rows[key] = val
+
+      tmppath = "%s.%d" % (self.path, os.getpid())
+      with open(tmppath, "wb") as f:
+        pickle.dump((VERSION, rows), f, pickle.HIGHEST_PROTOCOL)
+      os.rename(tmppath, self.path)
+    logging.debug("Saved %d index rows to %s" % (len(self._dirty), self.path))
+    self._dirty = {}
+
+
+_INDEXES = {}
+
+def termIndex (root, term):
+  key = (os.path.abspath(root), term)
+  if key not in _INDEXES:
+    _INDEXES[key] = TermIndex(root, term)
+  return _INDEXES[key]
+
+
+def refreshIndex (root, term):
+  """Bring a term index up to date, loading it if needed"""
+  return termIndex(root, term).refresh()
+
+
+def updateDocket (dpath):
+  """Reindex one docket directory after its docket.json was written (no-op outside a term)"""
+  parts = cache.splitPath(dpath)
+  if not parts:
+    return
+  termIndex(parts[0], parts[1]).update(parts[2])
+
+
+def narrow (refs, filters):
+  """Drop references that no filter with a candidates() lookup could match.
+
+  Filters are left as they are - candidates() may return a superset of what include() accepts,
+  so they still run per docket, just on fewer dockets."""
+  if not refs or not [x for x in filters if hasattr(x, "candidates")]:
+    return refs
+
+  parents = {}
+  out = []
+  for ref in refs:
+    (parent, name) = ref.path.rstrip("/").rsplit("/", 1)
+    if parent not in parents:
+      parts = cache.splitPath(parent + "/0")
+      if not parts:
+        return refs
+      index = termIndex(parts[0], parts[1])
+      if not index.fresh:
+        index.refresh()
+      allowed = None
+      for srcf in filters:
+        if not hasattr(srcf, "candidates"):
+          continue
+        keys = srcf.candidates(index)
+        if keys is None:
+          continue
+        if allowed is None:
+          allowed = set(keys)
+        else:
+          allowed &= set(keys)
+      parents[parent] = (parts[2][:-1], allowed, index)
+
+    (prefix, allowed, index) = parents[parent]
+    key = prefix + name
+    # Dockets the index hasn't seen yet can't be ruled out
+    if allowed is None or key in allowed or key not in index.rows:
+      out.append(ref)
+
+  if len(out) != len(refs):
+    logging.debug("Attribute index narrowed %d references to %d" % (len(refs), len(out)))
+  return out
+
+
+def saveAll ():
+  for index in _INDEXES.values():
+    try:
+      index.save()
+    except (IOError, OSError):
+      logging.exception("Unable to save attribute index %s" % (index.path))
+
+atexit.register(saveAll)
@@ -0,0 +1,311 @@
+# Copyright (c) 2022  Floyd Terbo
+
+# Compact on-disk postings format, read through mmap so lookups only touch the pages they need
+# and every process searching the same term shares those pages through the OS cache.
+#
+#   header      magic, version, flags, document count, term count and the offset of each section
+#   documents   JSON list of [directory name, file name, length in words]; postings refer to these
+#               by index
+#   dictionary  one fixed-size entry per term, sorted by the term's UTF-8 bytes: offset and length
+#               of the term in the string heap, document frequency, offset of its postings
+#   heap        the term strings
+#   postings    per term, (document index delta, count) as varints.  With the POSITIONS flag every
+#               term starts with a varint of twice the byte length of its document part, plus one if
+#               it has positions.  A term with positions has (document index delta, count, byte
+#               length of positions) in its document part, followed by the varint deltas of the word
+#               positions in each document, so the document part decodes in one pass without
+#               touching positions.  A term without them has the same pairs as a file without the
+#               flag.
+#
+# A lookup is a binary search over the dictionary entries, comparing against the heap, followed by
+# decoding one postings run.  Positions are left encoded until something asks for them, and since
+# they don't depend on document numbering a rebuild can copy them across as they are.
+
+from __future__ import absolute_import
+
+import json
+import mmap
+import os
+import struct
+
+MAGIC = "SCPI"
+VERSION = 3
+
+# Flags
+POSITIONS = 1
+
+HEADER = struct.Struct("<4sIIIIQQQQ")
+ENTRY = struct.Struct("<QIIQ")
+
+
+class FormatError(Exception): pass
+
+
+def _putVarint (buf, val):
+  while val >= 0x80:
+    buf.append((val & 0x7f) | 0x80)
+    val >>= 7
+  buf.append(val)
+
+
+def _varints (data):
+  """Every varint in data, in one pass"""
+  out = []
+  val = 0
+  shift = 0
+  for byte in bytearray(data):
+    if byte & 0x80:
+      val |= (byte & 0x7f) << shift
+      shift += 7
+    else:
+      out.append(val | (byte << shift))
+      val = 0
+      shift = 0
+  return out
+
+
+def encodePositions (positions):
+  """Varint delta bytes for a sorted list of word positions"""
+  buf = bytearray()
+  prev = 0
+  for pos in positions:
+    _putVarint(buf, pos - prev)
+    prev = pos
+  return str(buf)
+
+
+def decodePositions (data):
+  if len(data) == 1:
+    # Most words appear once in a document
+    return [ord(data)]
+  out = []
+  prev = 0
+  for delta in _varints(data):
+    prev += delta
+    out.append(prev)
+  return out
+
+
+def encodePostings (plist, positional = False):
+  """Varint bytes for [(document index, count)], sorted by document index, or
+  [(document index, count, encoded positions)].  positional is whether the file has the POSITIONS
+  flag - in such a file a term can still be stored without positions."""
+  haspos = positional and len(plist[0]) > 2
+  buf = bytearray()
+  prev = 0
+  for posting in plist:
+    _putVarint(buf, posting[0] - prev)
+    _putVarint(buf, posting[1])
+    if haspos:
+      _putVarint(buf, len(posting[2]))
+    prev = posting[0]
+  if not positional:
+    return str(buf)
+
+  head = bytearray()
+  _putVarint(head, len(buf) * 2 + int(haspos))
+  if haspos:
+    buf += "".join([posting[2] for posting in plist])
+  return str(head + buf)
+
+
+def _pairs (vals):
+  out = []
+  doc = 0
+  for idx in range(0, len(vals), 2):
+    doc += vals[idx]
+    out.append((doc, vals[idx + 1]))
+  return out
+
+
+def decodePostings (data, positional = False, positions = True):
+  """The postings encodePostings() wrote, without the positions of a positional run unless
+  positions is set"""
+  if not positional:
+    return _pairs(_varints(data))
+
+  # The length prefix is the only varint before the document part
+  pos = 0
+  size = 0
+  shift = 0
+  while True:
+    byte = ord(data[pos])
+    pos += 1
+    size |= (byte & 0x7f) << shift
+    shift += 7
+    if not byte & 0x80:
+      break
+  (size, haspos) = (size >> 1, size & 1)
+
+  vals = _varints(data[pos:pos + size])
+  if not haspos:
+    return _pairs(vals)
+  pos += size
+  out = []
+  doc = 0
+  for idx in range(0, len(vals), 3):
+    doc += vals[idx]
+    if positions:
+      out.append((doc, vals[idx + 1], data[pos:pos + vals[idx + 2]]))
+      pos += vals[idx + 2]
+    else:
+      out.append((doc, vals[idx + 1]))
+  return out
+
+
+def write (path, docs, grams, positional = False):
+  """Write docs ([(directory name, file name, length)]) and grams ({unicode gram : postings}, as
+  encodePostings() takes them) to path, replacing it atomically"""
+  keys = sorted([(gram.encode("utf-8"), gram) for gram in grams])
+
+  entries = []
+  heap = []
+  postings = []
+  hoff = 0
+  poff = 0
+  for (bkey, gram) in keys:
+    plist = grams[gram]
+    data = encodePostings(plist, positional)
+    entries.append(ENTRY.pack(hoff, len(bkey), len(plist), poff))
+    heap.append(bkey)
+    postings.append(data)
+    hoff += len(bkey)
+    poff += len(data)
+
+  docblob = json.dumps(docs)
+  docs_off = HEADER.size
+  dict_off = docs_off + len(docblob)
+  heap_off = dict_off + ENTRY.size * len(entries)
+  post_off = heap_off + hoff
+
+  tmppath = "%s.%d" % (path, os.getpid())
+  with open(tmppath, "wb") as f:
+    f.write(HEADER.pack(MAGIC, VERSION, POSITIONS if positional else 0, len(docs), len(entries),
+                        docs_off, dict_off, heap_off, post_off))
+    f.write(docblob)
+    for chunk in (entries, heap, postings):
+      for data in chunk:
+        f.write(data)
+  os.rename(tmppath, path)
+
+
+class PostingsFile(object):
+  def __init__ (self, path):
+    self.path = path
+    with open(path, "rb") as f:
+      self._mm = mmap.mmap(f.fileno(), 0, access = mmap.ACCESS_READ)
+
+    (magic, version, flags, ndocs, self.nterms, docs_off, self._dict_off, self._heap_off,
+     self._post_off) = HEADER.unpack_from(self._mm, 0)
+    if magic != MAGIC or version != VERSION:
+      raise FormatError("%s is not a version %d postings file" % (path, VERSION))
+    self.positional = bool(flags & POSITIONS)
+    docs = json.loads(self._mm[docs_off:self._dict_off])
+    self.docs = [(name, fname) for (name, fname, length) in docs]
+    self.lengths = [length for (name, fname, length) in docs]
+
+  def close (self):
+    self._mm.close()
+
+  def _entry (self, idx):
+    return ENTRY.unpack_from(self._mm, self._dict_off + idx * ENTRY.size)
+
+  def _key (self, entry):
+    start = self._heap_off + entry[0]
+    return self._mm[start:start + entry[1]]
+
+  def _postings (self, idx, entry, positions = True):
+    start = self._post_off + entry[3]
+    if idx + 1 < self.nterms:
+      end = self._post_off + self._entry(idx + 1)[3]
+    else:
+      end = len(self._mm)
+    return decodePostings(self._mm[start:end], self.positional, positions)
+
+  def find (self, gram):
+    """Dictionary index of gram (unicode), or None"""
+    bkey = gram.encode("utf-8")
+    lo = 0
+    hi = self.nterms
+    while lo < hi:
+      mid = (lo + hi) // 2
+      if self._key(self._entry(mid)) < bkey:
+        lo = mid + 1
+      else:
+        hi = mid
+    if lo < self.nterms and self._key(self._entry(lo)) == bkey:
+      return lo
+    return None
+
+  def docFreq (self, gram):
+    idx = self.find(gram)
+    if idx is None:
+      return 0
+    return self._entry(idx)[2]
+
+  def lookup (self, gram, positions = True):
+    """[(document index, count)] for gram (unicode), or (document index, count, encoded
+    positions) if gram was stored with positions and positions is set"""
+    idx = self.find(gram)
+    if idx is None:
+      return []
+    return self._postings(idx, self._entry(idx), positions)
+
+  def items (self):
+    """Every (gram, postings) in dictionary order"""
+    for idx in range(self.nterms):
+      entry = self._entry(idx)
+      yield (self._key(entry).decode("utf-8"), self._postings(idx, entry))
+
+
+class MultiFile(object):
+  """Several postings files read as one, for an index kept as a base file and the smaller files
+  written as it changed.  segments is [(path, [document numbers that are out of date])] - those
+  copies have been replaced by one in a later file and are skipped.  Documents are numbered
+  through the segments in order, so lookups stay sorted by document index."""
+  def __init__ (self, segments):
+    self.docs = []
+    self.lengths = []
+    self.positional = True
+    self._files = []
+    try:
+      for (path, old) in segments:
+        pfile = PostingsFile(path)
+        self.positional = self.positional and pfile.positional
+        if not old:
+          # Every document is live, so the numbering is just offset
+          self._files.append((pfile, len(self.docs), None))
+          self.docs.extend(pfile.docs)
+          self.lengths.extend(pfile.lengths)
+          continue
+        old = set(old)
+        remap = {}
+        for (idx, doc) in enumerate(pfile.docs):
+          if idx not in old:
+            remap[idx] = len(self.docs)
+            self.docs.append(doc)
+            self.lengths.append(pfile.lengths[idx])
+        if remap:
+          self._files.append((pfile, 0, remap))
+        else:
+          pfile.close()
+    except Exception:
+      self.close()
+      raise
+
+  def close (self):
+    for (pfile, offset, remap) in self._files:
+      pfile.close()
+    self._files = []
+
+  def lookup (self, gram, positions = True):
+    out = []
+    for (pfile, offset, remap) in self._files:
+      plist = pfile.lookup(gram, positions)
+      if remap is None and not offset and len(self._files) == 1:
+        return plist
+      elif remap is None:
+        out.extend([(posting[0] + offset,) + posting[1:] for posting in plist])
+      else:
+        out.extend([(remap[posting[0]],) + posting[1:] for posting in plist if posting[0] in remap])
+    return out
@@ -0,0 +1,174 @@
+# Copyright (c) 2022  Floyd Terbo
+
+# On-disk snapshot of parsed DocketStatusInfo state, one file per term.  Entries are keyed by
+# the docket directory (relative to the term) and validated against the mtime and size of
+# docket.json and patch.json, so a warm load skips JSON decoding and event classification.
+# Only keep_raw = False dockets are cached - anything that needs the raw JSON has to read it.
+# Each entry is pickled separately, so loading the file for a single docket stays cheap.
+
+from __future__ import absolute_import
+
+import atexit
+import collections
+import cPickle as pickle
+import fcntl
+import logging
+import os
+import os.path
+import re
+
+# Bump whenever DocketStatusInfo, DocketEvent or classification changes what a parsed docket holds
+VERSION = 2
+FILENAME = ".docketcache.pickle"
+
+# Set by --rebuild-cache: ignore existing entries and replace the cache files on save
+REBUILD = False
+
+# Set by long-running processes (analysis-engine --serve) to also keep unpickled dockets in memory
+RESIDENT = False
+
+PATH_RE = re.compile(r"^(?:(.*)/)?OT-(\d+)/(dockets/.+)$")
+
+def _fileStamp (path):
+  try:
+    st = os.stat(path)
+  except OSError:
+    return None
+  return (st.st_mtime, st.st_size)
+
+def docketStamp (dpath):
+  return (_fileStamp("%s/docket.json" % (dpath)), _fileStamp("%s/patch.json" % (dpath)))
+
+
+class TermCache(object):
+  def __init__ (self, root, term):
+    self.root = root
+    self.term = term
+    self.path = "%s/OT-%d/%s" % (root, term, FILENAME)
+
+    self._entries = None
+    self._dirty = {}
+    self._live = {}
+    # Forked pool workers inherit a loaded cache for free, but only the process that loaded it
+    # writes it back
+    self._pid = os.getpid()
+
+  @property
+  def writable (self):
+    return self._pid == os.getpid()
+
+  @property
+  def entries (self):
+    if self._entries is None:
+      self._entries = {}
+      if not REBUILD:
+        self._entries = self._read()
+    return self._entries
+
+  def _read (self):
+    try:
+      with open(self.path, "rb") as cf:
+        (version, entries) = pickle.load(cf)
+    except (IOError, EOFError, ValueError, pickle.UnpicklingError):
+      return {}
+    if version != VERSION:
+      return {}
+    return entries
+
+  def has (self, key, stamp):
+    try:
+      return self.entries[key][0] == stamp
+    except KeyError:
+      return False
+
+  def get (self, key, stamp):
+    if RESIDENT:
+      live = self._live.get(key)
+      if live and live[0] == stamp:
+        return live[1]
+
+    try:
+      (estamp, blob) = self.entries[key]
+    except KeyError:
+      return None
+    if estamp != stamp:
+      return None
+
+    info = pickle.loads(blob)
+    if RESIDENT:
+      self._live[key] = (stamp, info)
+    return info
+
+  def keep (self, key, stamp, info):
+    """Hold on to a docket this process parsed but can't write back, if we are RESIDENT"""
+    if RESIDENT:
+      self._live[key] = (stamp, info)
+
+  def put (self, key, stamp, info):
+    if RESIDENT:
+      self._live[key] = (stamp, info)
+    val = (stamp, pickle.dumps(info, pickle.HIGHEST_PROTOCOL))
+    self.entries[key] = val
+    if self.writable:
+      self._dirty[key] = val
+
+  def save (self):
+    if not self._dirty or not self.writable:
+      return
+
+    # Merge with whatever other processes have written since we loaded
+    with open("%s.lock" % (self.path), "a+") as lockf:
+      fcntl.flock(lockf, fcntl.LOCK_EX)
+      if REBUILD:
+        entries = dict(self.entries)
+      else:
+        entries = self._read()
+      entries.update(self._dirty)
+
+      tmppath = "%s.%d" % (self.path, os.getpid())
+      with open(tmppath, "wb") as cf:
+        pickle.dump((VERSION, entries), cf, pickle.HIGHEST_PROTOCOL)
+      os.rename(tmppath, self.path)
+    logging.debug("Saved %d cache entries to %s" % (len(self._dirty), self.path))
+    self._dirty = {}
+
+
+# Loaded term caches are kept in least-recently-used order, and beyond MAX_TERMS the oldest is
+# saved and dropped so multi-term runs don't hold every term in memory at once
+MAX_TERMS = 4
+_CACHES = collections.OrderedDict()
+
+def termCache (root, term):
+  key = (os.path.abspath(root), term)
+  tc = _CACHES.pop(key, None)
+  if tc is None:
+    tc = TermCache(root, term)
+    while len(_CACHES) >= MAX_TERMS:
+      (okey, otc) = _CACHES.popitem(last = False)
+      otc.save()
+  _CACHES[key] = tc
+  return tc
+
+def splitPath (dpath):
+  """Returns (root, term, key) for a docket directory, or None if it is not in a term"""
+  m = PATH_RE.match(os.path.normpath(dpath))
+  if not m:
+    return None
+  (root, term, key) = m.groups()
+  return (root or ".", int(term), key)
+
+def forPath (dpath):
+  """Returns (TermCache, key) for a docket directory, or (None, None) if it is not in a term"""
+  parts = splitPath(dpath)
+  if not parts:
+    return (None, None)
+  return (termCache(parts[0], parts[1]), parts[2])
+
+def saveAll ():
+  for tc in _CACHES.values():
+    try:
+      tc.save()
+    except (IOError, OSError):
+      logging.exception("Unable to save docket cache %s" % (tc.path))
+
+atexit.register(saveAll)
@@ -0,0 +1,734 @@
+# Copyright (c) 2018-2022  Floyd Terbo
+
+# Classification of ProceedingsandOrder entries into DocketEvent flags and docket-level state.
+#
+# The rule table below is ordered exactly like the original if/elif chain (which
+# scripts/benchmark.py keeps to check it against) - the first exclusive rule that matches an event
+# wins, and the trailing rules are then all applied.  At import time the literals the rules test
+# are compiled into trie-shaped regexes (one anchored match for leading text and one scan for
+# contained text, per case-sensitivity), so each event text is scanned a couple of times instead
+# of once or more per branch, and only rules whose literals are actually present get evaluated.
+
+from __future__ import absolute_import
+
+import re
+
+from . import dates
+from . import justices
+
+###
+### Rule predicates
+###
+### Each predicate is compiled to a function of (text, lowercased text).  It also reports its
+### triggers - (kind, lower, literal) tuples such that the predicate can only be true if at least
+### one of those literals is present ("contains") or leads the text ("start").  Predicates that are
+### exact are true whenever any trigger is found, and never need to be evaluated.
+
+class _Literal(object):
+  exact = True
+
+  def __init__ (self, lit, lower = False):
+    self.lit = lit
+    self.lower = lower
+
+  def triggers (self):
+    return [("start", self.lower, self.lit)]
+
+
+class startswith(_Literal):
+  def compile (self):
+    lit = self.lit
+    if self.lower:
+      return lambda etxt, letxt: letxt.startswith(lit)
+    return lambda etxt, letxt: etxt.startswith(lit)
+
+
+class equals(_Literal):
+  exact = False
+
+  def compile (self):
+    lit = self.lit
+    return lambda etxt, letxt: etxt == lit
+
+
+class contains(_Literal):
+  def triggers (self):
+    return [("contains", self.lower, self.lit)]
+
+  def compile (self):
+    lit = self.lit
+    if self.lower:
+      return lambda etxt, letxt: lit in letxt
+    return lambda etxt, letxt: lit in etxt
+
+
+def istartswith (lit):
+  return startswith(lit, lower = True)
+
+def icontains (lit):
+  return contains(lit, lower = True)
+
+
+class test(object):
+  """Arbitrary predicate on the event text - only valid inside allof() with at least one literal"""
+  exact = False
+
+  def __init__ (self, func):
+    self.func = func
+
+  def triggers (self):
+    return []
+
+  def compile (self):
+    func = self.func
+    return lambda etxt, letxt: func(etxt)
+
+
+class allof(object):
+  exact = False
+
+  def __init__ (self, *preds):
+    self.preds = preds
+
+  def triggers (self):
+    # Any one member is sufficient to gate the conjunction, prefer the cheap anchored ones
+    tlists = [pred.triggers() for pred in self.preds if pred.triggers()]
+    for tlist in tlists:
+      if all([x[0] == "start" for x in tlist]):
+        return tlist
+    if tlists:
+      return tlists[0]
+    return []
+
+  def compile (self):
+    funcs = [pred.compile() for pred in self.preds]
+    def match (etxt, letxt):
+      for func in funcs:
+        if not func(etxt, letxt):
+          return False
+      return True
+    return match
+
+
+class anyof(allof):
+  @property
+  def exact (self):
+    return all([pred.exact for pred in self.preds])
+
+  def triggers (self):
+    tlist = []
+    for pred in self.preds:
+      ptl = pred.triggers()
+      if not ptl:
+        return []
+      tlist.extend(ptl)
+    return tlist
+
+  def compile (self):
+    funcs = [pred.compile() for pred in self.preds]
+    def match (etxt, letxt):
+      for func in funcs:
+        if func(etxt, letxt):
+          return True
+      return False
+    return match
+
+
+def _strippedText (etxt):
+  # Drop the trailing "DIVIDED"/"VIDED." marker that some entries carry
+  if etxt[-6:] == "VIDED." or etxt[-5:] == "VIDED":
+    return " ".join(etxt.split()[:-1])
+  return etxt
+
+
+###
+### Rule actions - return True to skip the trailing checks for this event
+###
+
+def _distributed (dinfo, evtobj, einfo, etxt):
+  if etxt == "DISTRIBUTED.":
+    return True  # Rehearing distribution, probably, not for conference
+  if etxt.startswith("DISTRIBUTED."): # Old Event
+    confdate = dates.parseDate(etxt.split(".")[-1])
+  else:
+    confdate = dates.parseDate(etxt.split("of")[-1])
+  dinfo.distributed.append((evtobj.date, confdate, False))
+  evtobj.distributed = True
+
+def _rescheduled (dinfo, evtobj, einfo, etxt):
+  last_dist = dinfo.distributed[-1]
+  dinfo.distributed[-1] = (last_dist[0], last_dist[1], True)
+
+def _amicusBrief (dinfo, evtobj, einfo, etxt):
+  evtobj.amicus_brief = True
+  if etxt.count("Court-appointed"):
+    evtobj.amici_court_appointed = True
+  if not dinfo.granted:
+    dinfo.cert_amici.append(" ".join(_strippedText(etxt).split()[4:-1]))
+  else:
+    dinfo.merits_amici.append(" ".join(_strippedText(etxt).split()[4:-1]))
+  if dinfo.cvsg:
+    letxt = etxt.lower()
+    if (letxt.startswith("brief amicus curiae of united states filed") or
+        letxt.startswith("brief amicus curiae of the united states filed") or
+        etxt.startswith("Brief amicus curiae of United States of America filed")):
+      dinfo.cvsg_return_date = evtobj.date
+      evtobj.cvsg_return = True
+
+def _brief (dinfo, evtobj, einfo, etxt):
+  if dinfo.cvsg and etxt.lower().startswith("brief of federal respondents in opposition filed"):
+    dinfo.cvsg_return_date = evtobj.date
+    evtobj.cvsg_return = True
+    evtobj.amicus_brief = True
+  else:
+    evtobj.brief = True
+
+def _cvsg (dinfo, evtobj, einfo, etxt):
+  dinfo.cvsg = True
+  dinfo.cvsg_date = evtobj.date
+  evtobj.cvsg = True
+
+def _amicusAppointed (dinfo, evtobj, einfo, etxt):
+  evtobj.amici_court_appointed = True
+
+def _responseMemo (dinfo, evtobj, einfo, etxt):
+  evtobj.response_memo = True
+
+def _ifpRespondent (dinfo, evtobj, einfo, etxt):
+  if etxt.count("GRANTED"):
+    evtobj.ifp_granted = True
+  else:
+    evtobj.ifp_respondent = True
+
+def _petitionGranted (dinfo, evtobj, einfo, etxt):
+  dinfo.granted = True
+  dinfo.grant_date = evtobj.date
+  evtobj.granted = True
+
+def _circulated (dinfo, evtobj, einfo, etxt):
+  evtobj.circulated = True
+
+def _setForArgument (dinfo, evtobj, einfo, etxt):
+  evtobj.set_for_argument = True
+
+def _setForReargument (dinfo, evtobj, einfo, etxt):
+  evtobj.set_for_reargument = True
+
+def _recordReceived (dinfo, evtobj, einfo, etxt):
+  evtobj.record_received = True
+
+def _recordPacer (dinfo, evtobj, einfo, etxt):
+  evtobj.record_pacer = True
+
+def _recordReturned (dinfo, evtobj, einfo, etxt):
+  evtobj.record_returned = True
+
+def _sgParticipation (dinfo, evtobj, einfo, etxt):
+  if etxt.count("filed"):
+    evtobj.sg_motion_divided_argument = True
+  elif etxt.count("GRANTED"):
+    evtobj.sg_grant_divided_argument = True
+
+def _dividedArgument (dinfo, evtobj, einfo, etxt):
+  if (etxt.count("by the Solicitor General") or
+      etxt.count("by the Acting Solicitor General") or
+      etxt.lower().count("by federal respondents")):
+    if etxt[-7:] == "DENIED.":
+      evtobj.sg_motion_divided_denied = True
+    elif etxt[-8:] == "GRANTED.":
+      evtobj.sg_motion_divided_granted = True
+    else:
+      evtobj.sg_motion_divided_argument = True
+  else:
+    if etxt[-7:] == "DENIED.":
+      evtobj.motion_divided_denied = True
+    elif etxt[-8:] == "GRANTED.":
+      evtobj.motion_divided_granted = True
+    else:
+      _dividedArgumentMotion(dinfo, evtobj, einfo, etxt)
+
+def _dividedArgumentMotion (dinfo, evtobj, einfo, etxt):
+  evtobj.motion_divided_argument = True
+  if etxt.count("enlargement of time"):
+    evtobj.motion_time_enlargement = True
+
+def _granted (dinfo, evtobj, einfo, etxt):
+  if etxt.count("for leave to file"):
+    if etxt.count("as amicus curiae out of time"):
+      evtobj.amici_granted_out_of_time = True
+    return True
+  if etxt.count("Motion to substitute"): return True
+  if etxt.count("Motion of respondent for leave"): return True
+  if etxt.count("Motion for leave to intervene"): return True
+  if etxt.count("Motion to dispense with printing"):
+    evtobj.dispense_printing_granted = True
+    return True
+  if etxt.count("Motion to dismiss"):
+    evtobj.dismissed = True
+    return True
+  if etxt.count("Motion to appoint counsel"):
+    evtobj.counsel_granted = True
+    return True
+  statements = etxt.split(".")
+  gs = [x for x in statements if x.count("GRANTED")][0]
+  if gs.count("expedite consideration"):
+    return True
+  dinfo.granted = True
+  dinfo.grant_date = evtobj.date
+  evtobj.granted = True
+  if etxt.count("REVERSED") and etxt.count("REMANDED"):
+    # This is not really a GVR, but we'll throw it in the bucket for now
+    dinfo.gvr = True
+    dinfo.gvr_date = dinfo.grant_date
+    dinfo.remanded = True
+    dinfo.reversed = True
+    evtobj.remanded = True
+  elif etxt.lower().count("vacated") and etxt.lower().count("remanded"):
+    dinfo.gvr = True
+    dinfo.gvr_date = dinfo.grant_date
+    dinfo.remanded = True
+    dinfo.vacated = True
+    evtobj.vacated = True
+    evtobj.remanded = True
+
+def _mooted (dinfo, evtobj, einfo, etxt):
+  evtobj.mooted = True
+
+def _waiver (dinfo, evtobj, einfo, etxt):
+  if etxt.count("right of respondent"):
+    if etxt.count("to respond"):
+      evtobj.waive_response = True
+  elif etxt.count("Rule 15.5 filed by petitioner"):
+    evtobj.waive_waiting_period = True
+
+def _certGranted (dinfo, evtobj, einfo, etxt):
+  dinfo.granted = True
+  evtobj.granted = True
+  dinfo.grant_date = evtobj.date
+  if etxt.count("to dismiss the case as moot"):
+    evtobj.mooted = True
+  if etxt.count("the case is remanded for further proceedings"):
+    dinfo.remanded = True
+    evtobj.remanded = True
+
+def _argued (dinfo, evtobj, einfo, etxt):
+  dinfo.argued = True
+  dinfo.argued_date = evtobj.date
+  evtobj.argued = True
+
+def _inquorate (dinfo, evtobj, einfo, etxt):
+  dinfo.inquorate = True
+  evtobj.inquorate = True
+
+def _dismissed (dinfo, evtobj, einfo, etxt):
+  dinfo.dismissed = True
+  dinfo.dismiss_date = evtobj.date
+  evtobj.dismissed = True
+
+def _denied (dinfo, evtobj, einfo, etxt):
+  dinfo.denied = True
+  dinfo.deny_date = evtobj.date
+  evtobj.denied = True
+
+def _rehearingDenied (dinfo, evtobj, einfo, etxt):
+  evtobj.rehearing_denied = True
+
+def _rehearingRequested (dinfo, evtobj, einfo, etxt):
+  evtobj.rehearing_requested = True
+
+def _motionDenied (dinfo, evtobj, einfo, etxt):
+  evtobj.motion_denied = True
+
+def _issued (dinfo, evtobj, einfo, etxt):
+  dinfo.judgment_issued = True
+  dinfo.judgment_date = evtobj.date
+  evtobj.issued = True
+
+def _affirmed (dinfo, evtobj, einfo, etxt):
+  dinfo.affirmed = True
+  dinfo.judgment_issued = True
+  dinfo.judgment_date = evtobj.date
+  evtobj.affirmed = True
+  evtobj.issued = True
+
+def _affirmedReversedInPart (dinfo, evtobj, einfo, etxt):
+  dinfo.affirmed = True
+  dinfo.reversed = True
+  dinfo.judgment_issued = True
+  dinfo.judgment_date = evtobj.date
+  evtobj.affirmed = True
+  evtobj.reversed = True
+  evtobj.issued = True
+
+def _vacatedInPart (dinfo, evtobj, einfo, etxt):
+  dinfo.vacated = True
+  dinfo.judgment_issued = True
+  dinfo.judgment_date = evtobj.date
+  evtobj.vacated = True
+  evtobj.issued = True
+
+def _reversed (dinfo, evtobj, einfo, etxt):
+  dinfo.reversed = True
+  dinfo.judgment_issued = True
+  dinfo.judgment_date = evtobj.date
+  evtobj.issued = True
+
+def _removed (dinfo, evtobj, einfo, etxt):
+  dinfo.removed = True
+  evtobj.removed = True
+
+def _ifpDenied (dinfo, evtobj, einfo, etxt):
+  evtobj.ifp_denied = True
+  dinfo.ifp_denied = True
+
+def _responseRequested (dinfo, evtobj, einfo, etxt):
+  evtobj.response_requested = True
+
+def _recordRequested (dinfo, evtobj, einfo, etxt):
+  evtobj.record_requested = True
+
+def _ifpPaid (dinfo, evtobj, einfo, etxt):
+  odate = dates.parseDate(etxt.split("of")[-1])
+  for evt in dinfo.events:
+    if evt.date == odate and evt.ifp_denied:
+      dinfo.ifp_paid = True
+      evtobj.ifp_paid = True
+      break
+    if evt.date > odate:
+      break
+
+def _timeToFile (dinfo, evtobj, einfo, etxt):
+  evtobj.time_to_file = True
+
+def _judgmentVacated (dinfo, evtobj, einfo, etxt):
+  evtobj.vacated = True
+  dinfo.vacated = True
+
+def _letter (dinfo, evtobj, einfo, etxt):
+  evtobj.letter = True
+
+def _jointMotion (dinfo, evtobj, einfo, etxt):
+  evtobj.joint_motion = True
+
+def _jointAppendix (dinfo, evtobj, einfo, etxt):
+  evtobj.joint_appendix = True
+
+def _petitionerConsent (dinfo, evtobj, einfo, etxt):
+  evtobj.petitioner_blanket_consent = True
+
+def _respondentConsent (dinfo, evtobj, einfo, etxt):
+  evtobj.respondent_blanket_consent = True
+
+def _amicusConsent (dinfo, evtobj, einfo, etxt):
+  if etxt.count(" either party") and etxt.count("neither party"):
+    if etxt.count("received from counsel"):
+      if etxt.count("petitioner"):
+        evtobj.petitioner_blanket_consent = True
+      elif etxt.count("respondent"):
+        evtobj.respondent_blanket_consent = True
+
+
+def _remanded (dinfo, evtobj, einfo, etxt):
+  dinfo.remanded = True
+  evtobj.remanded = True
+
+def _vacatedAsMoot (dinfo, evtobj, einfo, etxt):
+  dinfo.vacated = True
+  evtobj.vacated = True
+  evtobj.mooted = True
+
+def _notAccepted (dinfo, evtobj, einfo, etxt):
+  evtobj.not_accepted = True
+
+def _abuse (dinfo, evtobj, einfo, etxt):
+  dinfo.abuse = True
+
+def _recusal (dinfo, evtobj, einfo, etxt):
+  wlist = etxt.split()
+  for idx,word in enumerate(wlist):
+    if word == "Justice":
+      if wlist[idx-1] == "Chief":
+        dinfo.recusals.add(justices.TERMS["%02d" % (dinfo.term)]["chief"])
+      else:
+        dinfo.recusals.add(wlist[idx+1])
+
+
+# Mutually exclusive rules, in priority order - only the first match is applied
+RULES = [
+  ("distributed", startswith("DISTRIBUTED"), _distributed),
+  ("rescheduled", equals("Rescheduled."), _rescheduled),
+  ("amicus-brief", anyof(startswith("Brief amici curiae of"), startswith("Brief amicus curiae of")),
+   _amicusBrief),
+  ("brief", anyof(startswith("Supplemental brief of"),
+                  startswith("Brief of respondent"),
+                  startswith("Brief of petitioner"),
+                  startswith("Reply of petitioner"),
+                  startswith("Reply of respondent"),
+                  allof(startswith("Brief of"), test(lambda etxt: _strippedText(etxt)[-6:] == "filed.")),
+                  allof(contains("letter brief"), contains("filed."))),
+   _brief),
+  ("cvsg", anyof(startswith("The Solicitor General is invited to file a brief"),
+                 contains("expressing the views of the United States")),
+   _cvsg),
+  ("amicus-appointed", contains("is invited to brief and argue this case"), _amicusAppointed),
+  ("response-memo", allof(startswith("Memorandum of respondent"), contains("filed")), _responseMemo),
+  ("ifp-respondent", startswith("Motion for leave to proceed in forma pauperis filed by respondent"),
+   _ifpRespondent),
+  ("petition-granted", equals("Petition GRANTED."), _petitionGranted),
+  ("circulated", equals("CIRCULATED"), _circulated),
+  ("set-for-argument", startswith("SET FOR ARGUMENT"), _setForArgument),
+  ("set-for-reargument", startswith("SET FOR REARGUMENT"), _setForReargument),
+  ("record-received", anyof(startswith("Record received from"),
+                            allof(startswith("Record"), contains("is electronic"))),
+   _recordReceived),
+  ("record-pacer", allof(anyof(startswith("The record of"), startswith("The record from")),
+                         contains("PACER")),
+   _recordPacer),
+  ("record-returned", startswith("Record returned"), _recordReturned),
+  ("sg-participation",
+   allof(anyof(startswith("Motion of the Solicitor General for leave to participate in oral argument"),
+               startswith("Motion of the Acting Solicitor General for leave to participate in oral argument")),
+         contains("divided argument")),
+   _sgParticipation),
+  ("divided-argument", anyof(startswith("Motion for divided argument"), contains("and for divided argument")),
+   _dividedArgument),
+  ("divided-argument-motion", allof(startswith("Motion"), contains("divided argument")),
+   _dividedArgumentMotion),
+  ("granted", contains("GRANTED"), _granted),
+  ("mooted", icontains("is dismissed as moot"), _mooted),
+  ("waiver", startswith("Waiver"), _waiver),
+  ("cert-granted", anyof(contains("petition for certiorari is granted"),
+                         contains("petition for a writ of certiorari is granted")),
+   _certGranted),
+  ("argued", startswith("Argued."), _argued),
+  ("inquorate", contains("lacks a quorum"), _inquorate),
+  ("petition-dismissed", anyof(startswith("Petition Dismissed"),
+                               startswith("Petition DISMISSED"),
+                               startswith("Appeal dismissed"),
+                               contains("petition for a writ of certiorari is DISMISSED")),
+   _dismissed),
+  ("denied", anyof(startswith("Petition DENIED"),
+                   contains("The petition for a writ of certiorari is denied"),
+                   contains("before judgment DENIED")),
+   _denied),
+  ("rehearing-denied", anyof(startswith("Rehearing DENIED"),
+                             allof(startswith("Motion for leave to file a petition for rehearing"),
+                                   contains("DENIED"))),
+   _rehearingDenied),
+  ("rehearing-requested", icontains("petition for rehearing filed"), _rehearingRequested),
+  ("motion-denied", allof(startswith("Motion for reconsideration"), contains("DENIED")), _motionDenied),
+  ("issued", anyof(istartswith("judgment issued"), istartswith("mandate issued")), _issued),
+  ("affirmed", anyof(startswith("Adjudged to be AFFIRMED."),
+                     contains("judgment is affirmed under 28 U. S. C."),
+                     contains("Judgment is affirmed"),
+                     contains("Judgment AFFIRMED")),
+   _affirmed),
+  ("affirmed-reversed-in-part", startswith("Adjudged to be AFFIRMED IN PART, REVERSED IN PART"),
+   _affirmedReversedInPart),
+  ("vacated-in-part", startswith("Adjudged to be VACATED IN PART"), _vacatedInPart),
+  ("reversed", startswith("Judgment REVERSED"), _reversed),
+  ("dismissed", anyof(contains("petition for a writ of certiorari is dismissed"),
+                      contains("petition for a writ of mandamus/prohibition is dismissed"),
+                      contains("petition for a writ of habeas corpus is dismissed"),
+                      contains("petition for a writ of prohibition is dismissed"),
+                      contains("petition for a writ of mandamus is dismissed"),
+                      contains("petition for a writ of mandamus and/or prohibition is dismissed")),
+   _dismissed),
+  ("removed", anyof(contains("Case removed from Docket"), equals("Case considered closed.")), _removed),
+  ("ifp-denied", contains("leave to proceed in forma pauperis is denied"), _ifpDenied),
+  ("response-requested", startswith("Response Requested"), _responseRequested),
+  ("record-requested", istartswith("record requested"), _recordRequested),
+  ("ifp-paid", startswith("Petitioner complied with order of"), _ifpPaid),
+  ("time-to-file", anyof(contains("time to file"), contains("extend further the time")), _timeToFile),
+  ("judgment-vacated", contains("Judgment VACATED"), _judgmentVacated),
+  ("letter", anyof(contains("Letter of petitioner"),
+                   contains("Letter of respondent"),
+                   contains("Letter from counsel"),
+                   startswith("Letter from the Solicitor General"),
+                   contains("Letter in reply")),
+   _letter),
+  ("joint-motion", istartswith("joint motion"), _jointMotion),
+  ("joint-appendix", istartswith("joint appendix filed"), _jointAppendix),
+  ("petitioner-consent", istartswith("blanket consent filed by petitioner"), _petitionerConsent),
+  ("respondent-consent", istartswith("blanket consent filed by respondent"), _respondentConsent),
+  ("amicus-consent", anyof(startswith("Consent to the filing of amicus curiae briefs"),
+                           startswith("Consent to the filing of amicus briefs")),
+   _amicusConsent),
+]
+
+# Independent checks applied (in order) to every event that did not stop at its rule
+TRAILERS = [
+  ("remanded", icontains("remanded"), _remanded),
+  ("vacated-as-moot", icontains("vacated as moot"), _vacatedAsMoot),
+  ("not-accepted", contains("not accepted for filing."), _notAccepted),
+  ("abuse", contains("petitioner has repeatedly abused"), _abuse),
+  ("recusal", contains("took no part in the consideration"), _recusal),
+]
+
+
+###
+### Rule table compilation
+###
+
+CACHE_SIZE = 16384
+
+def _trieNode (node):
+  alts = []
+  for ch in sorted([x for x in node.keys() if x]):
+    alts.append(re.escape(ch) + _trieNode(node[ch]))
+  if not alts:
+    return ""
+
+  if len(alts) == 1:
+    pat = alts[0]
+  else:
+    pat = "(?:%s)" % ("|".join(alts))
+
+  if "" in node:
+    # Greedy, so the longest literal at any given position wins
+    pat = "(?:%s)?" % (pat)
+  return pat
+
+def _triePattern (literals):
+  trie = {}
+  for lit in literals:
+    node = trie
+    for ch in lit:
+      node = node.setdefault(ch, {})
+    node[""] = True
+  trie.pop("", None)
+  return _trieNode(trie)
+
+
+class _Scanner(object):
+  """Maps the literals that lead ("start") or occur anywhere in ("contains") a string to the rules
+  they trigger, using one anchored match and one scan of trie-shaped regexes"""
+  def __init__ (self, starts, contains):
+    self._match = re.compile(_triePattern(starts.keys()) or "(?!)").match
+    cpat = _triePattern(contains.keys()) or "(?!)"
+    self._findall = re.compile(cpat).findall
+    self._search = re.compile(cpat).search
+
+    # A match also implies every shorter literal that it contains (or begins with, when anchored)
+    self._starts = {}
+    for lit in starts:
+      idxs = set()
+      for x in starts:
+        if lit.startswith(x):
+          idxs.update(starts[x])
+      self._starts[lit] = tuple(idxs)
+
+    self._contains = {}
+    for lit in contains:
+      idxs = set()
+      for x in contains:
+        if lit.count(x):
+          idxs.update(contains[x])
+      self._contains[lit] = tuple(idxs)
+
+    self._few = None
+    if len(contains) <= 8:
+      self._few = list(contains.keys())
+
+    # Literals whose tail can begin another literal - findall() could hide the second one, so if
+    # one of these matches we rescan resuming inside each match
+    self._overlaps = set()
+    for lit in contains:
+      for other in contains:
+        for idx in range(1, len(lit)):
+          tail = lit[idx:]
+          if len(other) > len(tail) and other.startswith(tail):
+            self._overlaps.add(lit)
+
+  def collect (self, text, cands):
+    m = self._match(text)
+    if m:
+      cands.update(self._starts[m.group()])
+
+    contains = self._contains
+    if self._few is not None:
+      # Plain substring tests beat the regex engine for a handful of literals
+      for lit in self._few:
+        if lit in text:
+          cands.update(contains[lit])
+      return
+
+    for lit in self._findall(text):
+      if lit in self._overlaps:
+        m = self._search(text)
+        while m is not None:
+          cands.update(contains[m.group()])
+          m = self._search(text, m.start() + 1)
+        break
+      cands.update(contains[lit])
+
+
+class _RuleTable(object):
+  """Ordered rules (first match wins) followed by independent trailing rules"""
+  def __init__ (self, rules, trailers):
+    self.first = len(rules)
+    self.rules = []
+    self._cache = {}
+
+    triggers = {}
+    for idx,(name, pred, handler) in enumerate(rules + trailers):
+      tlist = pred.triggers()
+      if not tlist:
+        raise ValueError("Rule %s does not test any literal text" % (name))
+      for trigger in tlist:
+        triggers.setdefault(trigger, set()).add(idx)
+      if pred.exact:
+        self.rules.append((name, None, handler))
+      else:
+        self.rules.append((name, pred.compile(), handler))
+
+    self.scanners = []
+    for lower in (False, True):
+      starts = {}
+      contains = {}
+      for ((kind, l, lit), idxs) in triggers.items():
+        if l == lower:
+          if kind == "start":
+            starts[lit] = idxs
+          else:
+            contains[lit] = idxs
+      self.scanners.append(_Scanner(starts, contains))
+
+  def candidates (self, etxt, letxt):
+    try:
+      return self._cache[etxt]
+    except KeyError:
+      pass
+
+    cands = set()
+    self.scanners[0].collect(etxt, cands)
+    self.scanners[1].collect(letxt, cands)
+    cands = sorted(cands)
+
+    # Boilerplate entries repeat constantly across a term, so remember recent texts
+    if len(self._cache) >= CACHE_SIZE:
+      self._cache.clear()
+    self._cache[etxt] = cands
+    return cands
+
+
+_TABLE = _RuleTable(RULES, TRAILERS)
+
+
+def classifyEvent (dinfo, einfo, evtobj):
+  """Apply the flags and docket state implied by a single ProceedingsandOrder entry"""
+  etxt = einfo["Text"]
+  letxt = etxt.lower()
+
+  ruled = False
+  for idx in _TABLE.candidates(etxt, letxt):
+    exclusive = idx < _TABLE.first
+    if exclusive and ruled:
+      continue
+    (name, pred, handler) = _TABLE.rules[idx]
+    if pred is None or pred(etxt, letxt):
+      stop = handler(dinfo, evtobj, einfo, etxt)
+      if exclusive:
+        if stop:
+          return
+        ruled = True
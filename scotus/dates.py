@@ -0,0 +1,63 @@
+# Copyright (c) 2022  Floyd Terbo
+
+# Date parsing for docket data.  The court's JSON only uses a handful of date shapes, which we
+# recognize directly - anything else falls back to dateutil.  Results are memoized, since the same
+# dates (conference days, order lists) recur across thousands of dockets in a term.
+
+from __future__ import absolute_import
+
+import datetime
+import re
+
+import dateutil.parser
+
+MONTHS = {}
+for (idx, name) in enumerate(["january", "february", "march", "april", "may", "june", "july",
+                              "august", "september", "october", "november", "december"], 1):
+  MONTHS[name] = idx
+  MONTHS[name[:3]] = idx
+MONTHS["sept"] = 9
+
+CACHE_SIZE = 8192
+
+# Jan 05 2019, January 5, 2019
+NAMED_RE = re.compile(r"\s*([A-Za-z]+)\.? (\d{1,2}),? (\d{4})\.?\s*$")
+# 1/11/2019
+SLASH_RE = re.compile(r"\s*(\d{1,2})/(\d{1,2})/(\d{4})\.?\s*$")
+# 2019-01-11
+ISO_RE = re.compile(r"\s*(\d{4})-(\d{1,2})-(\d{1,2})\s*$")
+
+_cache = {}
+
+def _fastParse (datestr):
+  m = NAMED_RE.match(datestr)
+  if m:
+    month = MONTHS.get(m.group(1).lower())
+    if month:
+      return datetime.date(int(m.group(3)), month, int(m.group(2)))
+    return None
+
+  m = SLASH_RE.match(datestr)
+  if m:
+    return datetime.date(int(m.group(3)), int(m.group(1)), int(m.group(2)))
+
+  m = ISO_RE.match(datestr)
+  if m:
+    return datetime.date(int(m.group(1)), int(m.group(2)), int(m.group(3)))
+
+
+def parseDate (datestr):
+  """Parse a date string from docket data (or user arguments) into a datetime.date"""
+  try:
+    return _cache[datestr]
+  except KeyError:
+    pass
+
+  d = _fastParse(datestr)
+  if d is None:
+    d = dateutil.parser.parse(datestr).date()
+
+  if len(_cache) >= CACHE_SIZE:
+    _cache.clear()
+  _cache[datestr] = d
+  return d
@@ -1,79 +1,122 @@
-# Copyright (c) 2018-2021  Floyd Terbo
+# Copyright (c) 2018-2022  Floyd Terbo
+
+from __future__ import absolute_import
+
+import datetime
+
+from . import dates
+
+# Every flag an event can carry - each one is a bit in DocketEvent._flags
+FLAGS = [
+  "additional_question",
+  "affirmed",
+  "amici_court_appointed",
+  "amici_granted_out_of_time",
+  "amicus_brief",
+  "argued",
+  "brief",
+  "circulated",
+  "counsel_granted",
+  "cvsg",
+  "cvsg_return",
+  "denied",
+  "dismissed",
+  "dispense_printing_granted",
+  "distributed",
+  "granted",
+  "ifp_denied",
+  "ifp_granted",
+  "ifp_paid",
+  "ifp_respondent",
+  "inquorate",
+  "issued",
+  "joint_appendix",
+  "joint_motion",
+  "letter",
+  "mooted",
+  "motion_denied",
+  "motion_divided_argument",
+  "motion_divided_denied",
+  "motion_divided_granted",
+  "motion_time_enlargement",
+  "motion_time_enlargement_granted",
+  "not_accepted",
+  "petitioner_blanket_consent",
+  "record_pacer",
+  "record_received",
+  "record_requested",
+  "record_returned",
+  "rehearing_requested",
+  "rehearing_denied",
+  "removed",
+  "remanded",
+  "respondent_blanket_consent",
+  "response_requested",
+  "response_memo",
+  "reversed",
+  "set_for_argument",
+  "set_for_reargument",
+  "sg_motion_divided_argument",
+  "sg_motion_divided_denied",
+  "sg_motion_divided_granted",
+  "sg_grant_divided_argument",
+  "time_to_file",
+  "vacated",
+  "waive_response",
+  "waive_waiting_period",
+]
 
-import dateutil.parser
 
 class DocketEvent(object):
-  def __init__ (self, edict):
-    self.date = None
+  # Events are by far the most numerous objects when loading whole terms, so they carry no
+  # __dict__: flags are packed into one integer and the date is kept as an ordinal
+  __slots__ = ("text", "_ordinal", "_flags", "_e_dict")
+
+  def __init__ (self, edict, keep_raw = True):
     self.text = None
-    self._e_dict = edict
-    self._build()
-
-    self.additional_question = False
-    self.affirmed = False
-    self.amici_court_appointed = False
-    self.amici_granted_out_of_time = False
-    self.amicus_brief = False
-    self.argued = False
-    self.brief = False
-    self.circulated = False
-    self.counsel_granted = False
-    self.cvsg = False
-    self.cvsg_return = False
-    self.denied = False
-    self.dismissed = False
-    self.dispense_printing_granted = False
-    self.distributed = False
-    self.granted = False
-    self.ifp_denied = False
-    self.ifp_granted = False
-    self.ifp_paid = False
-    self.ifp_respondent = False
-    self.inquorate = False
-    self.issued = False
-    self.joint_appendix = False
-    self.joint_motion = False
-    self.letter = False
-    self.mooted = False
-    self.motion_denied = False
-    self.motion_divided_argument = False
-    self.motion_divided_denied = False
-    self.motion_divided_granted = False
-    self.motion_time_enlargement = False
-    self.motion_time_enlargement_granted = False
-    self.not_accepted = False
-    self.petitioner_blanket_consent = False
-    self.record_pacer = False
-    self.record_received = False
-    self.record_requested = False
-    self.record_returned = False
-    self.rehearing_requested = False
-    self.rehearing_denied = False
-    self.removed = False
-    self.remanded = False
-    self.respondent_blanket_consent = False
-    self.response_requested = False
-    self.response_memo = False
-    self.set_for_argument = False
-    self.set_for_reargument = False
-    self.sg_motion_divided_argument = False
-    self.sg_grant_divided_argument = False
-    self.time_to_file = False
-    self.vacated = False
-    self.waive_response = False
-    self.waive_waiting_period = False
-
-
-  def _build (self):
-    self.date = dateutil.parser.parse(self._e_dict["Date"]).date()
-    self.text = self._e_dict["Text"]
+    self._ordinal = None
+    self._flags = 0
+    self._e_dict = None
+    self._build(edict)
+
+    if keep_raw:
+      self._e_dict = edict
+
+  def _build (self, edict):
+    self._ordinal = dates.parseDate(edict["Date"]).toordinal()
+    self.text = edict["Text"]
+
+  @property
+  def date (self):
+    if self._ordinal is None:
+      return None
+    return datetime.date.fromordinal(self._ordinal)
+
+  @property
+  def flags (self):
+    return [name for (idx, name) in enumerate(FLAGS) if self._flags & (1 << idx)]
+
+  def __getstate__ (self):
+    return (self.text, self._ordinal, self._flags, self._e_dict)
+
+  def __setstate__ (self, state):
+    (self.text, self._ordinal, self._flags, self._e_dict) = state
 
   def __str__ (self):
-    sl = []
-    for k,v in self.__dict__.items():
-      if v == True:
-        sl.append(k)
-    return "(%s) %s [%s]" % (self.date.strftime("%Y-%m-%d"), self.text, ", ".join(sl))
+    return "(%s) %s [%s]" % (self.date.strftime("%Y-%m-%d"), self.text, ", ".join(self.flags))
+
+
+def _flagProperty (bit):
+  def fget (self):
+    return bool(self._flags & bit)
+
+  def fset (self, val):
+    if val:
+      self._flags |= bit
+    else:
+      self._flags &= ~bit
 
-    
+  return property(fget, fset)
 
+for (idx, name) in enumerate(FLAGS):
+  setattr(DocketEvent, name, _flagProperty(1 << idx))
@@ -0,0 +1,314 @@
+# Copyright (c) 2022  Floyd Terbo
+
+# Text extraction for every PDF consumer (indexDir, the QP text, the QP parsers, orderparse), so a
+# PDF is only parsed once per engine no matter how many code paths want its text.  pages() returns
+# the text of each page as the engine produced it - callers apply their own translation tables -
+# and caches it under the SHA-1 of the PDF's content and the engine name:
+#
+#   $SCOTUSTEXTCACHE (default ~/.cache/scotus-text)/ab/abcdef....pypdf2.json
+#
+# The cache is content-addressed, so it can be shared by every term and checkout, and a PDF that
+# is downloaded again unchanged still hits.  Setting SCOTUSTEXTCACHE to an empty string keeps the
+# cache in memory for the life of the process only.
+#
+#   pdftotext  pdftotext, split on its form feeds
+#   pypdf2     PyPDF2 extractText(), None for pages without /Contents
+#   layout     pdftotext -layout
+#   auto       pdftotext if it is installed, otherwise pypdf2 - what the indexers use by default
+#
+# The QP, disposition and order list parsers depend on PyPDF2's line breaks, so pages() defaults
+# to pypdf2 and only the text that gets indexed comes from the configurable engine.
+#
+# pdftotext is much faster than PyPDF2 and gets the code points right, and is always run from an
+# argument list, never through a shell.  prefetch() extracts a batch of PDFs up front across a
+# pool: pdftotext runs as concurrent subprocesses (large PDFs split into page ranges, from the
+# page count pdfinfo reports), PyPDF2 across worker processes.
+
+from __future__ import absolute_import
+
+import collections
+import distutils.spawn
+import hashlib
+import json
+import logging
+import multiprocessing
+import multiprocessing.pool
+import os
+import os.path
+import subprocess
+
+VERSION = 1
+
+PDFTOTEXT = "pdftotext"
+PYPDF2 = "pypdf2"
+LAYOUT = "layout"
+AUTO = "auto"
+
+CACHE_ROOT = os.getenv("SCOTUSTEXTCACHE", os.path.expanduser("~/.cache/scotus-text"))
+
+# Recently extracted PDFs, so one process asking for the same text repeatedly doesn't even go to disk
+MEMORY_SIZE = 32
+
+# prefetch() splits PDFs longer than this into ranges of this many pages
+RANGE_PAGES = 50
+
+
+class ExtractError(Exception): pass
+
+
+def _pypdf2Pages (path):
+  import PyPDF2
+
+  pages = []
+  with open(path, "rb") as fo:
+    reader = PyPDF2.PdfFileReader(fo, strict = False)
+    for page in range(reader.numPages):
+      try:
+        pages.append(reader.getPage(page).extractText())
+      except KeyError:  # Some PDF pages don't have /Contents
+        pages.append(None)
+  return pages
+
+
+def _runPdftotext (path, first = None, last = None, layout = False):
+  args = ["pdftotext", "-enc", "UTF-8"]
+  if layout:
+    args.append("-layout")
+  if first is not None:
+    args.extend(["-f", str(first)])
+  if last is not None:
+    args.extend(["-l", str(last)])
+  args.extend([path, "-"])
+
+  try:
+    p = subprocess.Popen(args, stdout = subprocess.PIPE, stderr = subprocess.PIPE)
+  except OSError as e:
+    raise ExtractError("Unable to run pdftotext: %s" % (e))
+  (sout, serr) = p.communicate()
+  if p.returncode != 0:
+    raise ExtractError("pdftotext failed for %s (%d): %s" % (path, p.returncode, serr.strip()))
+  # Every page ends in a form feed
+  pages = sout.decode("utf-8", "replace").split(u"\f")
+  if pages and not pages[-1]:
+    pages.pop()
+  return pages
+
+
+def _pdftotextPages (path, first = None, last = None):
+  return _runPdftotext(path, first, last)
+
+
+def _layoutPages (path, first = None, last = None):
+  return _runPdftotext(path, first, last, layout = True)
+
+
+def pageCount (path):
+  """Number of pages pdfinfo reports for the PDF at path, or None if it can't tell"""
+  try:
+    p = subprocess.Popen(["pdfinfo", path], stdout = subprocess.PIPE, stderr = subprocess.PIPE)
+  except OSError:
+    return None
+  (sout, serr) = p.communicate()
+  if p.returncode != 0:
+    return None
+  for line in sout.split("\n"):
+    if line.startswith("Pages:"):
+      return int(line.split()[1])
+  return None
+
+
+_HAVE = {}
+
+def havePdftotext ():
+  if "pdftotext" not in _HAVE:
+    _HAVE["pdftotext"] = bool(distutils.spawn.find_executable("pdftotext"))
+    if not _HAVE["pdftotext"]:
+      logging.debug("pdftotext is not installed, extracting text with PyPDF2")
+  return _HAVE["pdftotext"]
+
+
+def resolve (engine):
+  """The engine AUTO stands for on this machine, or engine itself"""
+  if engine == AUTO:
+    return PDFTOTEXT if havePdftotext() else PYPDF2
+  return engine
+
+
+ENGINES = {
+  PDFTOTEXT : _pdftotextPages,
+  PYPDF2 : _pypdf2Pages,
+  LAYOUT : _layoutPages,
+}
+
+# Engines that can extract a range of pages without reading the rest
+RANGED = set([PDFTOTEXT, LAYOUT])
+
+
+_HASHES = {}
+
+def contentHash (path):
+  """SHA-1 of the file at path, remembered for as long as its size and mtime stay the same"""
+  st = os.stat(path)
+  key = (os.path.abspath(path), st.st_size, st.st_mtime)
+  if key not in _HASHES:
+    sha = hashlib.sha1()
+    with open(path, "rb") as f:
+      while True:
+        data = f.read(1 << 20)
+        if not data:
+          break
+        sha.update(data)
+    _HASHES[key] = sha.hexdigest()
+  return _HASHES[key]
+
+
+def _cachePath (sha1, engine):
+  return "%s/%s/%s.%s.json" % (CACHE_ROOT, sha1[:2], sha1, engine)
+
+
+def _readCache (sha1, engine):
+  if not CACHE_ROOT:
+    return None
+  try:
+    with open(_cachePath(sha1, engine), "rb") as f:
+      obj = json.loads(f.read())
+  except (IOError, ValueError):
+    return None
+  if obj.get("v") != VERSION:
+    return None
+  return obj["pages"]
+
+
+def _writeCache (sha1, engine, pages):
+  if not CACHE_ROOT:
+    return
+  cpath = _cachePath(sha1, engine)
+  try:
+    try:
+      os.makedirs(os.path.dirname(cpath))
+    except OSError:
+      pass
+    tmppath = "%s.%d" % (cpath, os.getpid())
+    with open(tmppath, "wb") as f:
+      f.write(json.dumps({"v" : VERSION, "pages" : pages}))
+    os.rename(tmppath, cpath)
+  except (IOError, OSError):
+    logging.exception("Unable to save extracted text %s" % (cpath))
+
+
+_MEMORY = collections.OrderedDict()
+
+def _remember (key, found):
+  _MEMORY[key] = found
+  while len(_MEMORY) > MEMORY_SIZE:
+    _MEMORY.popitem(last = False)
+
+
+def pages (path, engine = PYPDF2, sha1 = None, first = None, last = None):
+  """Text of every page of the PDF at path from engine (None for pages the engine can't read), or
+  of pages first through last (1-based, inclusive).  sha1 can be passed if the caller already
+  hashed the file.
+
+  A page range is served from the cache if the whole PDF is there, and otherwise only extracts
+  that range (without caching it) when the engine can.  Whatever the engine raises for a PDF it
+  can't read at all (PdfReadError, ExtractError) is passed on, and nothing is cached for it."""
+  engine = resolve(engine)
+  if sha1 is None:
+    sha1 = contentHash(path)
+  key = (sha1, engine)
+  found = _MEMORY.pop(key, None)
+  if found is None:
+    found = _readCache(sha1, engine)
+  if found is None:
+    if (first is not None or last is not None) and engine in RANGED:
+      return ENGINES[engine](path, first, last)
+    found = ENGINES[engine](path)
+    _writeCache(sha1, engine, found)
+
+  _remember(key, found)
+  if first is not None or last is not None:
+    return found[(first or 1) - 1:last]
+  return found
+
+
+def _rangeTask (task):
+  (path, engine, first, last) = task
+  try:
+    return ENGINES[engine](path, first, last)
+  except ExtractError as e:
+    return e
+
+
+def _pypdf2Task (path):
+  try:
+    return _pypdf2Pages(path)
+  except Exception as e:
+    # PyPDF2 raises all sorts for broken PDFs, and the pool can only hand back what pickles
+    return ExtractError("PyPDF2 failed for %s: %s" % (path, e))
+
+
+def extractBatch (paths, engine = AUTO, jobs = None):
+  """{path : pages} for every PDF in paths, extracted jobs at a time (default one per CPU) without
+  looking at or filling the cache.  A PDF that can't be read maps to the exception instead."""
+  engine = resolve(engine)
+  jobs = jobs or multiprocessing.cpu_count()
+  out = {}
+  if engine in RANGED:
+    # Concurrent subprocesses, so threads are enough to keep them all busy
+    tasks = []
+    for path in paths:
+      count = pageCount(path) if jobs > 1 else None
+      if count and count > RANGE_PAGES:
+        tasks.extend([(path, engine, first, min(first + RANGE_PAGES - 1, count))
+                      for first in range(1, count + 1, RANGE_PAGES)])
+      else:
+        tasks.append((path, engine, None, None))
+    pool = multiprocessing.pool.ThreadPool(jobs)
+    try:
+      results = pool.map(_rangeTask, tasks)
+    finally:
+      pool.close()
+    # The ranges of a PDF are in order
+    for (task, res) in zip(tasks, results):
+      if isinstance(res, Exception):
+        out[task[0]] = res
+      elif not isinstance(out.get(task[0]), Exception):
+        out.setdefault(task[0], []).extend(res)
+  elif jobs > 1 and len(paths) > 1:
+    pool = multiprocessing.Pool(min(jobs, len(paths)))
+    try:
+      out = dict(zip(paths, pool.map(_pypdf2Task, paths)))
+    finally:
+      pool.close()
+  else:
+    out = dict([(path, _pypdf2Task(path)) for path in paths])
+  return out
+
+
+def prefetch (paths, engine = AUTO, jobs = None):
+  """Extract and cache every PDF in paths that isn't cached yet, so the pages() calls that follow
+  don't wait on them one at a time.  Returns how many were extracted; PDFs that fail are logged and
+  left for pages() to raise on."""
+  if not CACHE_ROOT:
+    return 0
+  engine = resolve(engine)
+  jobs = jobs or multiprocessing.cpu_count()
+  todo = {}
+  for path in paths:
+    sha1 = contentHash(path)
+    if _readCache(sha1, engine) is None:
+      todo.setdefault(sha1, path)
+
+  done = 0
+  items = todo.items()
+  # A few PDFs per worker at a time, so a whole term's text is never held in memory at once
+  for idx in range(0, len(items), jobs * 4):
+    batch = dict(items[idx:idx + jobs * 4])
+    found = extractBatch(batch.values(), engine, jobs)
+    for (sha1, path) in batch.items():
+      if isinstance(found[path], Exception):
+        logging.warning(str(found[path]))
+        continue
+      _writeCache(sha1, engine, found[path])
+      done += 1
+  return done
@@ -5,14 +5,23 @@ from __future__ import absolute_import
 import itertools
 import logging
 
-import dateutil.parser
-
+from . import dates
 from . import decorators as SD
 from .courts import NAMEMAP as LCNAMEMAP
 from .attorneys import Attorney, ATTYMAP
+from .attrindex import PETITIONER, RESPONDENT, PETITIONER_COR, RESPONDENT_COR
 
 FILTERTYPES = {}
 
+# Each filter class carries a COST hint - the rough relative cost of one include() call, where
+# 1 is a header field comparison - which the engine combines with sampled pass rates to decide
+# the order conjunctive filters run in
+DEFAULT_COST = 10
+
+# Filters that are value lookups can also define candidates(index), returning the docket keys a
+# scotus.attrindex.TermIndex says could match (or None), which the engine uses to narrow sources
+# before any docket is parsed.  Unlike mask(), candidates() may over-approximate.
+
 def srcfilter (typ):
   def decorator(k):
     FILTERTYPES[typ] = k
@@ -22,6 +31,8 @@ def srcfilter (typ):
 @srcfilter("case-status")
 @SD.inputs("docket-reference")
 class CaseStatus(object):
+  COST = 4
+
   def __init__ (self, pending = None, dismissed = None, granted = None, argued = None, denied = None,
                 judgment_issued = None, gvr = None):
     self.pending = pending
@@ -68,9 +79,21 @@ class CaseStatus(object):
 
     return True
 
+  def mask (self, table):
+    mask = table["valid"].copy()
+    for col in ["pending", "dismissed", "granted", "argued", "denied", "judgment_issued", "gvr"]:
+      val = getattr(self, col)
+      if val is not None:
+        if not isinstance(val, bool):
+          return None
+        mask &= table.equals(col, val)
+    return mask
+
 @srcfilter("docket-attribute")
 @SD.inputs("docket-reference")
 class DocketAttribute(object):
+  COST = 2
+
   def __init__ (self, **kwargs):
     self.attrs = kwargs
 
@@ -86,17 +109,32 @@ class DocketAttribute(object):
 
     return True
 
+  def mask (self, table):
+    mask = table["valid"].copy()
+    for k,v in self.attrs.items():
+      if k not in table.ATTR_COLUMNS:
+        return None
+      if k in table.CODE_COLUMNS:
+        if v is not None and not isinstance(v, basestring):
+          return None
+      elif not isinstance(v, bool):
+        return None
+      mask &= table.equals(k, v)
+    return mask
+
 
 @srcfilter("distribution")
 @SD.inputs("docket-reference")
 class Distribution(object):
+  COST = 4
+
   def __init__ (self, min_count = 1, conf_date = None, rescheduled = None):
     self.conf_date = None
     self.count = min_count
     self.rescheduled = rescheduled
 
     if conf_date:
-      self.conf_date = dateutil.parser.parse(conf_date).date()
+      self.conf_date = dates.parseDate(conf_date)
       logging.debug("conference date parsed as: %s" % (self.conf_date))
 
   def include (self, docket_ref):
@@ -133,10 +171,35 @@ class Distribution(object):
 
     return True
 
+  def candidates (self, index):
+    if not self.conf_date:
+      return None
+    found = index.lookup("conf_date", self.conf_date.toordinal())
+    if not isinstance(self.rescheduled, bool):
+      return found.keys()
+    return [key for (key, resched) in found.items() if bool(resched) == self.rescheduled]
+
+  def mask (self, table):
+    # Conference dates are per-distribution, so those stay per-docket
+    if self.conf_date:
+      return None
+
+    mask = table["valid"].copy()
+    if self.count:
+      mask &= table["dist_count"] >= self.count
+    if self.rescheduled is not None:
+      if not self.rescheduled:
+        mask &= table["resched_count"] == 0
+      else:
+        mask &= table["resched_count"] >= self.count
+    return mask
+
 
 @srcfilter("event-tag")
 @SD.inputs("docket-reference")
 class EventTag(object):
+  COST = 8
+
   def __init__ (self, **kwargs):
     self._tags = kwargs
 
@@ -155,8 +218,10 @@ class EventTag(object):
 @srcfilter("event-date")
 @SD.inputs("docket-reference")
 class EventDate(object):
+  COST = 6
+
   def __init__ (self, datestr):
-    self._date = dateutil.parser.parse(datestr).date()
+    self._date = dates.parseDate(datestr)
 
   def include (self, docket_ref):
     if not docket_ref.info:
@@ -168,10 +233,15 @@ class EventDate(object):
 
     return False
 
+  def candidates (self, index):
+    return index.lookup("event_date", self._date.toordinal()).keys()
+
 
 @srcfilter("case-type")
 @SD.inputs("docket-reference")
 class CaseType(object):
+  COST = 1
+
   def __init__ (self, type):
     self.case_type = type
 
@@ -181,10 +251,15 @@ class CaseType(object):
 
     return docket_ref.info.casetype == self.case_type
 
+  def mask (self, table):
+    return table["valid"] & table.equals("casetype", self.case_type)
+
 
 @srcfilter("capital")
 @SD.inputs("docket-reference")
 class CapitalFilter(object):
+  COST = 1
+
   def __init__ (self, is_capital = True):
     self.is_capital = is_capital
 
@@ -194,10 +269,17 @@ class CapitalFilter(object):
 
     return docket_ref.info.capital == self.is_capital
 
+  def mask (self, table):
+    if not isinstance(self.is_capital, bool):
+      return None
+    return table["valid"] & table.equals("capital", self.is_capital)
+
 
 @srcfilter("cvsg")
 @SD.inputs("docket-reference")
 class CVSGFilter(object):
+  COST = 3
+
   def __init__ (self, has_cvsg = True):
     self.has_cvsg = has_cvsg
 
@@ -207,11 +289,18 @@ class CVSGFilter(object):
 
     return docket_ref.info.cvsg == self.has_cvsg
 
+  def mask (self, table):
+    if not isinstance(self.has_cvsg, bool):
+      return None
+    return table["valid"] & table.equals("cvsg", self.has_cvsg)
+
 
 
 @srcfilter("lowercourt")
 @SD.inputs("docket-reference")
 class LowerCourtFilter(object):
+  COST = 2
+
   def __init__ (self, court_abbrevs):
     self.cabbrs = court_abbrevs
 
@@ -226,12 +315,27 @@ class LowerCourtFilter(object):
       if LCNAMEMAP[abbr] == docket_ref.info.lowercourt:
         return True
 
+  def candidates (self, index):
+    # Some abbreviations match several court names, so compare against every name we've seen
+    keys = set()
+    for (name, found) in index.attrs["lowercourt"].items():
+      for abbr in self.cabbrs:
+        if LCNAMEMAP[abbr] == name:
+          keys.update(found.keys())
+          break
+    return keys
+
+  def mask (self, table):
+    return table["valid"] & table.isin("lowercourt", [LCNAMEMAP[x] for x in self.cabbrs])
+
 
 @srcfilter("docketdate")
 @SD.inputs("docket-reference")
 class DocketDate(object):
+  COST = 1
+
   def __init__ (self, datestr):
-    self.ddate = dateutil.parser.parse(datestr).date()
+    self.ddate = dates.parseDate(datestr)
 
   def include (self, docket_ref):
     if not docket_ref.info:
@@ -240,6 +344,12 @@ class DocketDate(object):
     if self.ddate == docket_ref.info.docket_date:
       return True
 
+  def candidates (self, index):
+    return index.lookup("docket_date", self.ddate.toordinal()).keys()
+
+  def mask (self, table):
+    return table["valid"] & (table["docket_date"] == self.ddate.toordinal())
+
 
 ATTY_ROLES = {
   "gov" : "isGov",
@@ -252,6 +362,8 @@ ATTY_ROLES = {
 @srcfilter("attorney")
 @SD.inputs("docket-reference")
 class PartyAttorney(object):
+  COST = 20
+
   def __init__ (self, atty_name, role = None, petitioner = None, respondent = None, require_cor = False):
     self.atty_name = atty_name
     self.role = None
@@ -326,9 +438,31 @@ class PartyAttorney(object):
           except KeyError:
             continue
 
+  def candidates (self, index):
+    # Roles are checked per docket, this only narrows by who appears in which position
+    try:
+      fobj = ATTYMAP[self.atty_name]
+    except KeyError:
+      fobj = Attorney(self.atty_name)
+
+    flags = 0
+    if self.petitioner or self.petitioner is None:
+      flags |= PETITIONER_COR if self.require_cor else PETITIONER
+    if self.respondent or self.respondent is None:
+      flags |= RESPONDENT_COR if self.require_cor else RESPONDENT
+
+    keys = set()
+    for (name, found) in index.attrs["attorney"].items():
+      if ATTYMAP.get(name) != fobj:
+        continue
+      keys.update([key for (key, aflags) in found.items() if aflags & flags])
+    return keys
+
 @srcfilter("attyemail")
 @SD.inputs("docket-reference")
 class AttorneyEmail(object):
+  COST = 10
+
   def __init__ (self, email, partial = True):
     self.partial = partial
     self.email = email.lower()
@@ -350,10 +484,19 @@ class AttorneyEmail(object):
 
     return False
 
+  def candidates (self, index):
+    keys = set()
+    for (email, found) in index.attrs["email"].items():
+      if (self.partial and email.count(self.email)) or email == self.email:
+        keys.update(found.keys())
+    return keys
+
 
 @srcfilter("partyname")
 @SD.inputs("docket-reference")
 class PartyName(object):
+  COST = 8
+
   def __init__ (self, name, partial = True, use_all = False):
     self.partyname = name.lower()
     self.partial = partial
@@ -402,6 +545,8 @@ class PartyName(object):
 @srcfilter("amici")
 @SD.inputs("docket-reference")
 class AmiciName(object):
+  COST = 12
+
   def __init__ (self, name, partial = True, cert_only = False):
     self.amicusname = name.lower()
     self.partial = partial
@@ -435,3 +580,35 @@ class AmiciName(object):
         
     return False
 
+
+
+SAMPLE_SIZE = 64
+
+def filterCost (srcf):
+  return getattr(srcf, "COST", DEFAULT_COST)
+
+def planFilters (filter_list, items, sample_size = SAMPLE_SIZE):
+  """Order a conjunction of filters to minimize expected cost per item.
+
+  Pass rates are measured on an evenly spaced sample of items, and filters are sorted by
+  cost / (1 - pass rate), which is the optimal order for independent predicates.  Returns a list
+  of (filter, cost, pass rate) in the order they should run."""
+  if len(filter_list) < 2 or not items:
+    return [(x, filterCost(x), None) for x in filter_list]
+
+  step = max(1, len(items) // sample_size)
+  sample = items[::step][:sample_size]
+
+  plan = []
+  for (idx, srcf) in enumerate(filter_list):
+    passed = len([x for x in sample if srcf.include(x)])
+    rate = float(passed) / len(sample)
+    cost = filterCost(srcf)
+    if rate >= 1.0:
+      rank = float("inf")
+    else:
+      rank = cost / (1.0 - rate)
+    plan.append((rank, idx, srcf, cost, rate))
+
+  plan.sort()
+  return [(srcf, cost, rate) for (rank, idx, srcf, cost, rate) in plan]
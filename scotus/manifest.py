@@ -0,0 +1,157 @@
+# Copyright (c) 2022  Floyd Terbo
+
+# Per-term manifest of every docket directory: number, path, mtime and size of docket.json (and
+# patch.json), and a content hash over both.  Hashes are only recomputed when a stamp changes.
+# Named checkpoints record the hashes as of some run, so a DocketSource with since=<name> can
+# yield only the dockets whose content changed since then - nightly jobs save a checkpoint after
+# each run and only look at what changed the next time.
+
+from __future__ import absolute_import
+
+import hashlib
+import json
+import logging
+import os
+import os.path
+import time
+
+VERSION = 1
+FILENAME = ".manifest.json"
+CHECKPOINT_DIR = ".checkpoints"
+
+
+def _stat (path):
+  try:
+    st = os.stat(path)
+  except OSError:
+    return None
+  return [st.st_mtime, st.st_size]
+
+
+def _hash (dpath):
+  sha = hashlib.sha1()
+  for fname in ("docket.json", "patch.json"):
+    try:
+      with open("%s/%s" % (dpath, fname), "rb") as f:
+        sha.update(f.read())
+    except IOError:
+      pass
+    sha.update("\0")
+  return sha.hexdigest()
+
+
+class TermManifest(object):
+  def __init__ (self, root, term):
+    self.root = root
+    self.term = term
+    self.tpath = "%s/OT-%d" % (root, term)
+    self.path = "%s/%s" % (self.tpath, FILENAME)
+    self.entries = self._read()
+
+  def _read (self):
+    try:
+      with open(self.path, "rb") as f:
+        obj = json.loads(f.read())
+    except (IOError, ValueError):
+      return {}
+    if obj.get("v") != VERSION:
+      return {}
+    return obj["entries"]
+
+  def _write (self):
+    tmppath = "%s.%d" % (self.path, os.getpid())
+    with open(tmppath, "wb") as f:
+      f.write(json.dumps({"v" : VERSION, "entries" : self.entries}))
+    os.rename(tmppath, self.path)
+
+  def _listKeys (self):
+    droot = "%s/dockets" % (self.tpath)
+    keys = []
+    if os.path.exists(droot):
+      keys.extend(["dockets/%s" % (x) for x in os.listdir(droot) if not x.startswith(".") and x != "A"])
+    if os.path.exists("%s/A" % (droot)):
+      keys.extend(["dockets/A/%s" % (x) for x in os.listdir("%s/A" % (droot))
+                   if not x.startswith(".") and x != "indexes.json"])
+    return keys
+
+  def refresh (self):
+    """Re-stat every docket and rehash the ones whose docket.json or patch.json changed"""
+    keys = self._listKeys()
+    changed = 0
+    for key in keys:
+      dpath = "%s/%s" % (self.tpath, key)
+      dstat = _stat("%s/docket.json" % (dpath))
+      pstat = _stat("%s/patch.json" % (dpath))
+      entry = self.entries.get(key)
+      if entry and entry["mtime"] == (dstat and dstat[0]) and entry["size"] == (dstat and dstat[1]) \
+          and entry["patch"] == pstat:
+        continue
+      self.entries[key] = {"number" : int(os.path.basename(key)), "path" : key,
+                           "mtime" : dstat and dstat[0], "size" : dstat and dstat[1], "patch" : pstat,
+                           "sha1" : _hash(dpath) if dstat else None}
+      changed += 1
+
+    gone = set(self.entries.keys()) - set(keys)
+    for key in gone:
+      del self.entries[key]
+
+    if changed or gone:
+      logging.debug("Manifest %s: %d changed, %d removed" % (self.path, changed, len(gone)))
+      try:
+        self._write()
+      except (IOError, OSError):
+        logging.exception("Unable to save manifest %s" % (self.path))
+    return self
+
+  def hashes (self):
+    return dict([(key, entry["sha1"]) for (key, entry) in self.entries.items()])
+
+  def _checkpointPath (self, name):
+    return "%s/%s/%s.json" % (self.tpath, CHECKPOINT_DIR, name)
+
+  def checkpoint (self, name):
+    """Hashes recorded under name, or None if there is no such checkpoint"""
+    try:
+      with open(self._checkpointPath(name), "rb") as f:
+        return json.loads(f.read())["hashes"]
+    except (IOError, ValueError, KeyError):
+      return None
+
+  def checkpointStamp (self, name):
+    return _stat(self._checkpointPath(name))
+
+  def saveCheckpoint (self, name, hashes = None):
+    """Record hashes (by default the current ones) under name"""
+    if hashes is None:
+      hashes = self.hashes()
+    cpath = self._checkpointPath(name)
+    try:
+      os.makedirs(os.path.dirname(cpath))
+    except OSError:
+      pass
+    tmppath = "%s.%d" % (cpath, os.getpid())
+    with open(tmppath, "wb") as f:
+      f.write(json.dumps({"created" : time.time(), "hashes" : hashes}))
+    os.rename(tmppath, cpath)
+
+  def changedSince (self, since):
+    """Keys of dockets that changed since a named checkpoint, or since a unix time.
+
+    A checkpoint that doesn't exist yet counts as everything having changed."""
+    if isinstance(since, (int, long, float)):
+      return set([key for (key, entry) in self.entries.items()
+                  if max(entry["mtime"], entry["patch"] and entry["patch"][0]) > since])
+
+    previous = self.checkpoint(since)
+    if previous is None:
+      return set(self.entries.keys())
+    return set([key for (key, entry) in self.entries.items() if previous.get(key) != entry["sha1"]])
+
+
+_MANIFESTS = {}
+
+def termManifest (root, term):
+  key = (os.path.abspath(root), term)
+  if key not in _MANIFESTS:
+    _MANIFESTS[key] = TermManifest(root, term)
+  return _MANIFESTS[key]
@@ -10,9 +10,16 @@ import sys
 import time
 import unicodedata
 
+import scotus.extract
+import scotus.postings
 import scotus.util
 import PyPDF2
 
+# Extraction engine (see scotus.extract) indexDir uses for the text it indexes in new directories,
+# and in any directory it reindexes.  The QP and disposition parsers depend on PyPDF2's line
+# breaks, so they always use PyPDF2.
+ENGINE = scotus.extract.AUTO
+
 JUSTICES = { 17 : set([u"ROBERTS,", u"GINSBURG,", u"KENNEDY,", u"THOMAS,", u"ALITO,",
                        u"GORSUCH,", u"SOTOMAYOR,", u"KAGAN,", u"BREYER,"]),
              18 : set([u"ROBERTS,", u"GINSBURG,", u"KAVANAUGH,", u"THOMAS,", u"ALITO,",
@@ -21,28 +28,67 @@ JUSTICES = { 17 : set([u"ROBERTS,", u"GINSBURG,", u"KENNEDY,", u"THOMAS,", u"ALI
                        u"GORSUCH,", u"SOTOMAYOR,", u"KAGAN,", u"BREYER,"])}
 
 class DirIndex(object):
-  def __init__ (self, path):
-    self._rawpath = path
-    self._index = {}
+  """Word and phrase counts for the files in one indexed directory.
 
-    with open("%s/indexes.json" % (self._rawpath), "rb") as idxf:
-      index_obj = json.loads(idxf.read())
+  Counts come from the term-wide postings index when it is up to date for this directory, and
+  from the directory's own indexes.json (or the extracted text, for phrases it has no n-grams
+  for) otherwise."""
+  def __init__ (self, path):
+    self._rawpath = path.rstrip("/")
+    self._name = os.path.basename(self._rawpath)
+    self._index = None
 
-    self._index = index_obj
+    self._postings = scotus.postings.forDir(self._rawpath)
+    if not self._postings:
+      with open("%s/indexes.json" % (self._rawpath), "rb") as idxf:
+        self._index = json.loads(idxf.read())
 
   def gramsearch (self, fname, ngram, term):
+    """Count of term (ngram words long) in fname, or False if fname was not indexed"""
+    if self._postings:
+      if fname not in self._postings.files(self._name):
+        return False
+      return self._postings.lookup(term).get((self._name, fname), 0)
+
     if fname not in self._index:
       return False
 
     gstr = "%d-gram" % (ngram)
     if gstr not in self._index[fname]:
-      return False
+      try:
+        words = scotus.postings.readWords(scotus.postings.textPath(self._rawpath, fname))
+      except IOError:
+        return False
+      return scotus.postings.phraseCount(words, scotus.postings.normalize(term).split())
 
     if term in self._index[fname][gstr]:
-      return self._index[fname][gstr]
+      return self._index[fname][gstr][term]
 
     return 0
 
+  def textsearch (self, fname, query):
+    """[(term, count)] if fname matches query (a textquery.Query), None if it doesn't, or False
+    if fname was not indexed"""
+    if self._postings:
+      if fname not in self._postings.files(self._name):
+        return False
+      return self._postings.run(query).get((self._name, fname))
+
+    if fname not in self._index:
+      return False
+    try:
+      words = scotus.postings.readWords(scotus.postings.textPath(self._rawpath, fname))
+    except IOError:
+      words = []
+    return query.matchWords(words)
+
+  def score (self, fname, terms):
+    """BM25 score of fname for terms against the rest of the term, or None without a postings
+    index to take the corpus statistics from"""
+    if not self._postings:
+      return None
+    return self._postings.score(self._name, fname, terms)
+
 
 
 def getPuncFilter (tt = {}):
@@ -80,93 +126,187 @@ def getFixTable (tt = {}):
 
 
 def getPdfPage (path, page, translate = dict):
-  import PyPDF2
-
   tt = translate()
-  with open(path, "rb") as fo:
-    reader = PyPDF2.PdfFileReader(fo, strict=False)
-    text = reader.getPage(page).extractText().translate(tt)
-    return text
+  text = scotus.extract.pages(path, scotus.extract.PYPDF2)[page]
+  if text is None:
+    raise KeyError("/Contents")
+  return text.translate(tt)
 
 
 def findPdfPage (path, terms):
   tt = {10 : None}
-  with open(path, "rb") as fo:
-    reader = PyPDF2.PdfFileReader(fo, strict=False)
-    for pno,page in enumerate(range(reader.numPages)):
-      try:
-        clean_text = reader.getPage(page).extractText().translate(tt)
-        for term in terms:
-          if clean_text.count(term):
-            return pno
-      except KeyError: # Some PDF pages don't have /Contents
-        continue
+  for pno,text in enumerate(scotus.extract.pages(path, scotus.extract.PYPDF2)):
+    if text is None: # Some PDF pages don't have /Contents
+      continue
+    clean_text = text.translate(tt)
+    for term in terms:
+      if clean_text.count(term):
+        return pno
 
 
 def getPdfWords (path, translate = getPuncFilter):
-  import PyPDF2
-
   tt = translate()
   wd = {}
-  with open(path, "rb") as fo:
-    reader = PyPDF2.PdfFileReader(fo, strict=False)
-    for pno,page in enumerate(range(reader.numPages)):
-      try:
-        clean_text = reader.getPage(page).extractText().translate(tt)
-        wd[pno] = clean_text.split()
-      except KeyError: # Some PDF pages don't have /Contents
-        continue
+  for pno,text in enumerate(scotus.extract.pages(path, scotus.extract.PYPDF2)):
+    if text is None: # Some PDF pages don't have /Contents
+      continue
+    wd[pno] = text.translate(tt).split()
   return wd
 
 
-def indexDir (path, force_pdf = False):
-  logging.info("Indexing %s" % (path))
+# Per-file state for indexDir, next to indexes.json: size, mtime and content hash of every PDF as of
+# when it was indexed, and the engine its text came from, so a run only extracts the PDFs that are
+# new or whose content changed
+INDEXSTATE = ".indexstate.json"
+INDEXSTATE_VERSION = 2
+
+def readIndexState (path):
+  """(engine, {pdf name : {"size", "mtime", "sha1"}}) as of the last indexDir run on path, or
+  (None, None) if there is no state for it"""
+  try:
+    with open("%s/%s" % (path, INDEXSTATE), "rb") as f:
+      obj = json.loads(f.read())
+  except (IOError, ValueError):
+    return (None, None)
+  if obj.get("v") != INDEXSTATE_VERSION:
+    return (None, None)
+  return (obj["engine"], obj["files"])
+
+
+def _writeIndexState (path, engine, files):
+  _writeJSON("%s/%s" % (path, INDEXSTATE), {"v" : INDEXSTATE_VERSION, "engine" : engine,
+                                            "files" : files})
+
+
+def _writeJSON (path, obj):
+  tmppath = "%s.%d" % (path, os.getpid())
+  with open(tmppath, "wb") as f:
+    f.write(json.dumps(obj))
+  os.rename(tmppath, path)
+
+
+def _extractWords (pdfpath, txtpath, tt, engine, sha1 = None):
+  t0 = time.time()
+  words = []
+  for text in scotus.extract.pages(pdfpath, engine, sha1 = sha1):
+    if text is None:  # Some PDF pages don't have /Contents
+      continue
+    words.extend(text.translate(tt).lower().split())
+  with open(txtpath, "w+") as dtxt:
+    dtxt.write(u" ".join(words).encode('utf-8'))
+  logging.debug("Parsing (%s) took %0.2f seconds" % (os.path.basename(pdfpath), time.time() - t0))
+  return words
+
+
+def _planDir (path, force_pdf, reindex):
+  """(indexes, engine, state, new state, [(pdf name, state entry, extract from the PDF)], removed
+  pdf names) for indexDir"""
+  fnames = sorted([x for x in os.listdir(path) if x[-4:] == ".pdf"])
+
+  try:
+    with open("%s/indexes.json" % (path), "rb") as idxf:
+      indexes = json.loads(idxf.read())
+  except (IOError, ValueError):
+    indexes = {}
+  engine = scotus.extract.resolve(ENGINE)
+  (sengine, state) = readIndexState(path)
+  adopt = state is None
+  if adopt:
+    # Everything indexed before there was any state came from PyPDF2
+    sengine = scotus.extract.PYPDF2 if indexes else engine
+  if force_pdf or reindex:
+    if sengine != engine:
+      # Text from another engine can't be mixed with this one's, so everything is extracted again
+      force_pdf = True
+    (state, adopt) = ({}, False)
+  else:
+    # Otherwise a directory keeps the engine its text came from, so new files match the rest and
+    # installing pdftotext doesn't re-extract the whole term
+    engine = sengine
+  state = state or {}
+
+  newstate = {}
+  todo = []
+  for name in fnames:
+    st = os.stat("%s/%s" % (path, name))
+    entry = state.get(name)
+    if entry and name in indexes and [entry["size"], entry["mtime"]] == [st.st_size, st.st_mtime]:
+      newstate[name] = entry
+      continue
+
+    sha1 = scotus.extract.contentHash("%s/%s" % (path, name))
+    if name in indexes and ((entry and entry["sha1"] == sha1) or adopt):
+      # Touched but not changed, or indexed before there was any state to check against
+      newstate[name] = {"size" : st.st_size, "mtime" : st.st_mtime, "sha1" : sha1}
+      continue
+
+    # A PDF whose content changed can't use the text extracted from the old one
+    from_pdf = force_pdf or bool(entry) or not os.path.exists("%s/%s.txt" % (path, name[:-4]))
+    todo.append((name, {"size" : st.st_size, "mtime" : st.st_mtime, "sha1" : sha1}, from_pdf))
+
+  removed = [x for x in indexes if x not in fnames]
+  return (indexes, engine, state, newstate, todo, removed)
+
+
+def pendingPdfs (path, force_pdf = False, reindex = False):
+  """[(path, engine)] of the PDFs in path that indexDir would extract text from"""
+  (indexes, engine, state, newstate, todo, removed) = _planDir(path, force_pdf, reindex)
+  return [("%s/%s" % (path, name), engine) for (name, entry, from_pdf) in todo if from_pdf]
+
+
+def indexDir (path, force_pdf = False, reindex = False):
+  """Bring indexes.json in path up to date with the PDFs in it.
+
+  Only PDFs that are new, or whose content changed since the last run (checked by size and mtime,
+  then by hash), are extracted and indexed, and PDFs that are gone are dropped - a directory where
+  nothing changed costs a stat per PDF.  Text comes from the engine the directory was first indexed
+  with (PyPDF2 for directories indexed before the engine was recorded).  reindex indexes every PDF
+  again (from its .txt if there is one, unless ENGINE is a different engine) and force_pdf also
+  extracts every PDF again, both with ENGINE."""
+  (indexes, engine, state, newstate, todo, removed) = _planDir(path, force_pdf, reindex)
+  if not todo and not removed and os.path.exists("%s/indexes.json" % (path)):
+    if newstate != state:
+      _writeIndexState(path, engine, newstate)
+    return
+
+  logging.info("Indexing %s (%d new or changed, %d removed)" % (path, len(todo), len(removed)))
 
   jd = json.loads(open("%s/docket.json" % (path), "rb").read())
   dobj = scotus.util.DocketStatusInfo(jd)
   dobj.getQPText(generate_only = True)
 
-  fnames = [x for x in os.listdir(path) if x[-4:] == ".pdf"]
   tt = getPuncFilter()
+  for name in removed:
+    del indexes[name]
 
-  indexes = {}
-  for name in fnames:
+  for (name, entry, from_pdf) in todo:
     try:
       grams = {}
       txtpath = "%s/%s.txt" % (path, name[:-4])
-      if os.path.exists(txtpath) and not force_pdf:
+      if not from_pdf:
         with open(txtpath, "r") as word_file:
           words = word_file.read().split()
       else:
-        with open("%s/%s" % (path, name), "rb") as fo:
-          t0 = time.time()
-          reader = PyPDF2.PdfFileReader(fo)
-          words = []
-          for page in range(reader.numPages):
-            try:
-              clean_text = reader.getPage(page).extractText().translate(tt).lower()
-              words.extend(clean_text.split())
-            except KeyError:  # Some PDF pages don't have /Contents
-              continue
-          with open(txtpath, "w+") as dtxt:
-            dtxt.write(u" ".join(words).encode('utf-8'))
-          logging.debug("Parsing (%s) took %0.2f seconds" % (name, time.time() - t0))
+        words = _extractWords("%s/%s" % (path, name), txtpath, tt, engine, entry["sha1"])
 
+      # Longer phrases come from the term's positional index (or the text itself)
       grams["1-gram"] = ngrams(words, 1)
-      grams["2-gram"] = ngrams(words, 2)
-      grams["3-gram"] = ngrams(words, 3)
       indexes[name] = grams
-    except PyPDF2.utils.PdfReadError:
-      grams = {"1-gram" : [], "2-gram" : [], "3-gram" : []}
+    except (PyPDF2.utils.PdfReadError, scotus.extract.ExtractError):
+      grams = {"1-gram" : []}
       indexes[name] = grams
     except Exception:
+      # Not recorded in the state, so the next run tries it again
+      logging.exception("Unable to index %s/%s" % (path, name))
+      indexes.pop(name, None)
       continue
+    newstate[name] = entry
+
+  logging.debug("Writing index json (%s)" % (path))
+  _writeJSON("%s/indexes.json" % (path), indexes)
+  _writeIndexState(path, engine, newstate)
 
-  with open("%s/indexes.json" % (path), "w+") as ij:
-    logging.debug("Writing index json (%s)" % (path))
-    ij.write(json.dumps(indexes))
 
-    
 def ngrams (wlist, n):
   output = {}
   for i in range(len(wlist)-n+1):
@@ -177,16 +317,15 @@ def ngrams (wlist, n):
 
 
 def getDisposition(path):
-  f = open(path, "rb")
-  reader = PyPDF2.PdfFileReader(f)
+  pages = scotus.extract.pages(path, scotus.extract.PYPDF2)
   tt = getFixTable()
-  for idx in range(reader.numPages):
-    text = reader.getPage(idx).extractText().translate(tt)
+  for idx in range(len(pages)):
+    text = (pages[idx] or u"").translate(tt)
     if text.count("Opinion of"):
       disp_pno = idx - 1
       break
 
-  text = reader.getPage(disp_pno).extractText().translate(tt)
+  text = pages[disp_pno].translate(tt)
   start = False
   dpt = []
   tlist = "".join(text.split("\n")).split()
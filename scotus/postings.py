@@ -0,0 +1,556 @@
+# Copyright (c) 2022  Floyd Terbo
+
+# Positional word index over every indexed directory under one directory (OT-NN/dockets,
+# OT-NN/opinions, ...), so a search only reads the postings for the words it asks about instead of
+# decoding every docket's indexes.json.  Each normalized word maps to postings of (directory name,
+# file name, count, positions), built from the .txt that indexDir writes next to each PDF.  Every
+# run of two and three adjacent words is indexed with its counts but no positions, so a phrase of
+# up to three words is a single lookup that never decodes a position, the same as the n-gram
+# indexes.json had.  A longer phrase narrows to the files with all of the three word runs that
+# cover it, and only there lines up the positions of its words, least frequent first.
+#
+# That makes the index larger than the n-gram one (the word positions are on top of the same
+# counts, about a third more in benchmark.py postings) in exchange for phrases of any length and
+# NEAR queries without reading any text.  Keeping positions for the pairs instead of the runs of
+# three would make it a little smaller, but phrases of three words - by far the most common long
+# ones - would then have to line up positions again and be several times slower.  files.json
+# records the stamp of every indexes.json and of the text of each file it lists, so refresh() only
+# looks at directories that were reindexed since, and only re-reads the files in them whose text
+# changed.
+#
+# The postings are stored in segments under .postings (see binpostings) and looked up through
+# mmap.  refresh() writes the files it re-read to a new segment and records in files.json which
+# segment now holds each file, so a nightly run costs about as much as the filings it picked up.
+# Copies of a file in older segments are skipped until the segments are merged into one, which
+# happens once there are more than MAX_SEGMENTS of them or more out of date files than live ones.
+# Searching only needs the indexes.json stamps, which copies to skip and the totals for ranking,
+# so those go in meta.json, which is all a search reads before the postings.
+#
+# rank() scores files against a set of words and phrases with BM25.  The document frequencies are
+# in the postings dictionary, and the length of every file, the file count and the total length
+# are recorded when the index is built, so ranking never reads anything but the postings of the
+# query terms.  Only the top files are kept, and once the list is full any file that can't beat the
+# last of them is dropped before it is completely scored (see rank()).
+
+from __future__ import absolute_import
+
+import fcntl
+import glob
+import heapq
+import json
+import logging
+import math
+import os
+import os.path
+
+from . import binpostings
+
+VERSION = 8
+DIRNAME = ".postings"
+
+MAX_SEGMENTS = 8
+
+# BM25 parameters
+K1 = 1.2
+B = 0.75
+
+
+def _stat (path):
+  try:
+    st = os.stat(path)
+  except OSError:
+    return None
+  return [st.st_mtime, st.st_size]
+
+
+def normalize (gram):
+  """The form grams are indexed and looked up under: lowercase, single-spaced unicode"""
+  if isinstance(gram, str):
+    gram = gram.decode("utf-8")
+  return u" ".join(gram.lower().split())
+
+
+def textPath (dpath, fname):
+  """The extracted text indexDir keeps for a PDF"""
+  return "%s/%s.txt" % (dpath, os.path.splitext(fname)[0])
+
+
+def readWords (path):
+  """Normalized words of an extracted text file"""
+  with open(path, "rb") as f:
+    return normalize(f.read().decode("utf-8", "replace")).split()
+
+
+def phraseCount (words, phrase):
+  """Occurrences of phrase (a list of normalized words) in words"""
+  n = len(phrase)
+  return len([x for x in range(len(words) - n + 1) if words[x:x + n] == phrase])
+
+
+# Longest run of words indexed as a single key
+MAX_RUN = 3
+
+def wordRuns (words):
+  """{key : sorted positions} for every word and every run of up to MAX_RUN adjacent words"""
+  positions = {}
+  for (pos, word) in enumerate(words):
+    positions.setdefault(word, []).append(pos)
+  for n in range(2, MAX_RUN + 1):
+    for pos in range(len(words) - n + 1):
+      positions.setdefault(u" ".join(words[pos:pos + n]), []).append(pos)
+  return positions
+
+
+def phraseKeys (words):
+  """[(offset, key)] a phrase of normalized words is looked up by: the phrase itself up to MAX_RUN
+  words, or the runs of MAX_RUN words from the start of the phrase, the last one overlapping the
+  one before it if the length isn't a multiple of MAX_RUN"""
+  if len(words) <= MAX_RUN:
+    return [(0, u" ".join(words))]
+  keys = [(x, u" ".join(words[x:x + MAX_RUN])) for x in range(0, len(words) - MAX_RUN + 1, MAX_RUN)]
+  if len(words) % MAX_RUN:
+    keys.append((len(words) - MAX_RUN, u" ".join(words[-MAX_RUN:])))
+  return keys
+
+
+def phraseStarts (positions):
+  """Sorted start positions of a phrase in one file, from [(offset, sorted positions)] of each of
+  its keys.  Positions can be an iterator that decodes them as it goes - nothing after the first
+  key that doesn't line up is read."""
+  starts = None
+  for (offset, plist) in positions:
+    if starts is None:
+      starts = [x - offset for x in plist]
+    else:
+      out = []
+      j = 0
+      for start in starts:
+        while j < len(plist) and plist[j] < start + offset:
+          j += 1
+        if j == len(plist):
+          break
+        if plist[j] == start + offset:
+          out.append(start)
+      starts = out
+    if not starts:
+      return []
+  return starts
+
+
+class PostingsIndex(object):
+  def __init__ (self, root):
+    self.root = root
+    self.path = "%s/%s" % (root, DIRNAME)
+    self._loadMeta()
+
+    self._file = None
+    self._names = None
+    self._lookups = {}
+    self._queries = {}
+    self._docids = None
+
+  def _readJSON (self, fname):
+    try:
+      with open("%s/%s" % (self.path, fname), "rb") as f:
+        obj = json.loads(f.read())
+    except (IOError, ValueError):
+      return None
+    if obj.get("v") != VERSION:
+      return None
+    return obj
+
+  def _readFiles (self):
+    """({directory name : [indexes.json stamp, {file name : [text stamp, segment, length in
+    words]}]}, [[segment, document count]], number of the next segment)"""
+    obj = self._readJSON("files.json")
+    if obj is None:
+      return ({}, [], 1)
+    return (obj["docs"], obj["segments"], obj["next"])
+
+  def _loadMeta (self):
+    """Read meta.json: the indexes.json stamp of every directory (dirs), [[segment, [out of date
+    document numbers in it]]] (segments) and [file count, total length in words] (stats)"""
+    obj = self._readJSON("meta.json") or {"dirs" : {}, "segments" : [], "stats" : [0, 0]}
+    (self.dirs, self.segments, self.stats) = (obj["dirs"], obj["segments"], obj["stats"])
+
+  def _owners (self, docs):
+    return dict([((name, fname), entry[1]) for (name, (stamp, files)) in docs.items()
+                 for (fname, entry) in files.items()])
+
+  def _segmentPath (self, sname):
+    return "%s/%s.bin" % (self.path, sname)
+
+  @property
+  def file (self):
+    """The open postings (a binpostings.MultiFile over every segment), or None if the index
+    hasn't been built"""
+    if self._file is None and self.segments:
+      try:
+        self._file = binpostings.MultiFile([(self._segmentPath(x), old) for (x, old) in self.segments])
+      except (IOError, binpostings.FormatError):
+        # A merge may have replaced the segments since meta.json was read
+        self._loadMeta()
+        try:
+          self._file = binpostings.MultiFile([(self._segmentPath(x), old) for (x, old) in self.segments])
+        except (IOError, binpostings.FormatError):
+          logging.warning("Unable to open postings for %s" % (self.root))
+    return self._file
+
+  def _listDocs (self):
+    """{directory name : indexes.json stamp} for every directory under root that has one"""
+    stamps = {}
+    for name in os.listdir(self.root):
+      if name.startswith("."):
+        continue
+      stamp = _stat("%s/%s/indexes.json" % (self.root, name))
+      if stamp:
+        stamps[name] = stamp
+    return stamps
+
+  def fresh (self, name):
+    """Whether the postings for directory name match its indexes.json on disk"""
+    stamp = self.dirs.get(name)
+    return bool(stamp) and stamp == _stat("%s/%s/indexes.json" % (self.root, name))
+
+  def refresh (self):
+    """Re-read every indexes.json that changed since the index was built, and drop removed ones"""
+    stamps = self._listDocs()
+    changed = [name for (name, stamp) in stamps.items() if self.dirs.get(name) != stamp]
+    gone = [name for name in self.dirs if name not in stamps]
+    if changed or gone:
+      self._update(changed, gone, stamps)
+    return self
+
+  def _update (self, changed, gone, stamps):
+    if not os.path.exists(self.path):
+      os.makedirs(self.path)
+
+    with open("%s/.lock" % (self.path), "a+") as lockf:
+      fcntl.flock(lockf, fcntl.LOCK_EX)
+      (docs, segments, nextseg) = self._readFiles()
+
+      # Within a reindexed directory only the files whose text changed are read again, the rest
+      # stay in the segments that already have them
+      reread = {}
+      for name in gone:
+        docs.pop(name, None)
+      for name in changed:
+        dpath = "%s/%s" % (self.root, name)
+        old = docs.pop(name, [None, {}])[1]
+        try:
+          with open("%s/indexes.json" % (dpath), "rb") as idxf:
+            fnames = json.loads(idxf.read()).keys()
+        except (IOError, ValueError):
+          logging.warning("Unable to read %s/indexes.json" % (dpath))
+          continue
+        files = {}
+        for fname in fnames:
+          tstamp = _stat(textPath(dpath, fname))
+          if fname in old and old[fname][0] == tstamp:
+            files[fname] = old[fname]
+          else:
+            files[fname] = [tstamp, None, 0]
+            reread.setdefault(name, []).append(fname)
+        docs[name] = [stamps[name], files]
+
+      if reread:
+        # Segment names are never reused, so a reader holding an older meta.json can't open the
+        # wrong file
+        sname = "seg-%d" % (nextseg)
+        nextseg += 1
+        newdocs = []
+        grams = {}
+        for (name, fnames) in sorted(reread.items()):
+          dpath = "%s/%s" % (self.root, name)
+          for fname in sorted(fnames):
+            try:
+              words = readWords(textPath(dpath, fname))
+            except IOError:
+              # Nothing could be extracted from this one
+              words = []
+            for (key, kpos) in wordRuns(words).items():
+              if " " in key:
+                grams.setdefault(key, []).append((len(newdocs), len(kpos)))
+              else:
+                grams.setdefault(key, []).append((len(newdocs), len(kpos),
+                                                  binpostings.encodePositions(kpos)))
+            docs[name][1][fname][1:] = [sname, len(words)]
+            newdocs.append((name, fname, len(words)))
+        binpostings.write(self._segmentPath(sname), newdocs, grams, positional = True)
+        segments.append([sname, len(newdocs)])
+
+      # Segments nothing points at any more are dropped, and the rest are merged once there are
+      # too many of them or they hold more out of date copies than live files
+      owners = self._owners(docs)
+      live = {}
+      for sname in owners.values():
+        live[sname] = live.get(sname, 0) + 1
+      segments = [x for x in segments if live.get(x[0])]
+      if len(segments) > MAX_SEGMENTS or sum([x[1] for x in segments]) > 2 * len(owners):
+        segments = [self._merge(docs, segments, owners, "seg-%d" % (nextseg))]
+        nextseg += 1
+
+      # The document numbers of the out of date copies in each segment, for readers
+      old = []
+      for (sname, count) in segments:
+        pfile = binpostings.PostingsFile(self._segmentPath(sname))
+        old.append([sname, [idx for (idx, doc) in enumerate(pfile.docs) if owners.get(doc) != sname]])
+        pfile.close()
+      lengths = [x[2] for (stamp, files) in docs.values() for x in files.values()]
+
+      self._writeJSON("files.json", {"v" : VERSION, "docs" : docs, "segments" : segments,
+                                     "next" : nextseg})
+      self._writeJSON("meta.json", {"v" : VERSION, "segments" : old,
+                                    "dirs" : dict([(name, x[0]) for (name, x) in docs.items()]),
+                                    "stats" : [len(lengths), sum(lengths)]})
+
+      # Replaced segments, and whatever the earlier formats left behind
+      keep = set(["%s.bin" % (x[0]) for x in segments])
+      for path in glob.glob("%s/*.bin" % (self.path)) + glob.glob("%s/*.pickle" % (self.path)):
+        if os.path.basename(path) not in keep:
+          os.unlink(path)
+
+    logging.debug("Postings %s: %d directories changed, %d files read, %d removed, %d segments" % (
+        self.path, len(changed), sum([len(x) for x in reread.values()]), len(gone), len(segments)))
+    self._loadMeta()
+    if self._file:
+      self._file.close()
+    self._file = None
+    self._names = None
+    self._lookups = {}
+    self._queries = {}
+    self._docids = None
+
+  def _writeJSON (self, fname, obj):
+    tmppath = "%s/%s.%d" % (self.path, fname, os.getpid())
+    with open(tmppath, "wb") as f:
+      f.write(json.dumps(obj))
+    os.rename(tmppath, "%s/%s" % (self.path, fname))
+
+  def _merge (self, docs, segments, owners, sname):
+    """Copy the live postings of every segment into the new segment sname, sorted by directory and
+    file, and point docs at it"""
+    keys = sorted(owners)
+    newids = dict([(key, idx) for (idx, key) in enumerate(keys)])
+    lengths = {}
+    grams = {}
+    for (seg, count) in segments:
+      pfile = binpostings.PostingsFile(self._segmentPath(seg))
+      local = dict([(idx, newids[doc]) for (idx, doc) in enumerate(pfile.docs) if owners.get(doc) == seg])
+      for (idx, doc) in local.items():
+        lengths[doc] = pfile.lengths[idx]
+      for (gram, plist) in pfile.items():
+        plist = [(local[posting[0]],) + posting[1:] for posting in plist if posting[0] in local]
+        if plist:
+          grams.setdefault(gram, []).extend(plist)
+      pfile.close()
+    for plist in grams.values():
+      plist.sort()
+
+    binpostings.write(self._segmentPath(sname), [key + (lengths[idx],) for (idx, key) in enumerate(keys)],
+                      grams, positional = True)
+    for (name, fname) in keys:
+      docs[name][1][fname][1] = sname
+    return [sname, len(keys)]
+
+  def postings (self, word):
+    """[(directory name, file name, count, encoded positions)] for a single word, sorted by
+    directory and file"""
+    if not self.file:
+      return []
+    docs = self.file.docs
+    return sorted([docs[doc] + (count, blob) for (doc, count, blob) in self.file.lookup(normalize(word))])
+
+  def _find (self, gram):
+    """({document index : count}, {(directory name, file name) : count}) for a normalized word or
+    phrase"""
+    if gram not in self._lookups:
+      words = gram.split()
+      if not self.file:
+        byid = {}
+      elif len(words) == 1:
+        byid = dict(self.file.lookup(gram, positions = False))
+      else:
+        byid = self._phrase(words)
+      docs = self.file.docs if self.file else []
+      self._lookups[gram] = (byid, dict([(docs[doc], count) for (doc, count) in byid.items()]))
+    return self._lookups[gram]
+
+  def lookup (self, gram):
+    """{(directory name, file name) : count} for a word or a phrase of any length"""
+    return self._find(normalize(gram))[1]
+
+  def _phrase (self, words):
+    # Up to MAX_RUN words is one key, counted without any positions.  Longer phrases narrow to the
+    # files that have every run that covers them before decoding the positions of their words.
+    keys = phraseKeys(words)
+    if len(keys) == 1:
+      return dict(self.file.lookup(keys[0][1], positions = False))
+
+    docs = None
+    for plist in sorted([self.file.lookup(key, positions = False) for (offset, key) in keys], key = len):
+      docs = set([doc for (doc, count) in plist if docs is None or doc in docs])
+      if not docs:
+        return {}
+
+    found = {}
+    postings = dict([(word, dict([(x[0], x[1:]) for x in self.file.lookup(word) if x[0] in docs]))
+                     for word in set(words)])
+    for doc in docs:
+      # The words that occur least in this file go first, so the fewest positions are decoded
+      order = sorted(enumerate(words), key = lambda x: postings[x[1]][doc][0])
+      starts = phraseStarts((offset, binpostings.decodePositions(postings[word][doc][1]))
+                            for (offset, word) in order)
+      if starts:
+        found[doc] = len(starts)
+    return found
+
+  def files (self, name):
+    """Names of the files indexed for directory name"""
+    if self._names is None:
+      self._names = {}
+      for (dname, fname) in (self.file.docs if self.file else []):
+        self._names.setdefault(dname, set()).add(fname)
+    return self._names.get(name, set())
+
+  def search (self, terms, min_count = 0):
+    """{(directory name, file name) : [(term, count)]} for every file that has all terms at
+    least min_count times"""
+    matches = None
+    hits = []
+    for term in terms:
+      found = self.lookup(term)
+      hits.append((term, found))
+      if matches is None:
+        matches = set(found.keys())
+      else:
+        matches &= set(found.keys())
+
+    out = {}
+    for key in (matches or []):
+      counts = [(term, found[key]) for (term, found) in hits]
+      if min([count for (term, count) in counts]) >= min_count:
+        out[key] = counts
+    return out
+
+  def run (self, query):
+    """{(directory name, file name) : [(term, count)]} for every file that matches a
+    textquery.Query, kept until the index changes"""
+    if query.text not in self._queries:
+      self._queries[query.text] = query.search(self)
+    return self._queries[query.text]
+
+  def _idf (self, df):
+    ndocs = self.stats[0]
+    return math.log(1.0 + (ndocs - df + 0.5) / (df + 0.5))
+
+  def _weight (self, idf, count, length):
+    avglen = float(self.stats[1]) / self.stats[0] if self.stats[0] else 1.0
+    return idf * count * (K1 + 1) / (count + K1 * (1 - B + B * length / avglen))
+
+  def score (self, name, fname, terms):
+    """BM25 score of one file for terms (words or phrases), 0 if it wasn't indexed"""
+    if not self.file:
+      return 0.0
+    if self._docids is None:
+      self._docids = dict([(doc, idx) for (idx, doc) in enumerate(self.file.docs)])
+    doc = self._docids.get((name, fname))
+    if doc is None:
+      return 0.0
+
+    score = 0.0
+    for term in terms:
+      found = self._find(normalize(term))[0]
+      if doc in found:
+        score += self._weight(self._idf(len(found)), found[doc], self.file.lengths[doc])
+    return score
+
+  def rank (self, terms, top = 10, accept = None):
+    """[(score, (directory name, file name), [(term, count)])] for the top files by BM25 score
+    against terms (words or phrases), best first.  A file only needs one of the terms to be
+    ranked.  accept, if given, is called with (directory name, file name) for a file that would
+    make the list and can turn it down."""
+    pfile = self.file
+    if not pfile or top <= 0:
+      return []
+
+    # One term can add at most idf * (K1 + 1) to a score.  With the terms in order of that bound,
+    # bounds[i] is the most terms 0..i can add together, and once the list is full a file that
+    # only has terms whose bounds add up to no more than the lowest score kept can't make it, so
+    # only the files in the remaining ("essential") terms are looked at.
+    qterms = []
+    for term in terms:
+      found = self._find(normalize(term))[0]
+      if found:
+        idf = self._idf(len(found))
+        qterms.append((idf * (K1 + 1), idf, term, found))
+    hits = list(qterms)
+    qterms.sort(key = lambda x: x[0])
+    bounds = []
+    for qterm in qterms:
+      bounds.append(qterm[0] + (bounds[-1] if bounds else 0.0))
+
+    heap = []
+    threshold = 0.0
+    essential = 0
+    candidates = set()
+    for qterm in qterms:
+      candidates.update(qterm[3].keys())
+
+    for doc in sorted(candidates):
+      if essential and not [x for x in qterms[essential:] if doc in x[3]]:
+        continue
+
+      full = len(heap) == top
+      score = 0.0
+      for idx in range(len(qterms) - 1, -1, -1):
+        if full and score + bounds[idx] <= threshold:
+          break
+        (bound, idf, term, found) = qterms[idx]
+        if doc in found:
+          score += self._weight(idf, found[doc], pfile.lengths[doc])
+      else:
+        if full and score <= threshold:
+          continue
+        if accept and not accept(pfile.docs[doc]):
+          continue
+        if full:
+          heapq.heapreplace(heap, (score, -doc))
+        else:
+          heapq.heappush(heap, (score, -doc))
+        if len(heap) == top:
+          threshold = heap[0][0]
+          while essential < len(qterms) and bounds[essential] <= threshold:
+            essential += 1
+
+    out = []
+    for (score, ndoc) in sorted(heap, reverse = True):
+      doc = -ndoc
+      out.append((score, pfile.docs[doc], [(term, found[doc]) for (bound, idf, term, found) in hits
+                                           if doc in found]))
+    return out
+
+
+_INDEXES = {}
+
+def termIndex (root):
+  key = os.path.abspath(root)
+  if key not in _INDEXES:
+    _INDEXES[key] = PostingsIndex(root)
+  return _INDEXES[key]
+
+
+def refreshIndex (root):
+  """Bring the postings index for root up to date, loading it if needed"""
+  return termIndex(root).refresh()
+
+
+def forDir (dpath):
+  """The postings index covering dpath, if it is up to date for dpath, otherwise None"""
+  (root, name) = os.path.split(dpath.rstrip("/"))
+  if not os.path.exists("%s/%s/meta.json" % (root, DIRNAME)):
+    return None
+  index = termIndex(root)
+  if index.fresh(name):
+    return index
+  return None
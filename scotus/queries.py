@@ -6,6 +6,7 @@ import logging
 import os.path
 
 from . import decorators as SD
+from . import textquery
 
 QUERYTYPES = {}
 
@@ -48,6 +49,64 @@ class PetitionQuery(object):
     return (docket_ref, {"query_term" : self.query_term, "count" : count})
 
 
+@query("petition-ngram-scored")
+@SD.inputs("docket-reference")
+@SD.returns("docket-reference")
+class ScoredPetitionQuery(PetitionQuery):
+  """petition-ngram, with the BM25 score of the petition for query_term (and any extra_terms,
+  which add to the score but aren't required) among the term's indexed files.  The score is None
+  if the term has no postings index; min_score drops petitions below it."""
+  def __init__ (self, query_term, min_count = 1, extra_terms = None, min_score = None):
+    super(ScoredPetitionQuery, self).__init__(query_term, min_count)
+    self.extra_terms = extra_terms or []
+    self.min_score = min_score
+
+  def query (self, docket_ref):
+    res = super(ScoredPetitionQuery, self).query(docket_ref)
+    if not res:
+      return res
+
+    pfname = os.path.basename(docket_ref.info.petition_path)
+    score = docket_ref.index.score(pfname, [self.query_term] + self.extra_terms)
+    if self.min_score is not None and (score is None or score < self.min_score):
+      return False
+    res[1]["score"] = score
+    return res
+
+
+@query("petition-text")
+@SD.inputs("docket-reference")
+@SD.returns("docket-reference")
+class PetitionTextQuery(object):
+  """Petitions matching a boolean / proximity query (see scotus.textquery), e.g.
+  "qualified immunity" AND NOT habeas, or "excessive force" NEAR/10 officer"""
+  def __init__ (self, query):
+    self.query_text = query
+    self.parsed = textquery.Query(query)
+    logging.debug("<(petition-text) query : %s>" % (query))
+
+  def query (self, docket_ref):
+    if not docket_ref.info:
+      return None
+
+    try:
+      ppath = docket_ref.info.petition_path
+      if not ppath:
+        return None
+    except IOError:
+      return None
+
+    pfname = os.path.basename(ppath)
+    if not pfname:
+      return None
+
+    counts = docket_ref.index.textsearch(pfname, self.parsed)
+    # An empty list is still a match, for queries like NOT habeas
+    if counts is None or counts is False:
+      return False
+    return (docket_ref, {"query" : self.query_text, "counts" : counts})
+
+
 QTYPES = {
   "contains" : 0,
   "startswith" : 1,
@@ -0,0 +1,90 @@
+# Copyright (c) 2022  Floyd Terbo
+
+# Cache of analysis-engine results, keyed by the canonical JSON spec and validated against a
+# fingerprint of the sources it read (docket count and latest mtime per source).  Entries are one
+# JSON file each under <root>/.resultcache, evicted least-recently-used first once the directory
+# goes over MAX_ENTRIES files or MAX_BYTES.
+
+from __future__ import absolute_import
+
+import hashlib
+import json
+import logging
+import os
+import os.path
+
+VERSION = 1
+DIRNAME = ".resultcache"
+
+MAX_ENTRIES = 256
+MAX_BYTES = 64 * 1024 * 1024
+
+def specKey (spec):
+  canon = json.dumps(spec, sort_keys = True, separators = (",", ":"))
+  return hashlib.sha1("%d:%s" % (VERSION, canon)).hexdigest()
+
+
+class ResultCache(object):
+  def __init__ (self, root = "."):
+    self.path = "%s/%s" % (root, DIRNAME)
+
+  def _entryPath (self, spec):
+    return "%s/%s.json" % (self.path, specKey(spec))
+
+  def get (self, spec, fingerprint):
+    epath = self._entryPath(spec)
+    try:
+      with open(epath, "rb") as ef:
+        entry = json.loads(ef.read())
+    except (IOError, ValueError):
+      return None
+
+    if entry.get("fingerprint") != fingerprint:
+      return None
+
+    # mtime doubles as the LRU clock
+    try:
+      os.utime(epath, None)
+    except OSError:
+      pass
+    return entry["output"]
+
+  def put (self, spec, fingerprint, output):
+    try:
+      os.makedirs(self.path)
+    except OSError:
+      pass
+
+    epath = self._entryPath(spec)
+    tmppath = "%s.%d" % (epath, os.getpid())
+    try:
+      with open(tmppath, "wb") as ef:
+        ef.write(json.dumps({"spec" : spec, "fingerprint" : fingerprint, "output" : output}))
+      os.rename(tmppath, epath)
+    except (IOError, OSError):
+      logging.exception("Unable to write result cache entry %s" % (epath))
+      return
+
+    self.evict()
+
+  def evict (self):
+    entries = []
+    for fname in os.listdir(self.path):
+      if not fname.endswith(".json"):
+        continue
+      try:
+        st = os.stat("%s/%s" % (self.path, fname))
+      except OSError:
+        continue
+      entries.append((st.st_mtime, st.st_size, fname))
+
+    entries.sort(reverse = True)
+    total = 0
+    for (idx, (mtime, size, fname)) in enumerate(entries):
+      total += size
+      # Never evict the newest entry, even if it is over the cap by itself
+      if idx and (idx >= MAX_ENTRIES or total > MAX_BYTES):
+        try:
+          os.unlink("%s/%s" % (self.path, fname))
+        except OSError:
+          pass
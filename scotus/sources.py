@@ -2,13 +2,16 @@
 
 from __future__ import absolute_import
 
-import json
 import logging
 import os
 
+from . import attrindex
+from . import cache
 from . import decorators as SD
 from . import exceptions
+from . import manifest
 from . import parse
+from . import table
 from . import util
 
 SOURCETYPES = {}
@@ -49,10 +52,9 @@ class DocketReference(object):
     try:
       if self._info is None:
         try:
-          with open("%s/docket.json" % (self.path), "rb") as df:
-            docket_obj = json.loads(df.read())
-
-          self._info = util.DocketStatusInfo(docket_obj)
+          # Most filters only look at header fields, so when the term cache can't supply the
+          # docket the events are only walked on demand
+          self._info = util.loadDocketPath(self.path, keep_raw = False, lazy = True)
         except IOError:
           self._info = False
     except exceptions.SCOTUSError:
@@ -70,21 +72,72 @@ class DocketReference(object):
 @source("docket")
 @SD.returns("docket-reference")
 class DocketSource(object):
-  def __init__ (self, root_path, term, paid = False, ifp = False, application = False):
+  """Dockets in a term.
+
+  since limits the source to dockets whose content changed since a named checkpoint (or a unix
+  time), and checkpoint names the checkpoint saveCheckpoint() records once the caller is done -
+  usually the same name, so each run picks up where the last one left off."""
+  def __init__ (self, root_path, term, paid = False, ifp = False, application = False, since = None,
+                checkpoint = None):
     self.term = term
     self.root_path = root_path
     self.paid = paid
     self.ifp = ifp
     self.application = application
-
-    self.didxs  = [int(x) for x in os.listdir("%s/OT-%d/dockets/" % (root_path, term))
-                    if not x.startswith(".") and x != "A"]
+    self.since = since
+    self.checkpoint = checkpoint
+    self._hashes = None
+
+    if since is not None:
+      tm = manifest.termManifest(root_path, term).refresh()
+      self._hashes = tm.hashes()
+      changed = tm.changedSince(since)
+      self.didxs = [tm.entries[x]["number"] for x in changed if not x.startswith("dockets/A/")]
+      self.adidxs = [tm.entries[x]["number"] for x in changed if x.startswith("dockets/A/")]
+      logging.debug("OT-%d: %d dockets changed since %s" % (term, len(changed), since))
+    else:
+      self.didxs  = [int(x) for x in os.listdir("%s/OT-%d/dockets/" % (root_path, term))
+                      if not x.startswith(".") and x != "A"]
+      self.adidxs = [int(x) for x in os.listdir("%s/OT-%d/dockets/A/" % (root_path, term))
+                      if not x.startswith(".") and x != "indexes.json"]
     self.didxs.sort()
-
-    self.adidxs = [int(x) for x in os.listdir("%s/OT-%d/dockets/A/" % (root_path, term))
-                    if not x.startswith(".") and x != "indexes.json"]
     self.adidxs.sort()
 
+  def saveCheckpoint (self):
+    """Record the content of the term as of when this source was created under self.checkpoint"""
+    if not self.checkpoint:
+      return
+    tm = manifest.termManifest(self.root_path, self.term)
+    if self._hashes is None:
+      self._hashes = tm.refresh().hashes()
+    tm.saveCheckpoint(self.checkpoint, self._hashes)
+
+  def refreshCache (self):
+    """Bring the term cache up to date for every docket in this source, in this process"""
+    for ref in self:
+      (tc, key) = cache.forPath(ref.path)
+      if not tc.has(key, cache.docketStamp(ref.path)):
+        ref.info
+    table.refreshTable(self.root_path, self.term)
+    attrindex.refreshIndex(self.root_path, self.term)
+
+  def fingerprint (self):
+    """Docket count and latest mtime over everything the dockets in this source are read from"""
+    count = 0
+    latest = 0
+    for ref in self:
+      count += 1
+      for path in (ref.path, "%s/docket.json" % (ref.path), "%s/patch.json" % (ref.path),
+                   "%s/indexes.json" % (ref.path)):
+        try:
+          latest = max(latest, os.stat(path).st_mtime)
+        except OSError:
+          pass
+    if isinstance(self.since, basestring):
+      return [count, latest, self.since,
+              manifest.termManifest(self.root_path, self.term).checkpointStamp(self.since)]
+    return [count, latest]
+
   def __iter__ (self):
     if self.paid or self.ifp:
       for didx in self.didxs:
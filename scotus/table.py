@@ -0,0 +1,272 @@
+# Copyright (c) 2022  Floyd Terbo
+
+# Columnar per-term docket table.  One row per docket directory (paid/IFP dockets in numeric
+# order, then applications), holding the header and status fields the common filters look at, so
+# those filters can run as numpy boolean masks instead of docket-by-docket in a worker pool.
+# Tables are stored next to the docket cache and only rows whose docket.json or patch.json
+# changed are rebuilt.
+
+from __future__ import absolute_import
+
+import logging
+import os
+import os.path
+
+import numpy
+
+from . import cache
+from . import util
+
+FILENAME = ".dockettable.npz"
+
+BOOL_COLUMNS = ["valid", "application", "pending", "granted", "denied", "dismissed", "gvr", "argued",
+                "judgment_issued", "cvsg", "capital"]
+
+# String columns are stored as codes into a per-table vocabulary, where code 0 is None
+CODE_COLUMNS = ["casetype", "lowercourt"]
+
+INT_COLUMNS = ["number", "docket_date", "dist_count", "resched_count"]
+
+# Columns a filter may compare DocketStatusInfo attributes against directly
+ATTR_COLUMNS = set(BOOL_COLUMNS[2:] + CODE_COLUMNS)
+
+
+def _stampRow (stamp):
+  row = []
+  for fstamp in stamp:
+    if fstamp is None:
+      row.extend([-1, -1])
+    else:
+      row.extend(fstamp)
+  return row
+
+
+def _buildRow (dpath):
+  """Row values for the docket in dpath, from the docket cache where possible"""
+  row = dict([(x, False) for x in BOOL_COLUMNS])
+  row.update(dict([(x, None) for x in CODE_COLUMNS]))
+  row.update(dict([(x, 0) for x in INT_COLUMNS]))
+  row["application"] = os.path.basename(os.path.dirname(os.path.normpath(dpath))) == "A"
+  row["number"] = int(os.path.basename(os.path.normpath(dpath)))
+
+  try:
+    info = util.loadDocketPath(dpath, keep_raw = False)
+  except IOError:
+    return row
+
+  row["valid"] = True
+  for col in BOOL_COLUMNS[2:]:
+    row[col] = bool(getattr(info, col))
+  row["casetype"] = info.casetype
+  row["lowercourt"] = info.lowercourt
+  if info.docket_date:
+    row["docket_date"] = info.docket_date.toordinal()
+  row["dist_count"] = len(info.distributed)
+  row["resched_count"] = len([x for x in info.distributed if x[2]])
+  return row
+
+
+class TermTable(object):
+  ATTR_COLUMNS = ATTR_COLUMNS
+  CODE_COLUMNS = CODE_COLUMNS
+
+  def __init__ (self, root, term):
+    self.root = root
+    self.term = term
+    self.path = "%s/OT-%d/%s" % (root, term, FILENAME)
+
+    self.keys = []
+    self.index = {}
+    self.columns = {}
+    self.vocab = {}
+    self._stamps = None
+
+    self.refresh()
+
+  def __len__ (self):
+    return len(self.keys)
+
+  def __getitem__ (self, name):
+    return self.columns[name]
+
+  def _listKeys (self):
+    droot = "%s/OT-%d/dockets" % (self.root, self.term)
+    keys = []
+    if os.path.exists(droot):
+      keys.extend(["dockets/%d" % (x) for x in sorted([int(x) for x in os.listdir(droot)
+                                                      if not x.startswith(".") and x != "A"])])
+    if os.path.exists("%s/A" % (droot)):
+      keys.extend(["dockets/A/%d" % (x) for x in sorted([int(x) for x in os.listdir("%s/A" % (droot))
+                                                        if not x.startswith(".") and x != "indexes.json"])])
+    return keys
+
+  def _read (self):
+    try:
+      npz = numpy.load(self.path)
+    except (IOError, ValueError):
+      return None
+    with npz:
+      keys = [str(x) for x in npz["keys"]]
+      stamps = npz["stamps"]
+      columns = dict([(x, npz["col_%s" % (x)]) for x in BOOL_COLUMNS + CODE_COLUMNS + INT_COLUMNS])
+      vocab = dict([(x, [None] + list(npz["vocab_%s" % (x)])) for x in CODE_COLUMNS])
+    return (keys, stamps, columns, vocab)
+
+  def _write (self):
+    arrays = {"keys" : numpy.array(self.keys, dtype=str), "stamps" : self._stamps}
+    for (name, col) in self.columns.items():
+      arrays["col_%s" % (name)] = col
+    for (name, vals) in self.vocab.items():
+      arrays["vocab_%s" % (name)] = numpy.array(vals[1:], dtype=unicode)
+
+    tmppath = "%s.%d.npz" % (self.path[:-4], os.getpid())
+    numpy.savez(tmppath, **arrays)
+    os.rename(tmppath, self.path)
+
+  def refresh (self):
+    """Re-stat every docket in the term and rebuild the rows that changed"""
+    keys = self._listKeys()
+    stamps = numpy.array([_stampRow(cache.docketStamp("%s/OT-%d/%s" % (self.root, self.term, x)))
+                          for x in keys], dtype=numpy.float64).reshape((len(keys), 4))
+
+    stored = None
+    if self._stamps is not None:
+      # Already loaded, so only compare against what we have in memory
+      stored = (self.keys, self._stamps, self.columns, self.vocab)
+    elif not cache.REBUILD:
+      stored = self._read()
+
+    self.keys = keys
+    self.index = dict([(key, idx) for (idx, key) in enumerate(keys)])
+    self._stamps = stamps
+
+    old = {}
+    if stored:
+      (okeys, ostamps, ocols, ovocab) = stored
+      if okeys == keys and numpy.array_equal(ostamps, stamps):
+        self.columns = ocols
+        self.vocab = ovocab
+        return
+
+      for (idx, key) in enumerate(okeys):
+        old[key] = (idx, ostamps[idx])
+
+    rows = []
+    changed = 0
+    for (idx, key) in enumerate(keys):
+      if key in old and numpy.array_equal(old[key][1], stamps[idx]):
+        oidx = old[key][0]
+        row = dict([(x, ocols[x][oidx]) for x in BOOL_COLUMNS + INT_COLUMNS])
+        for x in CODE_COLUMNS:
+          row[x] = ovocab[x][ocols[x][oidx]]
+        rows.append(row)
+      else:
+        rows.append(_buildRow("%s/OT-%d/%s" % (self.root, self.term, key)))
+        changed += 1
+
+    self.columns = {}
+    for col in BOOL_COLUMNS:
+      self.columns[col] = numpy.array([x[col] for x in rows], dtype=bool)
+    for col in INT_COLUMNS:
+      self.columns[col] = numpy.array([x[col] for x in rows], dtype=numpy.int32)
+    for col in CODE_COLUMNS:
+      vals = [None] + sorted(set([x[col] for x in rows if x[col] is not None]))
+      codes = dict([(val, idx) for (idx, val) in enumerate(vals)])
+      self.vocab[col] = vals
+      self.columns[col] = numpy.array([codes[x[col]] for x in rows], dtype=numpy.int32)
+
+    if changed or len(old) != len(keys):
+      logging.debug("Rebuilt %d of %d rows in %s" % (changed, len(keys), self.path))
+      try:
+        self._write()
+      except (IOError, OSError):
+        logging.exception("Unable to save docket table %s" % (self.path))
+
+  def equals (self, col, value):
+    """Boolean mask of rows where col == value, for any column type"""
+    if col in CODE_COLUMNS:
+      if value is None:
+        return self.columns[col] == 0
+      # value may match more than one vocabulary entry (courts.CourtMatch does)
+      mask = numpy.zeros(len(self.keys), dtype=bool)
+      for (code, val) in enumerate(self.vocab[col]):
+        if val is not None and value == val:
+          mask |= self.columns[col] == code
+      return mask
+    return self.columns[col] == value
+
+  def isin (self, col, values):
+    """Boolean mask of rows where col is one of values"""
+    mask = numpy.zeros(len(self.keys), dtype=bool)
+    for value in values:
+      mask |= self.equals(col, value)
+    return mask
+
+
+_TABLES = {}
+
+def termTable (root, term):
+  key = (os.path.abspath(root), term)
+  if key not in _TABLES:
+    _TABLES[key] = TermTable(root, term)
+  return _TABLES[key]
+
+
+def refreshTable (root, term):
+  """Bring a term table up to date, loading it if needed"""
+  key = (os.path.abspath(root), term)
+  if key in _TABLES:
+    _TABLES[key].refresh()
+  return termTable(root, term)
+
+
+def prefilter (refs, filters):
+  """Evaluate every filter that supports mask() against the term tables.
+
+  Returns the references that pass those filters, in their original order, along with the
+  filters that still have to be run per docket."""
+  if not refs or not filters:
+    return (refs, filters)
+
+  # Every docket in a directory belongs to the same table, so only split each parent path once
+  parents = {}
+  located = []
+  for ref in refs:
+    (parent, name) = ref.path.rstrip("/").rsplit("/", 1)
+    if parent not in parents:
+      parts = cache.splitPath(parent + "/0")
+      if parts:
+        parents[parent] = (termTable(parts[0], parts[1]), parts[2][:-1])
+      else:
+        parents[parent] = None
+    if parents[parent] is None:
+      return (refs, filters)
+    (table, prefix) = parents[parent]
+    located.append((table, prefix + name))
+
+  remaining = None
+  masks = {}
+  for (table, key) in located:
+    if key not in table.index:
+      return (refs, filters)
+    if table in masks:
+      continue
+
+    mask = table["valid"].copy()
+    left = []
+    for srcf in filters:
+      fmask = None
+      if hasattr(srcf, "mask"):
+        fmask = srcf.mask(table)
+      if fmask is None:
+        left.append(srcf)
+      else:
+        mask &= fmask
+    masks[table] = mask
+    remaining = left
+
+  if len(remaining) == len(filters):
+    return (refs, filters)
+
+  out = [ref for (ref, (table, key)) in zip(refs, located) if masks[table][table.index[key]]]
+  return (out, remaining)
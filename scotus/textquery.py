@@ -0,0 +1,417 @@
+# Copyright (c) 2022  Floyd Terbo
+
+# Boolean and proximity queries over indexed text, parsed once and run against the term's postings
+# index (or against the words of a single file when there is no index to use).
+#
+#   qualified immunity                   both words, anywhere (AND is implied between terms)
+#   "qualified immunity" AND NOT habeas  the phrase, in files without the word
+#   "excessive force" NEAR/10 officer    within 10 words of each other, in either order
+#   (habeas OR "post-conviction") AND "due process">=3
+#
+# Operators are upper case, binding tightest to loosest: >=N (a word, phrase or NEAR at least N
+# times), NEAR/k, NOT, AND, OR.  Words and phrases are matched the way they are indexed - lower
+# case, without punctuation.
+#
+# Every node yields a sorted list of document numbers.  AND walks its lists (rarest first) and NOT
+# removes from them with skip pointers, so a rare term only costs about sqrt(n) steps through a
+# common one.  Phrases are looked up by their runs of words (see postings.phraseKeys), so a phrase
+# of up to three words needs no positions at all, and word positions are only decoded for the files
+# that are left when a longer phrase or NEAR needs them.
+
+from __future__ import absolute_import
+
+import heapq
+import math
+import re
+
+from . import binpostings
+from . import postings
+
+
+class QueryError(Exception): pass
+
+
+def _skip (lst):
+  return int(math.sqrt(len(lst))) or 1
+
+
+def intersect (a, b):
+  """Document numbers in both sorted lists a and b"""
+  out = []
+  (askip, bskip) = (_skip(a), _skip(b))
+  (i, j) = (0, 0)
+  while i < len(a) and j < len(b):
+    if a[i] == b[j]:
+      out.append(a[i])
+      i += 1
+      j += 1
+    elif a[i] < b[j]:
+      while i + askip < len(a) and a[i + askip] <= b[j]:
+        i += askip
+      if a[i] < b[j]:
+        i += 1
+    else:
+      while j + bskip < len(b) and b[j + bskip] <= a[i]:
+        j += bskip
+      if b[j] < a[i]:
+        j += 1
+  return out
+
+
+def difference (a, b):
+  """Document numbers in sorted list a that aren't in sorted list b"""
+  out = []
+  bskip = _skip(b)
+  j = 0
+  for doc in a:
+    while j + bskip < len(b) and b[j + bskip] <= doc:
+      j += bskip
+    while j < len(b) and b[j] < doc:
+      j += 1
+    if j == len(b) or b[j] != doc:
+      out.append(doc)
+  return out
+
+
+def union (lists):
+  out = []
+  for doc in heapq.merge(*lists):
+    if not out or out[-1] != doc:
+      out.append(doc)
+  return out
+
+
+class IndexReader(object):
+  """Words and runs of words of every file in a PostingsIndex"""
+  def __init__ (self, index):
+    self.pfile = index.file
+    self.memo = {}
+    self._counts = {}
+    self._blobs = {}
+
+  def _word (self, word):
+    if word not in self._counts:
+      plist = self.pfile.lookup(word, positions = False) if self.pfile else []
+      self._counts[word] = ([x[0] for x in plist], dict(plist))
+    return self._counts[word]
+
+  def docs (self, word):
+    return self._word(word)[0]
+
+  def count (self, word, doc):
+    return self._word(word)[1].get(doc, 0)
+
+  def positions (self, word, doc):
+    if word not in self._blobs:
+      self._blobs[word] = dict([(x[0], x[2]) for x in self.pfile.lookup(word)])
+    return binpostings.decodePositions(self._blobs[word][doc])
+
+  def alldocs (self):
+    return range(len(self.pfile.docs)) if self.pfile else []
+
+
+class WordsReader(object):
+  """A single file (document 0) from its list of normalized words"""
+  def __init__ (self, words):
+    self.memo = {}
+    self._positions = postings.wordRuns(words)
+
+  def docs (self, word):
+    return [0] if word in self._positions else []
+
+  def count (self, word, doc):
+    return len(self._positions.get(word, []))
+
+  def positions (self, word, doc):
+    return self._positions[word]
+
+  def alldocs (self):
+    return [0]
+
+
+class Term(object):
+  """A word or a phrase, optionally required min_count times"""
+  positional = True
+
+  def __init__ (self, text, min_count = 1):
+    self.text = text
+    self.words = postings.normalize(text).split()
+    self.min_count = min_count
+    if not self.words:
+      raise QueryError("Empty term")
+    self.keys = postings.phraseKeys(self.words)
+
+  def __repr__ (self):
+    return "Term(%r, %d)" % (self.text, self.min_count)
+
+  def leaves (self):
+    return [self]
+
+  def _rarest (self, reader):
+    return sorted(self.keys, key = lambda x: len(reader.docs(x[1])))
+
+  def docs (self, reader):
+    if len(self.keys) == 1:
+      key = self.keys[0][1]
+      docs = reader.docs(key)
+      if self.min_count > 1:
+        docs = [x for x in docs if reader.count(key, x) >= self.min_count]
+      return docs
+
+    docs = None
+    for (offset, key) in self._rarest(reader):
+      docs = reader.docs(key) if docs is None else intersect(docs, reader.docs(key))
+      if not docs:
+        return []
+    return [x for x in docs if self.count(reader, x) >= self.min_count]
+
+  def spans (self, reader, doc):
+    """Sorted [(first word, one past the last word)] of every occurrence in doc"""
+    memokey = (id(self), doc)
+    if memokey not in reader.memo:
+      if [key for (offset, key) in self.keys if not reader.count(key, doc)]:
+        starts = []
+      else:
+        # Only words have positions, and the ones that occur least in doc go first
+        order = sorted(enumerate(self.words), key = lambda x: reader.count(x[1], doc))
+        starts = postings.phraseStarts((offset, reader.positions(word, doc)) for (offset, word) in order)
+      reader.memo[memokey] = [(x, x + len(self.words)) for x in starts]
+    return reader.memo[memokey]
+
+  def count (self, reader, doc):
+    if len(self.keys) == 1:
+      return reader.count(self.keys[0][1], doc)
+    return len(self.spans(reader, doc))
+
+
+class Near(object):
+  """left within k words of right, in either order"""
+  positional = True
+
+  def __init__ (self, left, right, k, min_count = 1):
+    if not left.positional or not right.positional:
+      raise QueryError("NEAR/%d needs words, phrases or other NEARs on both sides" % (k))
+    self.left = left
+    self.right = right
+    self.k = k
+    self.min_count = min_count
+
+  def __repr__ (self):
+    return "Near(%r, %r, %d, %d)" % (self.left, self.right, self.k, self.min_count)
+
+  def leaves (self):
+    return self.left.leaves() + self.right.leaves()
+
+  def docs (self, reader):
+    docs = intersect(self.left.docs(reader), self.right.docs(reader))
+    return [x for x in docs if self.count(reader, x) >= self.min_count]
+
+  def spans (self, reader, doc):
+    key = (id(self), doc)
+    if key not in reader.memo:
+      found = set()
+      rspans = self.right.spans(reader, doc)
+      for (lstart, lend) in self.left.spans(reader, doc):
+        for (rstart, rend) in rspans:
+          if rstart - lend > self.k:
+            break
+          if lstart - rend <= self.k:
+            found.add((min(lstart, rstart), max(lend, rend)))
+      reader.memo[key] = sorted(found)
+    return reader.memo[key]
+
+  def count (self, reader, doc):
+    return len(self.spans(reader, doc))
+
+
+class And(object):
+  positional = False
+
+  def __init__ (self, children):
+    self.children = children
+
+  def __repr__ (self):
+    return "And(%r)" % (self.children)
+
+  def leaves (self):
+    return [x for child in self.children for x in child.leaves()]
+
+  def docs (self, reader):
+    include = [x.docs(reader) for x in self.children if not isinstance(x, Not)]
+    if not include:
+      include = [reader.alldocs()]
+    include.sort(key = len)
+    docs = include[0]
+    for other in include[1:]:
+      if not docs:
+        return []
+      docs = intersect(docs, other)
+    for child in self.children:
+      if isinstance(child, Not) and docs:
+        docs = difference(docs, child.child.docs(reader))
+    return docs
+
+
+class Or(object):
+  positional = False
+
+  def __init__ (self, children):
+    self.children = children
+
+  def __repr__ (self):
+    return "Or(%r)" % (self.children)
+
+  def leaves (self):
+    return [x for child in self.children for x in child.leaves()]
+
+  def docs (self, reader):
+    return union([x.docs(reader) for x in self.children])
+
+
+class Not(object):
+  positional = False
+
+  def __init__ (self, child):
+    self.child = child
+
+  def __repr__ (self):
+    return "Not(%r)" % (self.child)
+
+  def leaves (self):
+    # Nothing in a file that matched is there because of these
+    return []
+
+  def docs (self, reader):
+    return difference(reader.alldocs(), self.child.docs(reader))
+
+
+TOKEN = re.compile(r'\s*(?:(\()|(\))|"([^"]*)"|NEAR/(\d+)|>=\s*(\d+)|((?:[^\s()">]|>(?!=\s*\d))+))')
+
+def tokenize (text):
+  tokens = []
+  pos = 0
+  text = text.strip()
+  while pos < len(text):
+    m = TOKEN.match(text, pos)
+    if not m:
+      raise QueryError("Unable to parse query at: %s" % (text[pos:]))
+    (lparen, rparen, phrase, near, count, word) = m.groups()
+    if lparen:
+      tokens.append(("(", None))
+    elif rparen:
+      tokens.append((")", None))
+    elif phrase is not None:
+      tokens.append(("term", phrase))
+    elif near:
+      tokens.append(("near", int(near)))
+    elif count:
+      tokens.append((">=", int(count)))
+    elif word in ("AND", "OR", "NOT"):
+      tokens.append((word, None))
+    elif word.startswith(">"):
+      raise QueryError("Expected a count after %s in query: %s" % (word, text))
+    else:
+      tokens.append(("term", word))
+    pos = m.end()
+  return tokens
+
+
+class Query(object):
+  """A parsed query, to run against any number of indexes or files"""
+  def __init__ (self, text):
+    self.text = text
+    self._tokens = tokenize(text)
+    self._pos = 0
+    if not self._tokens:
+      raise QueryError("Empty query")
+    self.root = self._or()
+    if self._pos != len(self._tokens):
+      raise QueryError("Unexpected %s in query: %s" % (self._tokens[self._pos][0], text))
+    del self._tokens
+
+  def __repr__ (self):
+    return "Query(%r)" % (self.root)
+
+  def _peek (self):
+    if self._pos < len(self._tokens):
+      return self._tokens[self._pos]
+    return (None, None)
+
+  def _next (self):
+    tok = self._peek()
+    self._pos += 1
+    return tok
+
+  def _or (self):
+    children = [self._and()]
+    while self._peek()[0] == "OR":
+      self._next()
+      children.append(self._and())
+    return children[0] if len(children) == 1 else Or(children)
+
+  def _and (self):
+    children = [self._unary()]
+    while self._peek()[0] in ("AND", "NOT", "term", "("):
+      if self._peek()[0] == "AND":
+        self._next()
+      children.append(self._unary())
+    return children[0] if len(children) == 1 else And(children)
+
+  def _unary (self):
+    if self._peek()[0] == "NOT":
+      self._next()
+      return Not(self._unary())
+    return self._near()
+
+  def _near (self):
+    node = self._primary()
+    while self._peek()[0] == "near":
+      k = self._next()[1]
+      node = Near(node, self._primary(), k)
+    return node
+
+  def _primary (self):
+    (kind, val) = self._next()
+    if kind == "(":
+      node = self._or()
+      if self._next()[0] != ")":
+        raise QueryError("Missing ) in query: %s" % (self.text))
+    elif kind == "term":
+      node = Term(val)
+    else:
+      raise QueryError("Expected a word, phrase or ( in query: %s" % (self.text))
+
+    if self._peek()[0] == ">=":
+      if not node.positional:
+        raise QueryError(">=%d only applies to a word, phrase or NEAR" % (self._peek()[1]))
+      node.min_count = self._next()[1]
+    return node
+
+  def terms (self):
+    """The words and phrases a match can be credited to, in query order"""
+    return self.root.leaves()
+
+  def evaluate (self, reader):
+    """{document number : [(term text, count)]} for every document that matches, with the
+    count of each term that occurs in it"""
+    out = {}
+    for doc in self.root.docs(reader):
+      counts = []
+      for term in self.terms():
+        count = term.count(reader, doc)
+        if count:
+          counts.append((term.text, count))
+      out[doc] = counts
+    return out
+
+  def search (self, index):
+    """{(directory name, file name) : [(term text, count)]} for every file in a PostingsIndex that
+    matches"""
+    if not index.file:
+      return {}
+    docs = index.file.docs
+    return dict([(docs[doc], counts) for (doc, counts) in self.evaluate(IndexReader(index)).items()])
+
+  def matchWords (self, words):
+    """[(term text, count)] if a file with these normalized words matches, otherwise None"""
+    return self.evaluate(WordsReader(words)).get(0)
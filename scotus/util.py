@@ -7,16 +7,17 @@ import json
 import logging
 import os
 import os.path
-import subprocess
 import sys
 import urllib
 
-import dateutil.parser
 import requests
 
+from . import cache
+from . import classify
+from . import dates
 from . import events
 from . import exceptions
-from . import justices
+from . import extract
 
 HEADERS = {"User-Agent" : "SCOTUS Docket Utility (https://github.com/fterbo/scotus-tools)"}
 QPURL = "https://www.supremecourt.gov/qp/%d-%05dqp.pdf"
@@ -43,8 +44,17 @@ class MultiMatch(object):
     return False
 
 
+# Attributes derived from walking the ProceedingsandOrder list, which a lazily constructed
+# DocketStatusInfo only computes the first time one of them is used
+EVENT_ATTRS = frozenset(["events", "petition_path", "granted", "grant_date", "cvsg", "cvsg_date",
+                         "cvsg_return_date", "argued", "argued_date", "distributed", "dismissed",
+                         "dismiss_date", "denied", "deny_date", "judgment_issued", "judgment_date",
+                         "gvr", "gvr_date", "removed", "remanded", "abuse", "ifp_denied", "ifp_paid",
+                         "inquorate", "vacated", "affirmed", "reversed", "cert_amici", "merits_amici",
+                         "recusals"])
+
 class DocketStatusInfo(object):
-  def __init__ (self, docket_obj):
+  def __init__ (self, docket_obj, keep_raw = True, lazy = False):
     self.docket_date = None
     self.term = None
     self.docket = None
@@ -56,7 +66,6 @@ class DocketStatusInfo(object):
     self.lowercourt = None
     self.lowercourt_docket = None
     self.lowercourt_decision_date = None
-    self.petition_path = None
     self.oldurl = False
     self.petitioner_title = None
     self.respondent_title = None
@@ -66,7 +75,44 @@ class DocketStatusInfo(object):
 
     self.related = []
 
+    self.atty_petitioner_prose = None
+    self.attys_petitioner_cor = []
+    self.attys_respondent_cor = []
+    self.attys_petitioner = []
+    self.attys_respondent = []
+    self.atty_email = []
+
+    self.attys_amici = []
+
+    self._errors = []
+
+    # Without the raw docket JSON (and per-event dicts) a loaded docket is several times smaller
+    self._keep_raw = keep_raw
+    self._docket_data = None
+    if keep_raw:
+      self._docket_data = docket_obj
+
+    self._unbuilt = None
+    self._build(docket_obj)
+    if lazy:
+      self._unbuilt = docket_obj
+    else:
+      self._buildEvents(docket_obj)
+
+  def __getattr__ (self, name):
+    # Only reached for attributes that have not been set, which in lazy mode includes everything
+    # in EVENT_ATTRS until the events have been walked
+    if name in EVENT_ATTRS:
+      docket_obj = self.__dict__.get("_unbuilt")
+      if docket_obj is not None:
+        self._unbuilt = None
+        self._buildEvents(docket_obj)
+        return getattr(self, name)
+    raise AttributeError(name)
+
+  def _initEventState (self):
     self.events = []
+    self.petition_path = None
     self.granted = False
     self.grant_date = None
     self.cvsg = False
@@ -93,25 +139,11 @@ class DocketStatusInfo(object):
     self.affirmed = False
     self.reversed = False
 
-    self.atty_petitioner_prose = None
-    self.attys_petitioner_cor = []
-    self.attys_respondent_cor = []
-    self.attys_petitioner = []
-    self.attys_respondent = []
-    self.atty_email = []
-
-    self.attys_amici = []
     self.cert_amici = []
     self.merits_amici = []
 
     self.recusals = set([])
 
-    self._errors = []
-
-    self._docket_data = docket_obj
-
-    self._build(docket_obj)
-
   def __hash__ (self):
     return hash(self.docketstr)
 
@@ -176,9 +208,13 @@ class DocketStatusInfo(object):
     else:
       outpath = self.petition_path
 
-    p = subprocess.Popen("pdftotext -layout \"%s\" -" % (outpath), stdout = subprocess.PIPE,
-                         stderr = subprocess.PIPE, shell=True)
-    (sout, serr) = p.communicate()
+    try:
+      if not outpath:
+        raise extract.ExtractError("No petition to extract questions presented from (%s)" % (self.docketstr))
+      sout = u"\f".join(extract.pages(outpath, extract.LAYOUT)).encode("utf-8")
+    except extract.ExtractError as e:
+      logging.warning(str(e))
+      sout = ""
 
     START_TERMS = ["QUESTION PRESENTED", "QUESTIONS PRESENTED", "STATEMENT OF THE QUESTION", "ISSUE PRESENTED"]
     END_TERMS = ["TABLE", "PARTIES", "CORPORATE DISCLOSURE", "LIST OF", "RULE 29.6",
@@ -297,7 +333,7 @@ class DocketStatusInfo(object):
 
     try:
       if docket_obj["DocketedDate"].strip():
-        self.docket_date = dateutil.parser.parse(docket_obj["DocketedDate"]).date()
+        self.docket_date = dates.parseDate(docket_obj["DocketedDate"])
       self.capital = docket_obj["bCapitalCase"]
 
       try:
@@ -350,12 +386,19 @@ class DocketStatusInfo(object):
         self.lowercourt = docket_obj["LowerCourt"].strip()
         try:
           self.lowercourt_docket = docket_obj["LowerCourtCaseNumbers"]
-          self.lowercourt_decision_date = dateutil.parser.parse(docket_obj["LowerCourtDecision"]).date()
+          self.lowercourt_decision_date = dates.parseDate(docket_obj["LowerCourtDecision"])
         except KeyError:
           pass
         except ValueError as e:
           self._errors.append(str(e))
 
+    except Exception:
+      print "Exception in case: %s" % (docket_obj["CaseNumber"])
+      raise
+
+  def _buildEvents (self, docket_obj):
+    self._initEventState()
+    try:
       for einfo in docket_obj["ProceedingsandOrder"]:
         try:
           for link in einfo["Links"]:
@@ -364,313 +407,10 @@ class DocketStatusInfo(object):
         except KeyError:
           pass
 
-        evtobj = events.DocketEvent(einfo)
+        evtobj = events.DocketEvent(einfo, self._keep_raw)
         self.events.append(evtobj)
 
-        etxt = einfo["Text"]
-        estxt = etxt
-        if etxt[-6:] == "VIDED." or etxt[-5:] == "VIDED":
-          estxt = " ".join(etxt.split()[:-1])
-
-        if etxt.startswith("DISTRIBUTED"):
-          if etxt == "DISTRIBUTED.":
-            continue  # Rehearing distribution, probably, not for conference
-          if etxt.startswith("DISTRIBUTED."): # Old Event
-            confdate = dateutil.parser.parse(etxt.split(".")[-1]).date()
-          else:
-            confdate = dateutil.parser.parse(etxt.split("of")[-1]).date()
-          edate = dateutil.parser.parse(einfo["Date"]).date()
-          self.distributed.append((edate, confdate, False))
-          evtobj.distributed = True
-        elif etxt == "Rescheduled.":
-          last_dist = self.distributed[-1]
-          self.distributed[-1] = (last_dist[0], last_dist[1], True)
-        elif etxt.startswith("Brief amici curiae of") or etxt.startswith("Brief amicus curiae of"):
-          evtobj.amicus_brief = True
-          if etxt.count("Court-appointed"):
-            evtobj.amici_court_appointed = True
-          if not self.granted:
-            self.cert_amici.append(" ".join(estxt.split()[4:-1]))
-          else:
-            self.merits_amici.append(" ".join(estxt.split()[4:-1]))
-          if self.cvsg:
-            if (etxt.lower().startswith("brief amicus curiae of united states filed") or
-                etxt.lower().startswith("brief amicus curiae of the united states filed") or
-                etxt.startswith("Brief amicus curiae of United States of America filed")):
-              self.cvsg_return_date = dateutil.parser.parse(einfo["Date"]).date()
-              evtobj.cvsg_return = True
-        elif (etxt.startswith("Supplemental brief of")
-              or etxt.startswith("Brief of respondent")
-              or etxt.startswith("Brief of petitioner")
-              or etxt.startswith("Reply of petitioner")
-              or etxt.startswith("Reply of respondent")
-              or (etxt.startswith("Brief of") and estxt[-6:] == "filed.")
-              or (etxt.count("letter brief") and etxt.count("filed."))):
-          if self.cvsg and etxt.lower().startswith("brief of federal respondents in opposition filed"):
-            self.cvsg_return_date = dateutil.parser.parse(einfo["Date"]).date()
-            evtobj.cvsg_return = True
-            evtobj.amicus_brief = True
-          else:
-            evtobj.brief = True
-        elif (etxt.startswith("The Solicitor General is invited to file a brief") or
-              etxt.count("expressing the views of the United States")):
-          self.cvsg = True
-          self.cvsg_date = dateutil.parser.parse(einfo["Date"]).date()
-          evtobj.cvsg = True
-        elif etxt.count("is invited to brief and argue this case"):
-          evtobj.amici_court_appointed = True
-        elif etxt.startswith("Memorandum of respondent") and etxt.count("filed"):
-          evtobj.response_memo = True
-        elif etxt.startswith("Motion for leave to proceed in forma pauperis filed by respondent"):
-          if etxt.count("GRANTED"):
-            evtobj.ifp_granted = True
-          else:
-            evtobj.ifp_respondent = True
-        elif etxt == "Petition GRANTED.":
-          self.granted = True
-          self.grant_date = dateutil.parser.parse(einfo["Date"]).date()
-          evtobj.granted = True
-          if etxt.count("In addition to the question presented") or etxt.count("directed to brief and argue the following"):
-            evtobj.additional_question = True
-        elif etxt == "CIRCULATED":
-          evtobj.circulated = True
-        elif etxt.startswith("SET FOR ARGUMENT"):
-          evtobj.set_for_argument = True
-        elif etxt.startswith("SET FOR REARGUMENT"):
-          evtobj.set_for_reargument = True
-        elif (etxt.startswith("Record received from")
-              or etxt.startswith("Record") and etxt.count("is electronic")):
-          evtobj.record_received = True
-        elif ((etxt.startswith("The record of") or etxt.startswith("The record from")) and etxt.count("PACER")):
-          evtobj.record_pacer = True
-        elif etxt.startswith("Record returned"):
-          evtobj.record_returned = True
-        elif ((etxt.startswith("Motion of the Solicitor General for leave to participate in oral argument")
-               or etxt.startswith("Motion of the Acting Solicitor General for leave to participate in oral argument"))
-              and etxt.count("divided argument")):
-          if etxt.count("filed"):
-            evtobj.sg_motion_divided_argument = True
-          elif etxt.count("GRANTED"):
-            evtobj.sg_grant_divided_argument = True
-        elif etxt.startswith("Motion for divided argument") or etxt.count("and for divided argument"):
-          if (etxt.count("by the Solicitor General") or
-              etxt.count("by the Acting Solicitor General") or
-              etxt.lower().count("by federal respondents")):
-            if etxt[-7:] == "DENIED.":
-              evtobj.sg_motion_divided_denied = True
-            elif etxt[-8:] == "GRANTED.":
-              evtobj.sg_motion_divided_granted = True
-            else:
-              evtobj.sg_motion_divided_argument = True
-          else:
-            if etxt[-7:] == "DENIED.":
-              evtobj.motion_divided_denied = True
-            elif etxt[-8:] == "GRANTED.":
-              evtobj.motion_divided_granted = True
-            else:
-              evtobj.motion_divided_argument = True
-              if etxt.count("enlargement of time"):
-                evtobj.motion_time_enlargement = True
-        elif (etxt.startswith("Motion") and etxt.count("divided argument")):
-          evtobj.motion_divided_argument = True
-          if etxt.count("enlargement of time"):
-            evtobj.motion_time_enlargement = True
-        elif etxt.count("GRANTED"):
-          if etxt.count("for leave to file"):
-            if etxt.count("as amicus curiae out of time"):
-              evtobj.amici_granted_out_of_time = True
-            continue
-          if etxt.count("Motion to substitute"): continue
-          if etxt.count("Motion of respondent for leave"): continue
-          if etxt.count("Motion for leave to intervene"): continue
-          if etxt.count("Motion to dispense with printing"):
-            evtobj.dispense_printing_granted = True
-            continue
-          if etxt.count("Motion to dismiss"):
-            evtobj.dismissed = True
-            continue
-          if etxt.count("Motion to appoint counsel"):
-            evtobj.counsel_granted = True
-            continue
-          statements = etxt.split(".")
-          gs = [x for x in statements if x.count("GRANTED")][0]
-          if gs.count("expedite consideration"):
-            continue
-          self.granted = True
-          self.grant_date = dateutil.parser.parse(einfo["Date"]).date()
-          evtobj.granted = True
-          if etxt.count("REVERSED") and etxt.count("REMANDED"):
-            # This is not really a GVR, but we'll throw it in the bucket for now
-            self.gvr = True
-            self.gvr_date = self.grant_date
-            self.remanded = True
-            self.reversed = True
-            evtobj.remanded = True
-          elif etxt.lower().count("vacated") and etxt.lower().count("remanded"):
-            self.gvr = True
-            self.gvr_date = self.grant_date
-            self.remanded = True
-            self.vacated = True
-            evtobj.vacated = True
-            evtobj.remanded = True
-        elif etxt.lower().count("is dismissed as moot"):
-          evtobj.mooted = True
-        elif etxt.startswith("Waiver"):
-          if etxt.count("right of respondent"):
-            if etxt.count("to respond"):
-              evtobj.waive_response = True
-          elif etxt.count("Rule 15.5 filed by petitioner"):
-            evtobj.waive_waiting_period = True
-        elif (etxt.count("petition for certiorari is granted") or
-              etxt.count("petition for a writ of certiorari is granted")):
-          self.granted = True
-          evtobj.granted = True
-          self.grant_date = dateutil.parser.parse(einfo["Date"]).date()
-          if etxt.count("to dismiss the case as moot"):
-            evtobj.mooted = True
-          if etxt.count("the case is remanded for further proceedings"):
-            self.remanded = True
-            evtobj.remanded = True
-        elif etxt.startswith("Argued."):
-          self.argued = True
-          self.argued_date = dateutil.parser.parse(einfo["Date"]).date()
-          evtobj.argued = True
-        elif etxt.count("lacks a quorum"):
-          self.inquorate = True
-          evtobj.inquorate = True
-        elif (etxt.startswith("Petition Dismissed") or
-              etxt.startswith("Petition DISMISSED") or
-              etxt.startswith("Appeal dismissed") or
-              etxt.count("petition for a writ of certiorari is DISMISSED")):
-          self.dismissed = True
-          self.dismiss_date = dateutil.parser.parse(einfo["Date"]).date()
-          evtobj.dismissed = True
-        elif (etxt.startswith("Petition DENIED")
-              or etxt.count("The petition for a writ of certiorari is denied")
-              or etxt.count("before judgment DENIED")):
-          self.denied = True
-          self.deny_date = dateutil.parser.parse(einfo["Date"]).date()
-          evtobj.denied = True
-        elif (etxt.startswith("Rehearing DENIED") or
-              (etxt.startswith("Motion for leave to file a petition for rehearing")
-               and etxt.count("DENIED"))):
-          evtobj.rehearing_denied = True
-        elif (etxt.lower().count("petition for rehearing filed")):
-          evtobj.rehearing_requested = True
-        elif (etxt.startswith("Motion for reconsideration") and etxt.count("DENIED")):
-          evtobj.motion_denied = True
-        elif (etxt.lower().startswith("judgment issued") or etxt.lower().startswith("mandate issued")):
-          self.judgment_issued = True
-          self.judgment_date = dateutil.parser.parse(einfo["Date"]).date()
-          evtobj.issued = True
-        elif (etxt.startswith("Adjudged to be AFFIRMED.")
-              or etxt.count("judgment is affirmed under 28 U. S. C.")
-              or etxt.count("Judgment is affirmed")
-              or etxt.count("Judgment AFFIRMED")):
-          self.affirmed = True
-          self.judgment_issued = True
-          self.judgment_date = dateutil.parser.parse(einfo["Date"]).date()
-          evtobj.affirmed = True
-          evtobj.issued = True
-        elif etxt.startswith("Adjudged to be AFFIRMED IN PART, REVERSED IN PART"):
-          self.affirmed = True
-          self.reversed = True
-          self.judgment_issued = True
-          self.judgment_date = dateutil.parser.parse(einfo["Date"]).date()
-          evtobj.affirmed = True
-          evtobj.reversed = True
-          evtobj.issued = True
-        elif etxt.startswith("Adjudged to be VACATED IN PART"):
-          self.vacated = True
-          self.judgment_issued = True
-          self.judgment_date = dateutil.parser.parse(einfo["Date"]).date()
-          evtobj.vacated = True
-          evtobj.issued = True
-        elif etxt.startswith("Judgment REVERSED"):
-          self.reversed = True
-          self.judgment_issued = True
-          self.judgment_date = dateutil.parser.parse(einfo["Date"]).date()
-          evtobj.issued = True
-        elif (etxt.count("petition for a writ of certiorari is dismissed")
-              or etxt.count("petition for a writ of mandamus/prohibition is dismissed")
-              or etxt.count("petition for a writ of habeas corpus is dismissed")
-              or etxt.count("petition for a writ of prohibition is dismissed")
-              or etxt.count("petition for a writ of mandamus is dismissed")
-              or etxt.count("petition for a writ of mandamus and/or prohibition is dismissed")):
-          self.dismissed = True
-          self.dismiss_date = dateutil.parser.parse(einfo["Date"]).date()
-          evtobj.dismissed = True
-        elif (etxt.count("Case removed from Docket")
-              or etxt == "Case considered closed."):
-          self.removed = True
-          evtobj.removed = True
-        elif etxt.count("leave to proceed in forma pauperis is denied"):
-          evtobj.ifp_denied = True
-          self.ifp_denied = True
-        elif etxt.startswith("Response Requested"):
-          evtobj.response_requested = True
-        elif etxt.lower().startswith("record requested"):
-          evtobj.record_requested = True
-        elif etxt.startswith("Petitioner complied with order of"):
-          odate = dateutil.parser.parse(etxt.split("of")[-1]).date()
-          for evt in self.events:
-            if evt.date == odate and evt.ifp_denied:
-              self.ifp_paid = True
-              evtobj.ifp_paid = True
-              break
-            if evt.date > odate:
-              break
-        elif etxt.count("time to file") or etxt.count("extend further the time"):
-          evtobj.time_to_file = True
-        elif etxt.count("Judgment VACATED"):
-          evtobj.vacated = True
-          self.vacated = True
-        elif (etxt.count("Letter of petitioner")
-              or etxt.count("Letter of respondent")
-              or etxt.count("Letter from counsel")
-              or etxt.startswith("Letter from the Solicitor General")
-              or etxt.count("Letter in reply")):
-          evtobj.letter = True
-        elif etxt.lower().startswith("joint motion"):
-          evtobj.joint_motion = True
-        elif etxt.lower().startswith("joint appendix filed"):
-          evtobj.joint_appendix = True
-        elif etxt.lower().startswith("blanket consent filed by petitioner"):
-          evtobj.petitioner_blanket_consent = True
-        elif etxt.lower().startswith("blanket consent filed by respondent"):
-          evtobj.respondent_blanket_consent = True
-        elif (etxt.startswith("Consent to the filing of amicus curiae briefs") or
-              etxt.startswith("Consent to the filing of amicus briefs")):
-          if etxt.count(" either party") and etxt.count("neither party"):
-            if etxt.count("received from counsel"):
-              if etxt.count("petitioner"):
-                evtobj.petitioner_blanket_consent = True
-              elif etxt.count("respondent"):
-                evtobj.respondent_blanket_consent = True
-
-        if etxt.lower().count("remanded"):
-          self.remanded = True
-          evtobj.remanded = True
-
-        if etxt.lower().count("vacated as moot"):
-          self.vacated = True
-          evtobj.vacated = True
-          evtobj.mooted = True
-
-        if etxt.count("not accepted for filing."):
-          evtobj.not_accepted = True
-
-        if etxt.count("petitioner has repeatedly abused"):
-          self.abuse = True
-
-        if etxt.count("took no part in the consideration"):
-          wlist = etxt.split()
-          for idx,word in enumerate(wlist):
-            if word == "Justice":
-              if wlist[idx-1] == "Chief":
-                self.recusals.add(justices.TERMS["%02d" % (self.term)]["chief"])
-              else:
-                self.recusals.add(wlist[idx+1])
+        classify.classifyEvent(self, einfo, evtobj)
 
     except Exception:
       print "Exception in case: %s" % (docket_obj["CaseNumber"])
@@ -860,7 +600,7 @@ def buildDocketStr (opts, num = None):
 
   return "%d-%d" % (opts.term, num)
 
-def loadDocket (term, number, root = "."):
+def loadDocket (term, number, root = ".", keep_raw = True, lazy = False):
   if isinstance(number, (str, unicode)):
     if number[0] == "A":
       droot = "%s/OT-%d/dockets/A/%s" % (root, term, number[1:])
@@ -872,8 +612,30 @@ def loadDocket (term, number, root = "."):
   if not os.path.exists("%s/docket.json" % (droot)):
     raise exceptions.NoDocketError("%s%s" % (term, str(number)))
 
+  return loadDocketPath(droot, keep_raw, lazy)
+
+def loadDocketPath (droot, keep_raw = True, lazy = False):
+  """Load the docket in directory droot (applying patch.json), using the term cache if we can"""
+  tc = None
+  if not keep_raw:
+    (tc, key) = cache.forPath(droot)
+  if tc:
+    stamp = cache.docketStamp(droot)
+    info = tc.get(key, stamp)
+    if info:
+      return info
+
   jd = json.loads(open("%s/docket.json" % (droot), "rb").read())
   if os.path.exists("%s/patch.json" % (droot)):
     jd.update(json.loads(open("%s/patch.json" % (droot), "rb").read()))
 
-  return DocketStatusInfo(jd)
+  if tc and tc.writable:
+    # Cached state has to be complete, so there is no point in being lazy here
+    info = DocketStatusInfo(jd, keep_raw = False)
+    tc.put(key, stamp, info)
+    return info
+
+  info = DocketStatusInfo(jd, keep_raw, lazy)
+  if tc:
+    tc.keep(key, stamp, info)
+  return info
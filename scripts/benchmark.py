@@ -0,0 +1,1304 @@
+#!/usr/bin/env python
+
+# Copyright (c) 2022  Floyd Terbo
+
+# Benchmarks for the docket loading and analysis paths, run against a synthetic term so results
+# are reproducible without a local docket mirror.
+#
+#   benchmark.py classify [--dockets 6000] [--seed 1]
+#   benchmark.py dates [--dockets 6000]
+#   benchmark.py memory [--dockets 6000]
+#   benchmark.py lazy [--dockets 6000]
+#   benchmark.py cache [--dockets 6000]
+#   benchmark.py table [--dockets 6000]
+#   benchmark.py attrindex [--dockets 6000]
+#   benchmark.py engine [--dockets 2000] [--terms 3] [-j 8]
+#   benchmark.py batch [--dockets 2000] [--specs 20] [-j 8]
+#   benchmark.py postings [--dockets 1000] [--words 1500]
+#   benchmark.py extract [--pdfs 40] [--pages 20] [--sample DIR] [-j 8]
+
+from __future__ import absolute_import, print_function
+
+import argparse
+import copy
+import datetime
+import glob
+import json
+import multiprocessing
+import os
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+import dateutil.parser
+
+import scotus.attrindex
+import scotus.binpostings
+import scotus.cache
+import scotus.classify
+import scotus.dates
+import scotus.events
+import scotus.exceptions
+import scotus.extract
+import scotus.filters
+import scotus.justices
+import scotus.parse
+import scotus.postings
+import scotus.sources
+import scotus.table
+import scotus.util
+
+scotus.exceptions.CasenameError.IGNORE = True
+
+COURTS = ["United States Court of Appeals for the Ninth Circuit",
+          "United States Court of Appeals for the Fifth Circuit",
+          "United States Court of Appeals for the Eleventh Circuit",
+          "Supreme Court of California",
+          "Court of Criminal Appeals of Texas",
+          "Supreme Court of Florida"]
+
+SURNAMES = ["Smith", "Johnson", "Garcia", "Nguyen", "Okafor", "Kowalski", "Haddad", "Lee", "Brown"]
+
+# (weight, text) - covers every classification rule plus the common unclassified entries
+EVENTS = [
+  (40, "Petition for a writ of certiorari filed. (Response due %(due)s)"),
+  (25, "DISTRIBUTED for Conference of %(conf)s."),
+  (2, "DISTRIBUTED. %(conf)s"),
+  (1, "DISTRIBUTED."),
+  (3, "Rescheduled."),
+  (15, "Waiver of right of respondent %(name)s to respond filed."),
+  (2, "Waiver of the 14-day waiting period under Rule 15.5 filed by petitioner."),
+  (10, "Motion to extend the time to file a response from %(due)s to %(due)s, submitted to The Clerk."),
+  (6, "Motion to extend the time to file a response is granted and the time is extended to and including %(due)s."),
+  (2, "Application (%(num)dA%(num)d) to extend further the time from %(due)s to %(due)s, submitted to Justice Kagan."),
+  (10, "Brief of respondent %(name)s in opposition filed."),
+  (8, "Reply of petitioner %(name)s filed."),
+  (2, "Supplemental brief of petitioner %(name)s filed."),
+  (2, "Brief of %(name)s filed. VIDED."),
+  (6, "Brief amici curiae of %(name)s Foundation filed."),
+  (1, "Brief amicus curiae of %(name)s, Court-appointed amicus curiae, filed."),
+  (1, "Brief amicus curiae of United States filed."),
+  (1, "Brief of federal respondents in opposition filed."),
+  (1, "Letter brief of respondent %(name)s filed."),
+  (1, "The Solicitor General is invited to file a brief in this case expressing the views of the United States."),
+  (1, "%(name)s, Esq., is invited to brief and argue this case, as amicus curiae, in support of the judgment below."),
+  (1, "Memorandum of respondent %(name)s filed."),
+  (1, "Motion for leave to proceed in forma pauperis filed by respondent %(name)s."),
+  (1, "Motion for leave to proceed in forma pauperis filed by respondent %(name)s GRANTED."),
+  (2, "Petition GRANTED."),
+  (1, "CIRCULATED"),
+  (1, "SET FOR ARGUMENT on %(due)s."),
+  (1, "SET FOR REARGUMENT on %(due)s."),
+  (2, "Record received from the %(court)s."),
+  (1, "Record from the %(court)s is electronic and located on PACER."),
+  (1, "The record from the %(court)s has been electronically filed and is available on PACER."),
+  (1, "Record returned to the %(court)s."),
+  (1, "Motion of the Solicitor General for leave to participate in oral argument as amicus curiae and for divided argument filed."),
+  (1, "Motion of the Solicitor General for leave to participate in oral argument as amicus curiae and for divided argument GRANTED."),
+  (1, "Motion for divided argument filed by the Solicitor General."),
+  (1, "Motion for divided argument filed by the Solicitor General GRANTED."),
+  (1, "Motion for divided argument filed by the Solicitor General DENIED."),
+  (1, "Motion for divided argument filed by petitioner DENIED."),
+  (1, "Motion for divided argument filed by respondent GRANTED."),
+  (1, "Motion of petitioner for enlargement of time for oral argument and for divided argument filed."),
+  (1, "Motion of respondent for divided argument filed."),
+  (1, "Motion for leave to file amicus brief out of time filed by %(name)s GRANTED."),
+  (1, "Motion for leave to file a brief as amicus curiae out of time GRANTED."),
+  (1, "Motion to substitute counsel GRANTED."),
+  (1, "Motion to dispense with printing the joint appendix filed by petitioner GRANTED."),
+  (1, "Motion to dismiss the petition GRANTED."),
+  (1, "Motion to appoint counsel filed by petitioner GRANTED."),
+  (1, "Motion to expedite consideration of the petition GRANTED."),
+  (2, "Petition GRANTED limited to Question 1 presented by the petition."),
+  (2, "Petition GRANTED. Judgment VACATED and case REMANDED for further consideration."),
+  (1, "Petition GRANTED. Judgment REVERSED and case REMANDED."),
+  (1, "The appeal is dismissed as moot."),
+  (1, "The petition for a writ of certiorari is granted. The judgment is vacated, and the case is remanded for further proceedings."),
+  (2, "Argued. For petitioner: %(name)s, Washington, D. C."),
+  (1, "The judgment is affirmed by an equally divided Court as the Court lacks a quorum."),
+  (1, "Petition DISMISSED - Rule 46."),
+  (1, "Appeal dismissed for want of jurisdiction."),
+  (30, "Petition DENIED."),
+  (1, "Petition for a writ of certiorari before judgment DENIED."),
+  (2, "Rehearing DENIED."),
+  (1, "Motion for leave to file a petition for rehearing DENIED."),
+  (2, "Petition for Rehearing filed."),
+  (1, "Motion for reconsideration of order denying leave to proceed in forma pauperis DENIED."),
+  (3, "JUDGMENT ISSUED."),
+  (1, "MANDATE ISSUED."),
+  (1, "Adjudged to be AFFIRMED."),
+  (1, "Adjudged to be AFFIRMED IN PART, REVERSED IN PART, and case REMANDED."),
+  (1, "Adjudged to be VACATED IN PART and case REMANDED."),
+  (1, "Judgment REVERSED and case REMANDED."),
+  (1, "The petition for a writ of mandamus is dismissed."),
+  (1, "Case removed from Docket."),
+  (1, "Case considered closed."),
+  (2, "Motion for leave to proceed in forma pauperis is denied, and petitioner is allowed until %(due)s to pay the docketing fee."),
+  (5, "Response Requested. (Due %(due)s)"),
+  (1, "Record Requested from the %(court)s."),
+  (1, "Petitioner complied with order of %(ifp)s."),
+  (1, "Judgment VACATED and case REMANDED."),
+  (1, "Letter of petitioner %(name)s filed."),
+  (1, "Letter from the Solicitor General filed."),
+  (1, "Joint motion to dismiss filed."),
+  (1, "Joint appendix filed."),
+  (1, "Blanket Consent filed by Petitioner, %(name)s."),
+  (1, "Blanket Consent filed by Respondent, %(name)s."),
+  (1, "Consent to the filing of amicus curiae briefs in support of either party or of neither party received from counsel for the petitioner."),
+  (1, "Motion to vacate as moot GRANTED. Judgment vacated as moot."),
+  (1, "Motion to file document not accepted for filing."),
+  (1, "As the petitioner has repeatedly abused this Court's process, the Clerk is directed not to accept any further petitions."),
+  (1, "Petition DENIED. Justice Alito took no part in the consideration or decision of this petition."),
+  (20, "Proof of service filed."),
+  (10, "Notice of appearance filed by %(name)s."),
+]
+
+
+def _eventTexts ():
+  texts = []
+  for (weight, text) in EVENTS:
+    texts.extend([text] * weight)
+  return texts
+
+
+def _datestr (d):
+  return d.strftime("%b %d %Y")
+
+def _confstr (d):
+  return "%d/%d/%d" % (d.month, d.day, d.year)
+
+
+def buildDocket (rng, term, num, texts):
+  """Build a synthetic docket.json object resembling what the court publishes"""
+  docketed = datetime.date(2000 + term, 10, 1) + datetime.timedelta(rng.randint(0, 300))
+  petitioner = rng.choice(SURNAMES)
+  respondent = rng.choice(SURNAMES)
+
+  evts = [{"Date" : _datestr(docketed), "Text" : "Petition for a writ of certiorari filed.",
+           "Links" : [{"Description" : "Petition", "File" : "petition.pdf",
+                       "DocumentUrl" : "https://www.supremecourt.gov/petition.pdf"}]}]
+  edate = docketed
+  ifp_date = None
+  for idx in range(rng.randint(4, 24)):
+    edate += datetime.timedelta(rng.randint(1, 21))
+    text = rng.choice(texts)
+    if text.startswith("Motion for leave to proceed in forma pauperis is denied"):
+      ifp_date = edate
+    vals = {"name" : rng.choice(SURNAMES), "num" : rng.randint(1, 999), "court" : rng.choice(COURTS),
+            "due" : _datestr(edate + datetime.timedelta(30)),
+            "conf" : _confstr(edate + datetime.timedelta(14)),
+            "ifp" : (ifp_date or edate).strftime("%B %d, %Y")}
+    if text == "Rescheduled." and not [x for x in evts if x["Text"].startswith("DISTRIBUTED for")]:
+      continue
+    evts.append({"Date" : _datestr(edate), "Text" : text % vals})
+
+  obj = {"CaseNumber" : "%d-%d " % (term, num),
+         "DocketedDate" : _datestr(docketed),
+         "bCapitalCase" : rng.random() < 0.02,
+         "PetitionerTitle" : "%s, Petitioner" % (petitioner),
+         "RespondentTitle" : "%s, Warden" % (respondent),
+         "LowerCourt" : rng.choice(COURTS),
+         "LowerCourtCaseNumbers" : "(%d-%d)" % (rng.randint(10, 99), rng.randint(1000, 9999)),
+         "LowerCourtDecision" : _datestr(docketed - datetime.timedelta(rng.randint(30, 200))),
+         "Petitioner" : [{"Attorney" : "%s Esq." % (rng.choice(SURNAMES)), "PartyName" : petitioner,
+                          "IsCounselofRecord" : True, "PrisonerId" : None,
+                          "Email" : "%s@example.com" % (petitioner.lower())}],
+         "Respondent" : [{"Attorney" : "%s Esq." % (rng.choice(SURNAMES)), "PartyName" : respondent,
+                          "IsCounselofRecord" : True, "PrisonerId" : None}],
+         "ProceedingsandOrder" : evts}
+  return obj
+
+
+def buildTerm (term, count, seed = 1):
+  rng = random.Random(seed)
+  texts = _eventTexts()
+  nums = list(range(1, count // 2 + 1)) + list(range(5001, 5001 + count - count // 2))
+  return [buildDocket(rng, term, num, texts) for num in nums]
+
+
+def writeTerm (root, term, dockets):
+  """Lay out dockets on disk the way docketgrab does, returning the docket directories"""
+  os.makedirs("%s/OT-%d/dockets/A" % (root, term))
+  paths = []
+  for docket_obj in dockets:
+    dpath = "%s/OT-%d/dockets/%s" % (root, term, docket_obj["CaseNumber"].split("-")[1].strip())
+    os.makedirs(dpath)
+    with open("%s/docket.json" % (dpath), "wb") as df:
+      df.write(json.dumps(docket_obj))
+    paths.append(dpath)
+  return paths
+
+
+def _infoState (info):
+  info.events   # Completes a lazily constructed info
+  state = dict([(k,v) for (k,v) in vars(info).items() if k not in ("events", "_docket_data", "_unbuilt")])
+  return (state, [str(evt) for evt in info.events])
+
+
+def classifyEventLegacy (dinfo, einfo, evtobj):
+  """The if/elif chain scotus.classify.classifyEvent replaced, as the reference it is checked against"""
+
+  etxt = einfo["Text"]
+  estxt = etxt
+  if etxt[-6:] == "VIDED." or etxt[-5:] == "VIDED":
+    estxt = " ".join(etxt.split()[:-1])
+
+  if etxt.startswith("DISTRIBUTED"):
+    if etxt == "DISTRIBUTED.":
+      return  # Rehearing distribution, probably, not for conference
+    if etxt.startswith("DISTRIBUTED."): # Old Event
+      confdate = dateutil.parser.parse(etxt.split(".")[-1]).date()
+    else:
+      confdate = dateutil.parser.parse(etxt.split("of")[-1]).date()
+    edate = dateutil.parser.parse(einfo["Date"]).date()
+    dinfo.distributed.append((edate, confdate, False))
+    evtobj.distributed = True
+  elif etxt == "Rescheduled.":
+    last_dist = dinfo.distributed[-1]
+    dinfo.distributed[-1] = (last_dist[0], last_dist[1], True)
+  elif etxt.startswith("Brief amici curiae of") or etxt.startswith("Brief amicus curiae of"):
+    evtobj.amicus_brief = True
+    if etxt.count("Court-appointed"):
+      evtobj.amici_court_appointed = True
+    if not dinfo.granted:
+      dinfo.cert_amici.append(" ".join(estxt.split()[4:-1]))
+    else:
+      dinfo.merits_amici.append(" ".join(estxt.split()[4:-1]))
+    if dinfo.cvsg:
+      if (etxt.lower().startswith("brief amicus curiae of united states filed") or
+          etxt.lower().startswith("brief amicus curiae of the united states filed") or
+          etxt.startswith("Brief amicus curiae of United States of America filed")):
+        dinfo.cvsg_return_date = dateutil.parser.parse(einfo["Date"]).date()
+        evtobj.cvsg_return = True
+  elif (etxt.startswith("Supplemental brief of")
+        or etxt.startswith("Brief of respondent")
+        or etxt.startswith("Brief of petitioner")
+        or etxt.startswith("Reply of petitioner")
+        or etxt.startswith("Reply of respondent")
+        or (etxt.startswith("Brief of") and estxt[-6:] == "filed.")
+        or (etxt.count("letter brief") and etxt.count("filed."))):
+    if dinfo.cvsg and etxt.lower().startswith("brief of federal respondents in opposition filed"):
+      dinfo.cvsg_return_date = dateutil.parser.parse(einfo["Date"]).date()
+      evtobj.cvsg_return = True
+      evtobj.amicus_brief = True
+    else:
+      evtobj.brief = True
+  elif (etxt.startswith("The Solicitor General is invited to file a brief") or
+        etxt.count("expressing the views of the United States")):
+    dinfo.cvsg = True
+    dinfo.cvsg_date = dateutil.parser.parse(einfo["Date"]).date()
+    evtobj.cvsg = True
+  elif etxt.count("is invited to brief and argue this case"):
+    evtobj.amici_court_appointed = True
+  elif etxt.startswith("Memorandum of respondent") and etxt.count("filed"):
+    evtobj.response_memo = True
+  elif etxt.startswith("Motion for leave to proceed in forma pauperis filed by respondent"):
+    if etxt.count("GRANTED"):
+      evtobj.ifp_granted = True
+    else:
+      evtobj.ifp_respondent = True
+  elif etxt == "Petition GRANTED.":
+    dinfo.granted = True
+    dinfo.grant_date = dateutil.parser.parse(einfo["Date"]).date()
+    evtobj.granted = True
+    if etxt.count("In addition to the question presented") or etxt.count("directed to brief and argue the following"):
+      evtobj.additional_question = True
+  elif etxt == "CIRCULATED":
+    evtobj.circulated = True
+  elif etxt.startswith("SET FOR ARGUMENT"):
+    evtobj.set_for_argument = True
+  elif etxt.startswith("SET FOR REARGUMENT"):
+    evtobj.set_for_reargument = True
+  elif (etxt.startswith("Record received from")
+        or etxt.startswith("Record") and etxt.count("is electronic")):
+    evtobj.record_received = True
+  elif ((etxt.startswith("The record of") or etxt.startswith("The record from")) and etxt.count("PACER")):
+    evtobj.record_pacer = True
+  elif etxt.startswith("Record returned"):
+    evtobj.record_returned = True
+  elif ((etxt.startswith("Motion of the Solicitor General for leave to participate in oral argument")
+         or etxt.startswith("Motion of the Acting Solicitor General for leave to participate in oral argument"))
+        and etxt.count("divided argument")):
+    if etxt.count("filed"):
+      evtobj.sg_motion_divided_argument = True
+    elif etxt.count("GRANTED"):
+      evtobj.sg_grant_divided_argument = True
+  elif etxt.startswith("Motion for divided argument") or etxt.count("and for divided argument"):
+    if (etxt.count("by the Solicitor General") or
+        etxt.count("by the Acting Solicitor General") or
+        etxt.lower().count("by federal respondents")):
+      if etxt[-7:] == "DENIED.":
+        evtobj.sg_motion_divided_denied = True
+      elif etxt[-8:] == "GRANTED.":
+        evtobj.sg_motion_divided_granted = True
+      else:
+        evtobj.sg_motion_divided_argument = True
+    else:
+      if etxt[-7:] == "DENIED.":
+        evtobj.motion_divided_denied = True
+      elif etxt[-8:] == "GRANTED.":
+        evtobj.motion_divided_granted = True
+      else:
+        evtobj.motion_divided_argument = True
+        if etxt.count("enlargement of time"):
+          evtobj.motion_time_enlargement = True
+  elif (etxt.startswith("Motion") and etxt.count("divided argument")):
+    evtobj.motion_divided_argument = True
+    if etxt.count("enlargement of time"):
+      evtobj.motion_time_enlargement = True
+  elif etxt.count("GRANTED"):
+    if etxt.count("for leave to file"):
+      if etxt.count("as amicus curiae out of time"):
+        evtobj.amici_granted_out_of_time = True
+      return
+    if etxt.count("Motion to substitute"): return
+    if etxt.count("Motion of respondent for leave"): return
+    if etxt.count("Motion for leave to intervene"): return
+    if etxt.count("Motion to dispense with printing"):
+      evtobj.dispense_printing_granted = True
+      return
+    if etxt.count("Motion to dismiss"):
+      evtobj.dismissed = True
+      return
+    if etxt.count("Motion to appoint counsel"):
+      evtobj.counsel_granted = True
+      return
+    statements = etxt.split(".")
+    gs = [x for x in statements if x.count("GRANTED")][0]
+    if gs.count("expedite consideration"):
+      return
+    dinfo.granted = True
+    dinfo.grant_date = dateutil.parser.parse(einfo["Date"]).date()
+    evtobj.granted = True
+    if etxt.count("REVERSED") and etxt.count("REMANDED"):
+      # This is not really a GVR, but we'll throw it in the bucket for now
+      dinfo.gvr = True
+      dinfo.gvr_date = dinfo.grant_date
+      dinfo.remanded = True
+      dinfo.reversed = True
+      evtobj.remanded = True
+    elif etxt.lower().count("vacated") and etxt.lower().count("remanded"):
+      dinfo.gvr = True
+      dinfo.gvr_date = dinfo.grant_date
+      dinfo.remanded = True
+      dinfo.vacated = True
+      evtobj.vacated = True
+      evtobj.remanded = True
+  elif etxt.lower().count("is dismissed as moot"):
+    evtobj.mooted = True
+  elif etxt.startswith("Waiver"):
+    if etxt.count("right of respondent"):
+      if etxt.count("to respond"):
+        evtobj.waive_response = True
+    elif etxt.count("Rule 15.5 filed by petitioner"):
+      evtobj.waive_waiting_period = True
+  elif (etxt.count("petition for certiorari is granted") or
+        etxt.count("petition for a writ of certiorari is granted")):
+    dinfo.granted = True
+    evtobj.granted = True
+    dinfo.grant_date = dateutil.parser.parse(einfo["Date"]).date()
+    if etxt.count("to dismiss the case as moot"):
+      evtobj.mooted = True
+    if etxt.count("the case is remanded for further proceedings"):
+      dinfo.remanded = True
+      evtobj.remanded = True
+  elif etxt.startswith("Argued."):
+    dinfo.argued = True
+    dinfo.argued_date = dateutil.parser.parse(einfo["Date"]).date()
+    evtobj.argued = True
+  elif etxt.count("lacks a quorum"):
+    dinfo.inquorate = True
+    evtobj.inquorate = True
+  elif (etxt.startswith("Petition Dismissed") or
+        etxt.startswith("Petition DISMISSED") or
+        etxt.startswith("Appeal dismissed") or
+        etxt.count("petition for a writ of certiorari is DISMISSED")):
+    dinfo.dismissed = True
+    dinfo.dismiss_date = dateutil.parser.parse(einfo["Date"]).date()
+    evtobj.dismissed = True
+  elif (etxt.startswith("Petition DENIED")
+        or etxt.count("The petition for a writ of certiorari is denied")
+        or etxt.count("before judgment DENIED")):
+    dinfo.denied = True
+    dinfo.deny_date = dateutil.parser.parse(einfo["Date"]).date()
+    evtobj.denied = True
+  elif (etxt.startswith("Rehearing DENIED") or
+        (etxt.startswith("Motion for leave to file a petition for rehearing")
+         and etxt.count("DENIED"))):
+    evtobj.rehearing_denied = True
+  elif (etxt.lower().count("petition for rehearing filed")):
+    evtobj.rehearing_requested = True
+  elif (etxt.startswith("Motion for reconsideration") and etxt.count("DENIED")):
+    evtobj.motion_denied = True
+  elif (etxt.lower().startswith("judgment issued") or etxt.lower().startswith("mandate issued")):
+    dinfo.judgment_issued = True
+    dinfo.judgment_date = dateutil.parser.parse(einfo["Date"]).date()
+    evtobj.issued = True
+  elif (etxt.startswith("Adjudged to be AFFIRMED.")
+        or etxt.count("judgment is affirmed under 28 U. S. C.")
+        or etxt.count("Judgment is affirmed")
+        or etxt.count("Judgment AFFIRMED")):
+    dinfo.affirmed = True
+    dinfo.judgment_issued = True
+    dinfo.judgment_date = dateutil.parser.parse(einfo["Date"]).date()
+    evtobj.affirmed = True
+    evtobj.issued = True
+  elif etxt.startswith("Adjudged to be AFFIRMED IN PART, REVERSED IN PART"):
+    dinfo.affirmed = True
+    dinfo.reversed = True
+    dinfo.judgment_issued = True
+    dinfo.judgment_date = dateutil.parser.parse(einfo["Date"]).date()
+    evtobj.affirmed = True
+    evtobj.reversed = True
+    evtobj.issued = True
+  elif etxt.startswith("Adjudged to be VACATED IN PART"):
+    dinfo.vacated = True
+    dinfo.judgment_issued = True
+    dinfo.judgment_date = dateutil.parser.parse(einfo["Date"]).date()
+    evtobj.vacated = True
+    evtobj.issued = True
+  elif etxt.startswith("Judgment REVERSED"):
+    dinfo.reversed = True
+    dinfo.judgment_issued = True
+    dinfo.judgment_date = dateutil.parser.parse(einfo["Date"]).date()
+    evtobj.issued = True
+  elif (etxt.count("petition for a writ of certiorari is dismissed")
+        or etxt.count("petition for a writ of mandamus/prohibition is dismissed")
+        or etxt.count("petition for a writ of habeas corpus is dismissed")
+        or etxt.count("petition for a writ of prohibition is dismissed")
+        or etxt.count("petition for a writ of mandamus is dismissed")
+        or etxt.count("petition for a writ of mandamus and/or prohibition is dismissed")):
+    dinfo.dismissed = True
+    dinfo.dismiss_date = dateutil.parser.parse(einfo["Date"]).date()
+    evtobj.dismissed = True
+  elif (etxt.count("Case removed from Docket")
+        or etxt == "Case considered closed."):
+    dinfo.removed = True
+    evtobj.removed = True
+  elif etxt.count("leave to proceed in forma pauperis is denied"):
+    evtobj.ifp_denied = True
+    dinfo.ifp_denied = True
+  elif etxt.startswith("Response Requested"):
+    evtobj.response_requested = True
+  elif etxt.lower().startswith("record requested"):
+    evtobj.record_requested = True
+  elif etxt.startswith("Petitioner complied with order of"):
+    odate = dateutil.parser.parse(etxt.split("of")[-1]).date()
+    for evt in dinfo.events:
+      if evt.date == odate and evt.ifp_denied:
+        dinfo.ifp_paid = True
+        evtobj.ifp_paid = True
+        break
+      if evt.date > odate:
+        break
+  elif etxt.count("time to file") or etxt.count("extend further the time"):
+    evtobj.time_to_file = True
+  elif etxt.count("Judgment VACATED"):
+    evtobj.vacated = True
+    dinfo.vacated = True
+  elif (etxt.count("Letter of petitioner")
+        or etxt.count("Letter of respondent")
+        or etxt.count("Letter from counsel")
+        or etxt.startswith("Letter from the Solicitor General")
+        or etxt.count("Letter in reply")):
+    evtobj.letter = True
+  elif etxt.lower().startswith("joint motion"):
+    evtobj.joint_motion = True
+  elif etxt.lower().startswith("joint appendix filed"):
+    evtobj.joint_appendix = True
+  elif etxt.lower().startswith("blanket consent filed by petitioner"):
+    evtobj.petitioner_blanket_consent = True
+  elif etxt.lower().startswith("blanket consent filed by respondent"):
+    evtobj.respondent_blanket_consent = True
+  elif (etxt.startswith("Consent to the filing of amicus curiae briefs") or
+        etxt.startswith("Consent to the filing of amicus briefs")):
+    if etxt.count(" either party") and etxt.count("neither party"):
+      if etxt.count("received from counsel"):
+        if etxt.count("petitioner"):
+          evtobj.petitioner_blanket_consent = True
+        elif etxt.count("respondent"):
+          evtobj.respondent_blanket_consent = True
+
+  if etxt.lower().count("remanded"):
+    dinfo.remanded = True
+    evtobj.remanded = True
+
+  if etxt.lower().count("vacated as moot"):
+    dinfo.vacated = True
+    evtobj.vacated = True
+    evtobj.mooted = True
+
+  if etxt.count("not accepted for filing."):
+    evtobj.not_accepted = True
+
+  if etxt.count("petitioner has repeatedly abused"):
+    dinfo.abuse = True
+
+  if etxt.count("took no part in the consideration"):
+    wlist = etxt.split()
+    for idx,word in enumerate(wlist):
+      if word == "Justice":
+        if wlist[idx-1] == "Chief":
+          dinfo.recusals.add(scotus.justices.TERMS["%02d" % (dinfo.term)]["chief"])
+        else:
+          dinfo.recusals.add(wlist[idx+1])
+
+
+def _classifyOnly (func, dockets, rounds):
+  # Header parsing and DocketEvent construction happen outside the timed region
+  templates = []
+  for docket_obj in dockets:
+    hdr = dict(docket_obj)
+    hdr["ProceedingsandOrder"] = []
+    templates.append((scotus.util.DocketStatusInfo(hdr), docket_obj["ProceedingsandOrder"]))
+
+  best = None
+  for rnd in range(rounds):
+    work = [(copy.deepcopy(info), [(einfo, scotus.events.DocketEvent(einfo)) for einfo in elist])
+            for (info, elist) in templates]
+    t0 = time.time()
+    for (info, elist) in work:
+      for (einfo, evtobj) in elist:
+        info.events.append(evtobj)
+        func(info, einfo, evtobj)
+    elapsed = time.time() - t0
+    if best is None or elapsed < best:
+      best = elapsed
+  return best
+
+
+def classify (opts):
+  dockets = buildTerm(opts.term, opts.dockets, opts.seed)
+  nevents = sum([len(x["ProceedingsandOrder"]) for x in dockets])
+  print("Synthetic OT-%d: %d dockets, %d events" % (opts.term, len(dockets), nevents))
+
+  current = scotus.classify.classifyEvent
+  results = {}
+  for (name, func) in [("legacy", classifyEventLegacy), ("rule-table", current)]:
+    scotus.classify.classifyEvent = func
+    try:
+      t0 = time.time()
+      results[name] = [_infoState(scotus.util.DocketStatusInfo(x)) for x in dockets]
+      load = time.time() - t0
+    finally:
+      scotus.classify.classifyEvent = current
+
+    best = _classifyOnly(func, dockets, opts.rounds)
+    print("%12s: classify %6.3fs (%8.0f events/s), full load %6.3fs" % (name, best, nevents / best, load))
+
+  if results["legacy"] != results["rule-table"]:
+    print("MISMATCH between legacy and rule-table classification")
+    sys.exit(1)
+  print("Classification identical for all %d dockets" % (len(dockets)))
+
+
+def parsedates (opts):
+  dockets = buildTerm(opts.term, opts.dockets, opts.seed)
+  datestrs = []
+  for docket_obj in dockets:
+    datestrs.append(docket_obj["DocketedDate"])
+    datestrs.append(docket_obj["LowerCourtDecision"])
+    for einfo in docket_obj["ProceedingsandOrder"]:
+      datestrs.append(einfo["Date"])
+      if einfo["Text"].startswith("DISTRIBUTED for"):
+        datestrs.append(einfo["Text"].split("of")[-1])
+  print("Synthetic OT-%d: %d date strings (%d unique)" % (opts.term, len(datestrs), len(set(datestrs))))
+
+  t0 = time.time()
+  expected = [dateutil.parser.parse(x).date() for x in datestrs]
+  elapsed = time.time() - t0
+  print("%12s: %6.3fs  (%9.0f dates/s)" % ("dateutil", elapsed, len(datestrs) / elapsed))
+
+  t0 = time.time()
+  found = [scotus.dates.parseDate(x) for x in datestrs]
+  elapsed = time.time() - t0
+  print("%12s: %6.3fs  (%9.0f dates/s)" % ("parseDate", elapsed, len(datestrs) / elapsed))
+
+  if found != expected:
+    print("MISMATCH between dateutil and parseDate")
+    sys.exit(1)
+
+
+class _DictEvent(object):
+  """The previous DocketEvent layout (all flags in the instance __dict__), for comparison"""
+  def __init__ (self, edict):
+    self.date = dateutil.parser.parse(edict["Date"]).date()
+    self.text = edict["Text"]
+    self._e_dict = edict
+    for name in scotus.events.FLAGS:
+      setattr(self, name, False)
+
+
+def _rawSize (obj, skip):
+  if obj is skip:
+    return 0
+  size = sys.getsizeof(obj)
+  if isinstance(obj, dict):
+    for (k, v) in obj.items():
+      size += _rawSize(v, skip)
+  elif isinstance(obj, (list, tuple)):
+    for v in obj:
+      size += _rawSize(v, skip)
+  return size
+
+
+def _intSize (val):
+  # Small ints are shared singletons in CPython
+  if -5 <= val <= 256:
+    return 0
+  return sys.getsizeof(val)
+
+
+def memory (opts):
+  dockets = buildTerm(opts.term, opts.dockets, opts.seed)
+  einfos = [einfo for docket_obj in dockets for einfo in docket_obj["ProceedingsandOrder"]]
+  print("Synthetic OT-%d: %d dockets, %d events" % (opts.term, len(dockets), len(einfos)))
+
+  # The event text is shared by every layout, so it is not counted; the raw dict is
+  raw = sum([_rawSize(einfo, einfo["Text"]) for einfo in einfos])
+
+  total = 0
+  for einfo in einfos:
+    evt = _DictEvent(einfo)
+    total += sys.getsizeof(evt) + sys.getsizeof(evt.__dict__) + sys.getsizeof(evt.date)
+  print("%24s: %6.1f bytes/event" % ("__dict__ + raw", float(total + raw) / len(einfos)))
+
+  for keep_raw in (True, False):
+    total = 0
+    for einfo in einfos:
+      evt = scotus.events.DocketEvent(einfo, keep_raw)
+      evt.distributed = True
+      total += sys.getsizeof(evt) + _intSize(evt._ordinal) + _intSize(evt._flags)
+    if keep_raw:
+      total += raw
+    print("%24s: %6.1f bytes/event" % ("__slots__%s" % (" + raw" if keep_raw else ""),
+                                       float(total) / len(einfos)))
+
+
+def lazy (opts):
+  dockets = buildTerm(opts.term, opts.dockets, opts.seed)
+  print("Synthetic OT-%d: %d dockets" % (opts.term, len(dockets)))
+
+  # A header-only pipeline (casetype + lower court) against one that also touches events
+  def header (info):
+    return info.casetype == "capital" or info.lowercourt == COURTS[0]
+
+  def events (info):
+    return header(info) and info.pending
+
+  found = {}
+  for (fname, func) in [("header", header), ("events", events)]:
+    for mode in (False, True):
+      t0 = time.time()
+      found[(fname, mode)] = [x["CaseNumber"] for x in dockets
+                              if func(scotus.util.DocketStatusInfo(x, keep_raw = False, lazy = mode))]
+      elapsed = time.time() - t0
+      print("%8s filter, %5s: %6.3fs  (%8.0f dockets/s)" % (fname, "lazy" if mode else "eager",
+                                                            elapsed, len(dockets) / elapsed))
+
+  eager = [_infoState(scotus.util.DocketStatusInfo(x, keep_raw = False)) for x in dockets]
+  deferred = [_infoState(scotus.util.DocketStatusInfo(x, keep_raw = False, lazy = True)) for x in dockets]
+  if eager != deferred or found[("header", False)] != found[("header", True)] or \
+      found[("events", False)] != found[("events", True)]:
+    print("MISMATCH between eager and lazy construction")
+    sys.exit(1)
+
+
+def snapshot (opts):
+  dockets = buildTerm(opts.term, opts.dockets, opts.seed)
+  print("Synthetic OT-%d: %d dockets" % (opts.term, len(dockets)))
+
+  root = tempfile.mkdtemp()
+  try:
+    paths = writeTerm(root, opts.term, dockets)
+
+    results = []
+    for name in ("uncached", "cold", "warm"):
+      # Each run starts from a fresh process-level view of the cache file
+      scotus.cache._CACHES.clear()
+      t0 = time.time()
+      if name == "uncached":
+        infos = [scotus.util.loadDocketPath(x) for x in paths]
+      else:
+        infos = [scotus.util.loadDocketPath(x, keep_raw = False) for x in paths]
+      elapsed = time.time() - t0
+      results.append([_infoState(x) for x in infos])
+
+      t1 = time.time()
+      scotus.cache.saveAll()
+      saved = time.time() - t1
+      print("%10s: %6.3fs  (%8.0f dockets/s), save %6.3fs" % (name, elapsed, len(paths) / elapsed, saved))
+
+    print("Cache file: %d bytes" % (os.path.getsize("%s/OT-%d/%s" % (root, opts.term, scotus.cache.FILENAME))))
+    if results[1] != results[2]:
+      print("MISMATCH between cold and warm loads")
+      sys.exit(1)
+  finally:
+    shutil.rmtree(root)
+
+
+TABLE_FILTERS = [
+  ("pending paid cert, CA9", [["case-status", {"pending" : True}], ["case-type", {"type" : "certiorari"}],
+                              ["lowercourt", {"court_abbrevs" : ["CA9"]}]]),
+  ("capital or relisted", [["capital", {}], ["distribution", {"min_count" : 2}]]),
+  ("docketed on a date", [["docketdate", {"datestr" : None}], ["cvsg", {"has_cvsg" : False}]]),
+  ("no lower court", [["docket-attribute", {"lowercourt" : None}]]),
+]
+
+def table (opts):
+  dockets = buildTerm(opts.term, opts.dockets, opts.seed)
+  # Code 0 (None) has to match too
+  for docket_obj in dockets[::10]:
+    del docket_obj["LowerCourt"]
+  print("Synthetic OT-%d: %d dockets" % (opts.term, len(dockets)))
+
+  root = tempfile.mkdtemp()
+  try:
+    writeTerm(root, opts.term, dockets)
+
+    t0 = time.time()
+    scotus.table.termTable(root, opts.term)
+    print("%28s: %7.3fs" % ("table build (cold)", time.time() - t0))
+    scotus.cache.saveAll()
+    scotus.table._TABLES.clear()
+    t0 = time.time()
+    scotus.table.termTable(root, opts.term)
+    print("%28s: %7.3fs" % ("table load (warm)", time.time() - t0))
+
+    source = scotus.sources.DocketSource(root, opts.term, paid = True, ifp = True)
+    for (name, fspecs) in TABLE_FILTERS:
+      for (fname, fargs) in fspecs:
+        if fname == "docketdate":
+          fargs["datestr"] = dockets[len(dockets) // 3]["DocketedDate"]
+      filters = [scotus.filters.FILTERTYPES[fname](**fargs) for (fname, fargs) in fspecs]
+
+      t0 = time.time()
+      expected = [ref.path for ref in source if all([x.include(ref) for x in filters])]
+      serial = time.time() - t0
+
+      t0 = time.time()
+      (found, pending) = scotus.table.prefilter([ref for ref in source], filters)
+      masked = time.time() - t0
+
+      print("%28s: per-docket %7.3fs, mask %7.3fs (%d matches)" % (name, serial, masked, len(expected)))
+      if pending or [ref.path for ref in found] != expected:
+        print("MISMATCH between per-docket and mask filtering")
+        sys.exit(1)
+  finally:
+    shutil.rmtree(root)
+
+
+def attrindex (opts):
+  dockets = buildTerm(opts.term, opts.dockets, opts.seed)
+  print("Synthetic OT-%d: %d dockets" % (opts.term, len(dockets)))
+
+  for docket_obj in dockets[len(dockets) // 2:]:
+    sample = scotus.util.DocketStatusInfo(docket_obj, keep_raw = False)
+    if sample.distributed and sample.attys_petitioner_cor:
+      break
+  fspecs = [
+    ("conference date", [["distribution", {"conf_date" : sample.distributed[0][1].isoformat()}]]),
+    ("event date", [["event-date", {"datestr" : sample.events[-1].date.isoformat()}]]),
+    ("attorney (counsel of record)", [["attorney", {"atty_name" : sample.attys_petitioner_cor[0],
+                                                    "require_cor" : True}]]),
+    ("email", [["attyemail", {"email" : "okafor"}]]),
+  ]
+
+  root = tempfile.mkdtemp()
+  try:
+    writeTerm(root, opts.term, dockets)
+
+    t0 = time.time()
+    scotus.attrindex.refreshIndex(root, opts.term)
+    print("%28s: %7.3fs" % ("index build (cold)", time.time() - t0))
+    scotus.attrindex.saveAll()
+    scotus.cache.saveAll()
+    scotus.attrindex._INDEXES.clear()
+    t0 = time.time()
+    scotus.attrindex.refreshIndex(root, opts.term)
+    print("%28s: %7.3fs" % ("index load (warm)", time.time() - t0))
+
+    source = scotus.sources.DocketSource(root, opts.term, paid = True, ifp = True)
+    for (name, fspec) in fspecs:
+      filters = [scotus.filters.FILTERTYPES[fname](**fargs) for (fname, fargs) in fspec]
+
+      # Each pass starts from unparsed references, the way a fresh engine run does
+      t0 = time.time()
+      expected = [ref.path for ref in source if all([x.include(ref) for x in filters])]
+      serial = time.time() - t0
+
+      t0 = time.time()
+      refs = scotus.attrindex.narrow([ref for ref in source], filters)
+      found = [ref.path for ref in refs if all([x.include(ref) for x in filters])]
+      narrowed = time.time() - t0
+
+      print("%28s: per-docket %7.3fs, narrowed %7.3fs (%d candidates, %d matches)" % (
+          name, serial, narrowed, len(refs), len(expected)))
+      if found != expected:
+        print("MISMATCH between per-docket and index-narrowed filtering")
+        sys.exit(1)
+  finally:
+    shutil.rmtree(root)
+
+
+# Phrases sprinkled through the synthetic petition text, so searches have something to find
+PHRASES = ["qualified immunity", "excessive force", "habeas corpus", "due process",
+           "ineffective assistance of counsel", "fourth amendment", "officer", "petitioner"]
+
+SEARCHES = [["qualified immunity"], ["excessive force", "officer"],
+            ["assistance of counsel"], ["habeas corpus", "due process", "petitioner"],
+            ["ineffective assistance of counsel"]]
+
+def buildText (rng, nwords, vocab):
+  """Word list with a long-tailed vocabulary, roughly the shape of petition text"""
+  words = []
+  while len(words) < nwords:
+    if rng.random() < 0.01:
+      words.extend(rng.choice(PHRASES).split())
+    else:
+      words.append(vocab[min(int(rng.paretovariate(0.9)), len(vocab)) - 1])
+  return words
+
+
+def writeIndexes (paths, nwords, seed = 1):
+  """Give every docket directory a petition.txt and the 1/2/3-gram indexes.json older indexDir
+  versions built from it"""
+  rng = random.Random(seed)
+  vocab = ["w%d" % (x) for x in range(20000)]
+  for dpath in paths:
+    words = buildText(rng, nwords, vocab)
+    with open("%s/petition.txt" % (dpath), "wb") as f:
+      f.write(" ".join(words))
+    grams = dict([("%d-gram" % (n), scotus.parse.ngrams(words, n)) for n in (1, 2, 3)])
+    with open("%s/indexes.json" % (dpath), "wb") as f:
+      f.write(json.dumps({"petition.pdf" : grams}))
+
+
+def _scanIndexes (droot, terms):
+  """What docketsearch used to do: decode every indexes.json and check it for all the terms
+  (falling back to the text for phrases longer than the n-grams, as DirIndex does)"""
+  out = {}
+  for name in os.listdir(droot):
+    try:
+      with open("%s/%s/indexes.json" % (droot, name), "rb") as f:
+        obj = json.loads(f.read())
+    except IOError:
+      continue
+    for (fname, grms) in obj.items():
+      counts = []
+      for term in terms:
+        gstr = "%d-gram" % (len(term.split()))
+        if gstr in grms:
+          count = grms[gstr].get(term)
+        else:
+          words = scotus.postings.readWords(scotus.postings.textPath("%s/%s" % (droot, name), fname))
+          count = scotus.postings.phraseCount(words, term.split())
+        if count:
+          counts.append((term, count))
+      if len(counts) == len(terms):
+        out[(name, fname)] = counts
+  return out
+
+
+def _ngramFile (droot, path):
+  """The n-gram (non-positional) index.bin format, built from the 1/2/3-gram indexes.json files"""
+  docs = []
+  grams = {}
+  for name in sorted(os.listdir(droot)):
+    try:
+      with open("%s/%s/indexes.json" % (droot, name), "rb") as f:
+        obj = json.loads(f.read())
+    except IOError:
+      continue
+    for (fname, grms) in sorted(obj.items()):
+      for gd in grms.values():
+        for (gram, count) in gd.items():
+          grams.setdefault(gram, []).append((len(docs), count))
+      docs.append((name, fname, 0))
+  scotus.binpostings.write(path, docs, grams)
+
+
+def _ngramSearch (pfile, terms):
+  hits = [(term, dict([(pfile.docs[doc], count) for (doc, count) in pfile.lookup(term)]))
+          for term in terms]
+  keys = set(hits[0][1].keys())
+  for (term, found) in hits[1:]:
+    keys &= set(found.keys())
+  return dict([(key, [(term, found[key]) for (term, found) in hits]) for key in keys])
+
+
+def postings (opts):
+  root = tempfile.mkdtemp()
+  try:
+    paths = writeTerm(root, opts.term, buildTerm(opts.term, opts.dockets, opts.seed))
+    writeIndexes(paths, opts.words, opts.seed)
+    droot = "%s/OT-%d/dockets" % (root, opts.term)
+    print("Synthetic OT-%d: %d dockets, %d words each" % (opts.term, len(paths), opts.words))
+
+    t0 = time.time()
+    scotus.postings.refreshIndex(droot)
+    print("%28s: %7.3fs" % ("positional index build", time.time() - t0))
+    npath = "%s/ngrams.bin" % (root)
+    t0 = time.time()
+    _ngramFile(droot, npath)
+    print("%28s: %7.3fs" % ("n-gram index build", time.time() - t0))
+
+    jsize = sum([os.path.getsize("%s/indexes.json" % (x)) for x in paths])
+    print("%28s: %7.1f MB indexes.json, %7.1f MB n-gram index, %7.1f MB positional index" % (
+        "size", jsize / 1e6, os.path.getsize(npath) / 1e6,
+        sum([os.path.getsize(x) for x in glob.glob("%s/%s/*.bin" % (droot, scotus.postings.DIRNAME))]) / 1e6))
+
+    # Each search opens the index, the way each docketsearch run starts.  The n-gram index had no
+    # way to tell whether it was up to date, so the check refreshIndex() makes first is timed on
+    # its own.
+    for terms in SEARCHES:
+      t0 = time.time()
+      expected = _scanIndexes(droot, terms)
+      scan = time.time() - t0
+
+      ngram = "    -   "
+      if max([len(x.split()) for x in terms]) <= 3:
+        t0 = time.time()
+        nfile = scotus.binpostings.PostingsFile(npath)
+        nfound = _ngramSearch(nfile, terms)
+        nfile.close()
+        ngram = "%7.3fs" % (time.time() - t0)
+        if nfound != expected:
+          print("MISMATCH between indexes.json scan and n-gram index")
+          sys.exit(1)
+
+      scotus.postings._INDEXES.clear()
+      t0 = time.time()
+      found = scotus.postings.termIndex(droot).search(terms)
+      elapsed = time.time() - t0
+
+      print("%28s: scan %7.3fs, n-gram %s, positional %7.3fs (%d files)" % (
+          " + ".join(terms)[:28], scan, ngram, elapsed, len(expected)))
+      if found != expected:
+        print("MISMATCH between indexes.json scan and positional index")
+        sys.exit(1)
+
+    scotus.postings._INDEXES.clear()
+    index = scotus.postings.termIndex(droot)
+    t0 = time.time()
+    index.refresh()
+    print("%28s: %7.3fs" % ("positional up to date check", time.time() - t0))
+
+    # Latency of a single lookup.  Cold opens the file (or decodes the docket's indexes.json) for
+    # every lookup, the way a new search process would; the OS cache is warm either way.
+    grams = [scotus.postings.normalize(x) for terms in SEARCHES for x in terms
+             if len(x.split()) <= 3] * 20
+    t0 = time.time()
+    for (idx, gram) in enumerate(grams):
+      with open("%s/indexes.json" % (paths[idx % len(paths)]), "rb") as f:
+        json.loads(f.read())["petition.pdf"]["%d-gram" % (len(gram.split()))].get(gram)
+    print("%28s: %9.3fms per docket" % ("indexes.json lookup (cold)",
+                                        (time.time() - t0) / len(grams) * 1000))
+
+    ngramLookup = lambda pfile, gram: dict([(pfile.docs[doc], count) for (doc, count) in pfile.lookup(gram)])
+    for (name, path, func) in [("n-gram", npath, ngramLookup),
+                               ("positional", None, None)]:
+      t0 = time.time()
+      for gram in grams:
+        if func:
+          pfile = scotus.binpostings.PostingsFile(path)
+          func(pfile, gram)
+          pfile.close()
+        else:
+          scotus.postings._INDEXES.clear()
+          scotus.postings.termIndex(droot).lookup(gram)
+      cold = (time.time() - t0) / len(grams)
+
+      index = scotus.postings.termIndex(droot)
+      pfile = scotus.binpostings.PostingsFile(path) if path else None
+      t0 = time.time()
+      for gram in grams:
+        if func:
+          func(pfile, gram)
+        else:
+          index._lookups = {}
+          index.lookup(gram)
+      warm = (time.time() - t0) / len(grams)
+      if pfile:
+        pfile.close()
+      print("%28s: %9.3fms cold, %.3fms warm, for the whole term" % ("%s lookup" % (name),
+                                                                    cold * 1000, warm * 1000))
+
+    # BM25 top 10 against scoring every file that has one of the terms, with the postings
+    # already looked up so only the scoring is timed
+    index = scotus.postings.termIndex(droot)
+    for terms in SEARCHES:
+      index.rank(terms, 1)
+      t0 = time.time()
+      ranked = index.rank(terms, 10)
+      topk = time.time() - t0
+      t0 = time.time()
+      every = index.rank(terms, len(index.file.docs))
+      full = time.time() - t0
+      print("%28s: top 10 %7.3fms, every file %7.3fms (%d files)" % (
+          "rank " + " + ".join(terms)[:23], topk * 1000, full * 1000, len(every)))
+      if ranked != every[:10]:
+        print("MISMATCH between top 10 and full ranking")
+        sys.exit(1)
+
+    # A night's filings in 1% of the dockets go into a new segment rather than rewriting the index
+    rng = random.Random(opts.seed + 1)
+    vocab = ["w%d" % (x) for x in range(20000)]
+    night = paths[:max(1, len(paths) // 100)]
+    for dpath in night:
+      words = buildText(rng, opts.words, vocab)
+      with open("%s/reply.txt" % (dpath), "wb") as f:
+        f.write(" ".join(words))
+      with open("%s/indexes.json" % (dpath), "rb") as f:
+        obj = json.loads(f.read())
+      obj["reply.pdf"] = {"1-gram" : scotus.parse.ngrams(words, 1)}
+      with open("%s/indexes.json" % (dpath), "wb") as f:
+        f.write(json.dumps(obj))
+    t0 = time.time()
+    index = scotus.postings.refreshIndex(droot)
+    incremental = time.time() - t0
+    nsegments = len(index.segments)
+    found = [index.search(terms) for terms in SEARCHES]
+
+    shutil.rmtree("%s/%s" % (droot, scotus.postings.DIRNAME))
+    scotus.postings._INDEXES.clear()
+    t0 = time.time()
+    index = scotus.postings.refreshIndex(droot)
+    rebuild = time.time() - t0
+    print("%28s: %7.3fs incremental (%d segments), %7.3fs full rebuild" % (
+        "refresh %d dockets" % (len(night)), incremental, nsegments, rebuild))
+    if found != [index.search(terms) for terms in SEARCHES]:
+      print("MISMATCH between incremental refresh and full rebuild")
+      sys.exit(1)
+  finally:
+    shutil.rmtree(root)
+
+
+def writePdf (path, pages):
+  """Minimal PDF with one Helvetica text page per list of lines in pages"""
+  objs = ["<< /Type /Catalog /Pages 2 0 R >>",
+          "<< /Type /Pages /Kids [%s] /Count %d >>" % (
+              " ".join(["%d 0 R" % (4 + 2 * x) for x in range(len(pages))]), len(pages)),
+          "<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>"]
+  for (idx, lines) in enumerate(pages):
+    stream = "BT /F1 10 Tf 12 TL 72 740 Td %s ET" % (" T* ".join(["(%s) Tj" % (x) for x in lines]))
+    objs.append("<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] /Contents %d 0 R "
+                "/Resources << /Font << /F1 3 0 R >> >> >>" % (5 + 2 * idx))
+    objs.append("<< /Length %d >>\nstream\n%s\nendstream" % (len(stream), stream))
+
+  out = ["%PDF-1.4\n"]
+  size = len(out[0])
+  offsets = []
+  for (idx, obj) in enumerate(objs):
+    offsets.append(size)
+    out.append("%d 0 obj\n%s\nendobj\n" % (idx + 1, obj))
+    size += len(out[-1])
+  out.append("xref\n0 %d\n0000000000 65535 f \n" % (len(objs) + 1))
+  out.extend(["%010d 00000 n \n" % (x) for x in offsets])
+  out.append("trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (len(objs) + 1, size))
+  with open(path, "wb") as f:
+    f.write("".join(out))
+
+
+def writePetitions (root, count, npages, seed = 1):
+  rng = random.Random(seed)
+  vocab = ["w%d" % (x) for x in range(20000)]
+  paths = []
+  for idx in range(count):
+    words = buildText(rng, npages * 300, vocab)
+    lines = [" ".join(words[x:x + 12]) for x in range(0, len(words), 12)]
+    path = "%s/petition-%d.pdf" % (root, idx)
+    writePdf(path, [lines[x:x + 25] for x in range(0, len(lines), 25)])
+    paths.append(path)
+  return paths
+
+
+def extract (opts):
+  root = tempfile.mkdtemp()
+  try:
+    if opts.sample:
+      paths = []
+      for (dpath, dnames, fnames) in os.walk(opts.sample):
+        paths.extend([os.path.join(dpath, x) for x in fnames if x == "petition.pdf"])
+      paths = sorted(paths)[:opts.pdfs]
+      print("Sample of %d petitions from %s" % (len(paths), opts.sample))
+    else:
+      paths = writePetitions(root, opts.pdfs, opts.pages, opts.seed)
+      print("Synthetic: %d petitions, %d pages each" % (len(paths), opts.pages))
+
+    backends = [(scotus.extract.PYPDF2, 1), (scotus.extract.PYPDF2, opts.processes)]
+    if scotus.extract.havePdftotext():
+      backends.extend([(scotus.extract.PDFTOTEXT, 1), (scotus.extract.PDFTOTEXT, opts.processes)])
+    else:
+      print("pdftotext is not installed, only timing PyPDF2")
+
+    for (engine, jobs) in backends:
+      t0 = time.time()
+      found = scotus.extract.extractBatch(paths, engine, jobs)
+      elapsed = time.time() - t0
+      npages = sum([len(x) for x in found.values() if not isinstance(x, Exception)])
+      failed = len([x for x in found.values() if isinstance(x, Exception)])
+      print("%28s: %7.3fs, %8.1f pages/s (%d pages, %d PDFs failed)" % (
+          "%s, %d job%s" % (engine, jobs, "" if jobs == 1 else "s"), elapsed, npages / elapsed,
+          npages, failed))
+  finally:
+    shutil.rmtree(root)
+
+
+ENGINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "tools", "analysis-engine")
+
+ENGINE_SPEC = {"filters" : [["partyname", {"name" : "smith"}], ["event-tag", {"granted" : True}]],
+               "rejects" : [["amici", {"name" : "foundation"}]],
+               "output" : ["docket-meta", {}]}
+
+def _runEngine (root, spec, processes, args = [], key = "output"):
+  env = dict(os.environ)
+  env["SCOTUSTHREADS"] = str(processes)
+  env["PYTHONPATH"] = os.pathsep.join([x for x in [os.path.join(os.path.dirname(ENGINE), ".."),
+                                                   env.get("PYTHONPATH")] if x])
+  t0 = time.time()
+  out = subprocess.check_output([sys.executable, ENGINE, json.dumps(spec), "--no-result-cache"] + args,
+                                cwd = root, env = env, stderr = open(os.devnull, "wb"))
+  return (time.time() - t0, json.loads(out)[key])
+
+
+def engine (opts):
+  terms = list(range(opts.term, opts.term + opts.terms))
+  print("Synthetic OT-%d..OT-%d: %d dockets per term, %d CPUs" % (terms[0], terms[-1], opts.dockets,
+                                                                 multiprocessing.cpu_count()))
+
+  root = tempfile.mkdtemp()
+  try:
+    for term in terms:
+      writeTerm(root, term, buildTerm(term, opts.dockets, opts.seed + term))
+
+    spec = dict(ENGINE_SPEC)
+    spec["sources"] = [["docket", {"term" : x, "paid" : True, "ifp" : True}] for x in terms]
+
+    # The first run parses every docket and builds the caches, which is not what we're measuring
+    (elapsed, expected) = _runEngine(root, spec, opts.processes)
+    print("%28s: %7.3fs (%d rows)" % ("cold caches", elapsed, len(expected)))
+
+    runs = [("serial", 1, []), ("pool, chunksize 1", opts.processes, ["--chunksize", "1"]),
+            ("pool", opts.processes, [])]
+    serial = None
+    for (name, processes, args) in runs:
+      (elapsed, found) = _runEngine(root, spec, processes, args)
+      if serial is None:
+        serial = elapsed
+      print("%28s: %7.3fs (%4.1fx)" % ("%s, %d jobs" % (name, processes), elapsed, serial / elapsed))
+      if found != expected:
+        print("MISMATCH between %s and cold run" % (name))
+        sys.exit(1)
+  finally:
+    shutil.rmtree(root)
+
+
+def batch (opts):
+  dockets = buildTerm(opts.term, opts.dockets, opts.seed)
+  print("Synthetic OT-%d: %d dockets" % (opts.term, len(dockets)))
+
+  # One spec per conference date, the way the conference pages are built
+  counts = {}
+  for docket_obj in dockets:
+    for (edate, cdate, resched) in scotus.util.DocketStatusInfo(docket_obj, keep_raw = False).distributed:
+      counts[cdate] = counts.get(cdate, 0) + 1
+  cdates = sorted(sorted(counts.keys(), key = lambda x: -counts[x])[:opts.specs])
+
+  specs = []
+  for cdate in cdates:
+    specs.append(["conf-%s" % (cdate.isoformat()),
+                  {"sources" : [["docket", {"term" : opts.term, "paid" : True, "ifp" : True}]],
+                   "filters" : [["distribution", {"conf_date" : cdate.isoformat()}]],
+                   "output" : ["docket-meta", {}]}])
+
+  root = tempfile.mkdtemp()
+  try:
+    writeTerm(root, opts.term, dockets)
+    _runEngine(root, specs[0][1], opts.processes)
+
+    t0 = time.time()
+    expected = dict([(name, _runEngine(root, spec, opts.processes)[1]) for (name, spec) in specs])
+    separate = time.time() - t0
+    print("%28s: %7.3fs" % ("%d separate runs" % (len(specs)), separate))
+
+    (elapsed, found) = _runEngine(root, specs, opts.processes, ["--batch"], key = "batch")
+    print("%28s: %7.3fs (%4.1fx)" % ("one batch run", elapsed, separate / elapsed))
+    if dict([(name, env["output"]) for (name, env) in found.items()]) != expected:
+      print("MISMATCH between batch and separate runs")
+      sys.exit(1)
+  finally:
+    shutil.rmtree(root)
+
+
+def parse_args ():
+  parser = argparse.ArgumentParser()
+  sub = parser.add_subparsers(dest="bench")
+
+  cparser = sub.add_parser("classify", help="Event classification throughput, legacy chain vs rule table")
+  cparser.add_argument("--dockets", dest="dockets", type=int, default=6000)
+  cparser.add_argument("--rounds", dest="rounds", type=int, default=3)
+  cparser.set_defaults(func=classify)
+
+  dparser = sub.add_parser("dates", help="Docket date parsing, dateutil vs scotus.dates")
+  dparser.add_argument("--dockets", dest="dockets", type=int, default=6000)
+  dparser.set_defaults(func=parsedates)
+
+  mparser = sub.add_parser("memory", help="Per-event memory, __dict__ vs __slots__ DocketEvent")
+  mparser.add_argument("--dockets", dest="dockets", type=int, default=6000)
+  mparser.set_defaults(func=memory)
+
+  lparser = sub.add_parser("lazy", help="Header-only filtering, eager vs lazy DocketStatusInfo")
+  lparser.add_argument("--dockets", dest="dockets", type=int, default=6000)
+  lparser.set_defaults(func=lazy)
+
+  sparser = sub.add_parser("cache", help="Docket loading, uncached vs cold and warm term cache")
+  sparser.add_argument("--dockets", dest="dockets", type=int, default=6000)
+  sparser.set_defaults(func=snapshot)
+
+  tparser = sub.add_parser("table", help="Header/status filters, per-docket vs columnar term table")
+  tparser.add_argument("--dockets", dest="dockets", type=int, default=6000)
+  tparser.set_defaults(func=table)
+
+  iparser = sub.add_parser("attrindex", help="Value-lookup filters, per-docket vs attribute index")
+  iparser.add_argument("--dockets", dest="dockets", type=int, default=6000)
+  iparser.set_defaults(func=attrindex)
+
+  eparser = sub.add_parser("engine", help="Multi-term analysis-engine runs, serial vs worker pool")
+  eparser.add_argument("--dockets", dest="dockets", type=int, default=2000)
+  eparser.add_argument("--terms", dest="terms", type=int, default=3)
+  eparser.add_argument("-j", "--processes", dest="processes", type=int, default=8)
+  eparser.set_defaults(func=engine)
+
+  bparser = sub.add_parser("batch", help="Per-conference analysis-engine specs, separate runs vs --batch")
+  bparser.add_argument("--dockets", dest="dockets", type=int, default=2000)
+  bparser.add_argument("--specs", dest="specs", type=int, default=20)
+  bparser.add_argument("-j", "--processes", dest="processes", type=int, default=8)
+  bparser.set_defaults(func=batch)
+
+  pparser = sub.add_parser("postings", help="Phrase search, indexes.json vs n-gram and positional indexes")
+  pparser.add_argument("--dockets", dest="dockets", type=int, default=1000)
+  pparser.add_argument("--words", dest="words", type=int, default=1500)
+  pparser.set_defaults(func=postings)
+
+  xparser = sub.add_parser("extract", help="PDF text extraction pages/second, PyPDF2 vs pdftotext")
+  xparser.add_argument("--pdfs", dest="pdfs", type=int, default=40)
+  xparser.add_argument("--pages", dest="pages", type=int, default=20)
+  xparser.add_argument("--sample", dest="sample", type=str,
+                       help="Time the petition.pdf files under this directory instead")
+  xparser.add_argument("-j", "--processes", dest="processes", type=int, default=8)
+  xparser.set_defaults(func=extract)
+
+  for sp in sub.choices.values():
+    sp.add_argument("-t", "--term", dest="term", type=int, default=18)
+    sp.add_argument("--seed", dest="seed", type=int, default=1)
+
+  return parser.parse_args()
+
+
+if __name__ == '__main__':
+  opts = parse_args()
+  opts.func(opts)
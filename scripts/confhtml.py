@@ -4,8 +4,7 @@ import codecs
 import json
 import sys
 
-import dateutil.parser
-
+import scotus.dates
 import scotus.util
 
 PAGE = """<html>
@@ -114,14 +113,13 @@ def main():
 
   for fname,fargs in obj["arguments"]["filters"]:
     if fname == "distribution":
-      cdate = dateutil.parser.parse(fargs["conf_date"])
+      cdate = scotus.dates.parseDate(fargs["conf_date"])
       cdatestr = cdate.strftime("%B %d, %Y")
       cshortstr = cdate.strftime("%Y%m%d")
     
   tdata = []
   for idx,(term,num,cabbr) in enumerate(sumdata):
-    djson = json.loads(open("OT-%d/dockets/%d/docket.json" % (term, num), "rb").read())
-    docket = scotus.util.DocketStatusInfo(djson)
+    docket = scotus.util.loadDocket(term, num, keep_raw = False)
 
     lcinfo = []
     lcinfo.append(docket.lowercourt)
@@ -7,8 +7,7 @@ import logging
 import json
 import sys
 
-import dateutil.parser
-
+import scotus.dates
 import scotus.util
 
 def main():
@@ -24,14 +23,14 @@ def main():
   for term in cdata.keys():
     for lobj in cdata[term]:
       for cinfo in lobj["confdates"]:
-        dates.append(dateutil.parser.parse("%s-%s-%s" % (cinfo["y"], cinfo["m"], cinfo["d"])).date())
+        dates.append(scotus.dates.parseDate("%s-%s-%s" % (cinfo["y"], cinfo["m"], cinfo["d"])))
   dates.sort()
 
   sumdata = obj["output"]
 
   for fname,fargs in obj["arguments"]["filters"]:
     if fname == "distribution":
-      cdate = dateutil.parser.parse(fargs["conf_date"]).date()
+      cdate = scotus.dates.parseDate(fargs["conf_date"])
       cdatestr = cdate.strftime("%B %d, %Y")
       cshortstr = cdate.strftime("%Y%m%d")
 
@@ -39,7 +38,7 @@ def main():
 
   tdata = []
   for term,num,cabbr in sumdata:
-    docket = scotus.util.loadDocket(term, num)
+    docket = scotus.util.loadDocket(term, num, keep_raw = False)
 
     try:
       lcinfo = []
@@ -11,7 +11,7 @@ setup(name = "scotus-tools",
       packages = setuptools.find_packages(),
       install_requires = [
         "BeautifulSoup",
-        "pathos",
+        "numpy",
         "PyPDF2",
         "python-dateutil",
         "requests",